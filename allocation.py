@@ -0,0 +1,131 @@
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
+from scipy.sparse import csc_matrix
+
+# Words that say what a plant is rather than which one it is
+NAME_STOPWORDS = {
+    "power", "station", "plant", "thermal", "tps", "stpp", "stps", "project", "ltd", "limited", "pvt", "private",
+    "the", "of", "and", "unit", "complex", "formerly",
+}
+# Share of a registry name's tokens that must appear in the map name
+NAME_MATCH_MIN = 0.75
+# Longest haul considered (km); arcs beyond it are left out of the problem
+MAX_HAUL_KM = 150.0
+# Cost per ton of demand left unmet, in the units of the arc costs (ton-km)
+UNMET_PENALTY = 1e6
+
+
+def name_tokens(name):
+    return {t for t in re.findall(r"[a-z0-9]+", str(name).lower()) if t not in NAME_STOPWORDS and len(t) > 1}
+
+
+def match_plants(map_names, registry_names, min_score=NAME_MATCH_MIN):
+    """Registry row for each map plant (-1: none), by name tokens.
+
+    A pair scores the share of the registry name's tokens found in the
+    map name; each registry plant goes to its best-scoring map plant
+    (ties: the map name with fewest extra tokens).
+    """
+    map_tokens = [name_tokens(n) for n in map_names]
+    match = np.full(len(map_tokens), -1, dtype=np.int64)
+    for r, name in enumerate(registry_names):
+        reg = name_tokens(name)
+        if not reg:
+            continue
+        best, best_key = -1, None
+        for m, tokens in enumerate(map_tokens):
+            score = len(reg & tokens) / len(reg)
+            key = (score, -len(tokens - reg))
+            if score >= min_score and match[m] < 0 and (best_key is None or key > best_key):
+                best, best_key = m, key
+        if best >= 0:
+            match[best] = r
+    return match
+
+
+def load_feedstock_overrides(path):
+    """name -> supply tons/year from a CSV with columns name, supply_tons (empty if missing)."""
+    if path is None or not Path(path).exists():
+        return {}
+    df = pd.read_csv(path)
+    return dict(zip(df["name"].astype(str), pd.to_numeric(df["supply_tons"], errors="coerce").fillna(0.0)))
+
+
+def solve_allocation(supply, demand, cost, max_cost=MAX_HAUL_KM, unmet_penalty=UNMET_PENALTY):
+    """Least-cost transport of feedstock from sources to plants (HiGHS LP).
+
+    supply: (n_sources,) tons/year available; demand: (n_plants,)
+    tons/year wanted; cost: (n_sources, n_plants) per-ton cost (e.g. road
+    km). Arcs costing more than ``max_cost`` are dropped. Demand that
+    cannot be met is left unmet at ``unmet_penalty`` per ton, so the
+    problem is always feasible. Returns a dict with the flow matrix
+    (tons), tons supplied and unmet per plant, tons shipped per source,
+    the total cost and the solver message.
+    """
+    supply = np.asarray(supply, dtype=np.float64)
+    demand = np.asarray(demand, dtype=np.float64)
+    cost = np.asarray(cost, dtype=np.float64)
+    n_src, n_plant = cost.shape
+    src, plant = np.nonzero(np.isfinite(cost) & (cost <= max_cost) & (supply[:, None] > 0) & (demand[None, :] > 0))
+    n_arcs = len(src)
+    # Variables: one flow per arc, then one unmet-demand slack per plant
+    c = np.concatenate([cost[src, plant], np.full(n_plant, unmet_penalty)])
+    arcs = np.arange(n_arcs)
+    a_ub = csc_matrix((np.ones(n_arcs), (src, arcs)), shape=(n_src, n_arcs + n_plant))
+    a_eq = csc_matrix((np.ones(n_arcs + n_plant), (np.concatenate([plant, np.arange(n_plant)]),
+                                                   np.concatenate([arcs, n_arcs + np.arange(n_plant)]))),
+                      shape=(n_plant, n_arcs + n_plant))
+    bounds = np.column_stack([np.zeros(n_arcs + n_plant), np.concatenate([np.full(n_arcs, np.inf), demand])])
+    res = linprog(c, A_ub=a_ub, b_ub=supply, A_eq=a_eq, b_eq=demand, bounds=bounds, method="highs")
+    flows = np.zeros((n_src, n_plant))
+    if res.status == 0:
+        flows[src, plant] = res.x[:n_arcs]
+        unmet = res.x[n_arcs:]
+    else:
+        unmet = demand.copy()
+    supplied = flows.sum(axis=0)
+    return {
+        "flows": flows,
+        "supplied": supplied,
+        "unmet": unmet,
+        "shipped": flows.sum(axis=1),
+        "cost": float((flows * np.where(np.isfinite(cost), cost, 0)).sum()),
+        "message": res.message,
+        "ok": res.status == 0,
+    }
+
+
+def allocation_tables(result, source_names, plant_names, coal_tons, cost):
+    """(plant summary, flows) DataFrames for a ``solve_allocation`` result.
+
+    The plant summary includes the biogas fraction each plant can reach
+    with the feedstock assigned to it (supplied / coal_tons).
+    """
+    coal_tons = np.asarray(coal_tons, dtype=np.float64)
+    demand = result["supplied"] + result["unmet"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        achievable = np.where(coal_tons > 0, result["supplied"] / coal_tons, np.nan)
+        avg_km = np.where(result["supplied"] > 0,
+                          (result["flows"] * np.where(np.isfinite(cost), cost, 0)).sum(axis=0) / result["supplied"],
+                          np.nan)
+    plants = pd.DataFrame({
+        "plant": list(plant_names),
+        "coal_tons": coal_tons,
+        "biogas_demand_tons": demand,
+        "supplied_tons": result["supplied"],
+        "unmet_tons": result["unmet"],
+        "achievable_biogas_frac": achievable,
+        "avg_haul_km": avg_km,
+    })
+    src, plant = np.nonzero(result["flows"] > 1e-6)
+    flows = pd.DataFrame({
+        "source": np.asarray(source_names, dtype=object)[src],
+        "plant": np.asarray(plant_names, dtype=object)[plant],
+        "tons": result["flows"][src, plant],
+        "km": cost[src, plant],
+    }).sort_values(["plant", "km"]).reset_index(drop=True)
+    return plants, flows
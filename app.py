@@ -1,22 +1,33 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
 import time
-import random
-from datetime import datetime
-from queue import Queue
 from pathlib import Path
 import altair as alt
 
-import paho.mqtt.client as mqtt
-import json
-import threading # Required for mqtt client in background thread
-import xml.etree.ElementTree as ET
-
 # For GIS map
 import folium
-from streamlit_folium import st_folium, folium_static
-import xml.etree.ElementTree as ET
+from streamlit_folium import st_folium
+
+import atexit
+
+from iot_buffer import TelemetryBuffer, HISTORY_CAPACITY
+from iot_storage import STORAGE_BACKENDS, BatchedWriter, feed_directory, move_flat_history
+from mqtt_ingest import IngestService, Feed
+from iot_anomaly import AnomalyDetector, column_flags, describe_flags
+from iot_forecast import HoltForecaster, CALIBRATION_HORIZONS_MIN, FORECAST_LEVEL
+from downsample import downsample, CHART_POINTS
+from iot_rollups import RollupSet, ROLLUP_WINDOWS
+from routing import RoutingEngine, graph_from_lines, graph_from_osm
+from dispersion import PlumeModel, heatmap_rgba, tons_per_year_to_g_per_s, STABILITY_CLASSES, STACK_HEIGHT_M
+from catchment import CatchmentIndex, catchment_table, CATCHMENT_BANDS_KM
+from allocation import (match_plants, solve_allocation, allocation_tables, load_feedstock_overrides,
+                        MAX_HAUL_KM)
+from kml_layer import cached_layer, bounds_to_bbox, to_geojson, point_rows, POINT, LINE, OUTER_RING
+from blend_model import (POLLUTANTS, PLANT_POLLUTANTS, SAFE_BIOGAS_FRAC, build_model_context,
+                         memo_scenario_table, evaluate_scenarios, sweep_values,
+                         optimize_blend, fleet_emissions, uncertainty_table, CI_LEVEL)
 
 # --- Configuration ---
 st.set_page_config(
@@ -92,73 +103,7 @@ st.markdown("""
 
 
 # --- Language/Translation Setup ---
-LANGUAGES = {
-    "English": {
-        "app_title": "HybridFuel: Biogas-Coal Optimization System",
-        "page_iot": "IoT Sensor Dashboard",
-        "page_ai": "Blend Optimizer",
-        "page_gis": "GIS Feedstock Map",
-        "iot_header": "Real-time Combustion Monitoring",
-        "iot_subheader": "Live data from IoT sensors (via MQTT)",
-        "current_temp": "Current Temperature",
-        "current_co2": "Current CO2 (Gas)",
-        
-        "current_pm25": "Current PM2.5 (Dust)",
-        "historical_temp": "Historical Temperature (°C)",
-        "historical_emissions": "Historical Emissions (ppm / µg/m³)",
-        "historical_data_header": "Historical Data Log",
-        "ai_header": "Fuel Blend Optimization",
-        "coal_input": "Coal Input (Tons/hour)",
-        "biogas_mix": "Biogas Mix (%)",
-        "optimize_button": "Run Optimization",
-        "ai_recommendation": "AI Recommendation",
-        "pred_power": "Predicted Power Output (MW)",
-        "pred_reduction": "Predicted PM2.5 Reduction",
-        "safety_check": "Safety & Feasibility Check",
-        "safety_ok": "✅ Biogas percentage is within safe operational parameters.",
-        "safety_warn": "⚠️ High biogas percentage (>40%) may require equipment retrofitting. Proceed with caution.",
-        "optimal_blend_is": "Optimal blend for max efficiency & min pollution:",
-        "gis_header": "GIS Feedstock & Logistics Dashboard",
-        "gis_subheader": "This dashboard will map regional waste feedstock sources, biogas generation potential, and industrial fuel demand.",
-        "gis_placeholder": "Simple map of India. Full GIS data will be integrated later.",
-    },
-    "Hindi (हिन्दी)": {
-        "app_title": "HybridFuel: बायोगैस-कोयला अनुकूलन प्रणाली",
-        "page_iot": "IoT सेंसर डैशबोर्ड",
-        "page_ai": "ब्लेंड ऑप्टिमाइज़र",
-        "page_gis": "GIS फीडस्टॉक मानचित्र",
-
-        "iot_header": "वास्तविक समय दहन निगरानी",
-        "iot_subheader": "IoT सेंसर से लाइव डेटा (MQTT के माध्यम से)",
-
-        "current_temp": "वर्तमान तापमान",
-        "current_co2": "वर्तमान CO2 (गैस)",
-        "current_pm25": "वर्तमान PM2.5 (धूल)",
-
-        "historical_temp": "ऐतिहासिक तापमान (°C)",
-        "historical_emissions": "ऐतिहासिक उत्सर्जन (ppm / µg/m³)",
-        "historical_data_header": "ऐतिहासिक डेटा लॉग",
-
-        "ai_header": "ईंधन मिश्रण अनुकूलन",
-        "coal_input": "कोयला इनपुट (टन/घंटा)",
-        "biogas_mix": "बायोगैस मिश्रण (%)",
-        "optimize_button": "अनुकूलन चलाएँ",
-
-        "ai_recommendation": "AI सिफ़ारिश",
-        "pred_power": "अनुमानित विद्युत उत्पादन (MW)",
-        "pred_reduction": "अनुमानित PM2.5 में कमी",
-
-        "safety_check": "सुरक्षा और व्यवहार्यता जांच",
-        "safety_ok": "✅ बायोगैस प्रतिशत सुरक्षित परिचालन सीमा के भीतर है।",
-        "safety_warn": "⚠️ उच्च बायोगैस प्रतिशत (>40%) के लिए उपकरणों में संशोधन आवश्यक हो सकता है। सावधानी से आगे बढ़ें।",
-
-        "optimal_blend_is": "अधिकतम दक्षता और न्यूनतम प्रदूषण के लिए इष्टतम मिश्रण:",
-
-        "gis_header": "GIS फीडस्टॉक और लॉजिस्टिक्स डैशबोर्ड",
-        "gis_subheader": "यह डैशबोर्ड क्षेत्रीय अपशिष्ट फीडस्टॉक स्रोतों, बायोगैस उत्पादन क्षमता और औद्योगिक ईंधन मांग को मैप करेगा।",
-        "gis_placeholder": "भारत का सरल मानचित्र। पूर्ण GIS डेटा बाद में एकीकृत किया जाएगा।",
-    }
-}
+from translations import LANGUAGES
 
 # --- Language Selection in Top Right (using columns) ---
 col1, col_spacer, col2 = st.columns([5, 1, 1])
@@ -194,213 +139,216 @@ with col1:
     elif st.session_state.current_page == "gis":
         st.header(T["gis_header"])
 
-# --- MQTT Client Setup with Queue ---
+# --- MQTT Ingest Setup (shared by all sessions) ---
 BROKER = "broker.hivemq.com"
 PORT = 1883
 
-# MQTT Topics for different sensor locations (currently all use the same topic)
+# MQTT topic filters for the sensor locations. All of them are subscribed at once and
+# wildcards ("+", "#") are allowed; sites that share a filter share one history buffer.
 MQTT_TOPICS = {
     "Jharkhand": "proyek/iot/sl2_ignis",
     "Chhattisgarh": "proyek/iot/sl2_ignis",  # Same topic for now
     "Odisha": "proyek/iot/sl2_ignis"  # Same topic for now
 }
 
-# Global variable for current subscribed topic (to avoid session state in callbacks)
-current_subscribed_topic = "proyek/iot/sl2_ignis"
-
-# Initialize session state variables
-if 'mqtt_client_initialized' not in st.session_state:
-    st.session_state.mqtt_client_initialized = False
-    st.session_state.mqtt_data_queue = Queue()
-    st.session_state.latest_mqtt_data = {
-        "timestamp": datetime.now(),
-        "Temperature": 0.0,
-          "CO2": 0.0, 
-          "PM2_5": 0, 
-        "status": "NOT FOUND"
-    }
-
-# Get queue reference (thread-safe, no session state access needed)
-if 'mqtt_data_queue' not in st.session_state:
-    st.session_state.mqtt_data_queue = Queue()
+# Bounded hand-off between the MQTT thread and the drain thread (see mqtt_ingest.IngestQueue)
+INGEST_QUEUE_SIZE = 10_000
+INGEST_QUEUE_POLICY = "drop_oldest"   # when full: "drop_oldest", "coalesce" (keep latest per topic) or "block"
 
-# Use a module-level variable for the queue to avoid session state access in callbacks
-_mqtt_queue = st.session_state.mqtt_data_queue
+# Topic the single-site history (iot_history.csv / flat iot_history/) was recorded from
+LEGACY_TOPIC = "proyek/iot/sl2_ignis"
 
-# File to persist history between restarts
+# Legacy single-file history (migrated into HISTORY_DIR on first start)
 DATA_FILE = Path(__file__).parent / "iot_history.csv"
 
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        print("MQTT: Connected to Broker!")
-        client.subscribe(current_subscribed_topic)
-    else:
-        print(f"MQTT: Failed to connect, return code {rc}")
-
-def on_message(client, userdata, msg):
+# Append-only history storage and write-path tuning
+HISTORY_DIR = Path(__file__).parent / "iot_history"
+HISTORY_BACKEND = "columnar"   # "columnar" (memory-mapped binary columns) or "csv" (text segments)
+# Stored readings replayed into each feed's anomaly detector at startup
+ANOMALY_WARM_ROWS = 2000
+# Stored readings replayed into each feed's forecaster (enough to calibrate the 60 min band)
+FORECAST_WARM_ROWS = 5000
+SEGMENT_ROWS = 50_000      # rotate to a new segment file after this many rows
+FLUSH_ROWS = 200           # write a batch once this many rows are pending...
+FLUSH_INTERVAL_S = 10.0    # ...or once the oldest pending row is this many seconds old
+FSYNC_INTERVAL_S = 60.0    # 0 = fsync every batch, None = never fsync explicitly
+
+@st.cache_resource
+def get_history_writer(topic_filter):
+    """Process-wide batched writer for one topic filter's history store."""
+    directory = feed_directory(HISTORY_DIR, topic_filter)
+    if topic_filter == LEGACY_TOPIC:
+        move_flat_history(HISTORY_DIR, directory)
+    store = STORAGE_BACKENDS[HISTORY_BACKEND](directory, segment_rows=SEGMENT_ROWS)
     try:
-        raw_data = msg.payload.decode()
-        # print(f"\n[RAW DATA TERIMA]: {raw_data}")
-        data = json.loads(raw_data)
-
-        # AMBIL DATA SATU PER SATU (FETCHING)
-        dust = data.get('pm25', 0.0)      # Debu level (%)
-        gas = data.get('gas', 0.0)        # Udara quality (ppb)
-        temp = data.get('temp', 0.0)      # Suhu (°C)
-        status = data.get('status', 'UNKNOWN')
-
-        # # --- DISINI TEMANMU OLAH DATANYA ---
-        # print(f"--- PARSED DATA ---")
-        # print(f"Debu   : {dust} %")
-        # print(f"Udara  : {gas} ppb")
-        # print(f"Suhu   : {temp} C")
-        # print(f"Status : {status}")
-
-        # Contoh Logic Olah Data:
-        if status == "DANGER":
-            print(">>> WARNING: DATA BAHAYA TERCATAT KE DATABASE! <<<")
-
-        new_iot_data = {
-            "timestamp": datetime.now(),
-            "Temperature": temp,
-            "CO2": gas, 
-            "PM2_5": dust,
-            "status": status
-        }
-
-        # Put data in queue (thread-safe, no session state access)
-        _mqtt_queue.put(new_iot_data)
-        
+        if topic_filter == LEGACY_TOPIC:
+            store.adopt_legacy(DATA_FILE)
     except Exception as e:
-        print(f"MQTT: Error parsing message: {e}")
-
-if st.session_state.mqtt_client_initialized == False:
-    client = mqtt.Client()
-    client.on_connect = on_connect
-    client.on_message = on_message
-
-    try:
-        client.connect(BROKER, PORT, 60)
-        client.loop_start() # Start background thread for MQTT
-        st.session_state.mqtt_client_instance = client # Store client instance
-        st.session_state.mqtt_client_initialized = True
-        print("MQTT client setup complete and loop started.")
-    except Exception as e:
-        print(f"MQTT: Failed to connect to broker: {e}")
-        st.error(f"Failed to connect to MQTT broker: {e}")
-
-# --- Initialize Session State for IoT Data ---
-if 'iot_history' not in st.session_state:
-    # Try to load persisted history from CSV
-    if DATA_FILE.exists():
+        print(f"Failed to migrate {DATA_FILE.name}: {e}")
+    writer = BatchedWriter(store, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL_S,
+                           fsync_interval=FSYNC_INTERVAL_S)
+    atexit.register(writer.flush)
+    return writer
+
+@st.cache_resource
+def get_ingest_service(broker, port):
+    """One shared MQTT connection per broker for the whole process (not per session)."""
+    feeds = {}
+    for topic_filter in dict.fromkeys(MQTT_TOPICS.values()):
+        writer = get_history_writer(topic_filter)
+        # Fixed-capacity columnar ring buffer per topic filter, rebuilt from its store
+        # (only the newest HISTORY_CAPACITY rows are copied into memory)
+        history = TelemetryBuffer(HISTORY_CAPACITY)
         try:
-            df = pd.read_csv(DATA_FILE, parse_dates=['timestamp'])
-            # Ensure expected columns exist
-            expected = ["timestamp", "Temperature", "CO2", "PM2_5", "status"]
-            for c in expected:
-                if c not in df.columns:
-                    df[c] = 0 if c != 'timestamp' else pd.NaT
-            st.session_state.iot_history = df[ ["timestamp", "Temperature", "CO2", "PM2_5", "status"] ]
-        except Exception:
-            st.session_state.iot_history = pd.DataFrame(columns=["timestamp", "Temperature", "CO2", "PM2_5", "status"])
-    else:
-        st.session_state.iot_history = pd.DataFrame(columns=["timestamp", "Temperature", "CO2", "PM2_5", "status"])
-
-# --- Helper Function for IoT Data ---
-def get_new_iot_data():
-    """Generates a new row of fake IoT data (now unused, data comes from MQTT)."""
-    # This function is now effectively replaced by MQTT data, but kept for structure if needed
-    return {
-        "timestamp": datetime.now(),
-        "Temperature": 0.0,
-        "CO2": 0.0,
-        "PM2_5": 0
-    }
-
-def append_to_history(new_data_row):
-    """Appends new data to the session state history."""
-    new_df_row = pd.DataFrame([new_data_row])
-    # Use a lock if iot_history is modified from non-Streamlit thread
-    # For simplicity, assuming Streamlit's rerun mechanism handles eventual consistency
-    st.session_state.iot_history = pd.concat(
-        [st.session_state.iot_history, new_df_row],
-        ignore_index=True
-    )
-    # Unlimited history
-
-# --- Page 1: IoT Sensor Dashboard ---
-def page_iot():
-    st.subheader(T["iot_subheader"])
-    # Sensor Location Selection and Monitoring in one row
-    st.markdown("""
-    <style>
-    .sensor-row {
-        display: flex;
-        align-items: flex-end;
-        gap: 1rem;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    with st.container():
-        col_sel, col_mon = st.columns([1, 1])
-        
-        with col_sel:
-            sensor_locations = ["Jharkhand", "Chhattisgarh", "Odisha"]
-            if 'selected_sensor' not in st.session_state:
-                st.session_state.selected_sensor = "Jharkhand"
-            
-            st.session_state.selected_sensor = st.selectbox(
-                "Select Sensor Location:",
-                options=sensor_locations,
-                index=sensor_locations.index(st.session_state.selected_sensor)
-            )
-        
-        with col_mon:
-            st.info(f"📍 Currently monitoring: **{st.session_state.selected_sensor}**")
-    
-    # Handle topic change if sensor location changed
-    global current_subscribed_topic
-    new_topic = MQTT_TOPICS[st.session_state.selected_sensor]
-    if new_topic != current_subscribed_topic:
-        # Unsubscribe from old topic and subscribe to new one
-        if st.session_state.mqtt_client_instance:
-            st.session_state.mqtt_client_instance.unsubscribe(current_subscribed_topic)
-            st.session_state.mqtt_client_instance.subscribe(new_topic)
-            print(f"MQTT: Switched topic from {current_subscribed_topic} to {new_topic}")
-        current_subscribed_topic = new_topic
-    
-    # (Import moved below historical data table)
-
-    # Process all pending messages from MQTT queue
-    while not st.session_state.mqtt_data_queue.empty():
+            history.extend_frame(writer.load())
+        except Exception as e:
+            print(f"Failed to load history store for {topic_filter}: {e}")
+        # 1 min / 15 min / 1 h aggregates, persisted next to the raw history
+        rollups = RollupSet(feed_directory(HISTORY_DIR, topic_filter))
         try:
-            latest_data = st.session_state.mqtt_data_queue.get_nowait()
-            st.session_state.latest_mqtt_data = latest_data
-            
-            # Add to history if it's new
-            if len(st.session_state.iot_history) == 0 or latest_data['timestamp'] != st.session_state.iot_history.iloc[-1]['timestamp']:
-                new_df_row = pd.DataFrame([latest_data])
-                st.session_state.iot_history = pd.concat(
-                    [st.session_state.iot_history, new_df_row],
-                    ignore_index=True
-                )
-                # Unlimited history
-                # Persist history to CSV so data survives restarts
-                try:
-                    st.session_state.iot_history.to_csv(DATA_FILE, index=False)
-                except Exception as e:
-                    print(f"Failed to save history to CSV: {e}")
-        except:
-            pass
-    
-    latest_data = st.session_state.latest_mqtt_data
-    
-    col1, col2 = st.columns(2)
-
-    # =====================
-    # STATUS CARD
-    # =====================
+            rollups.load(history.frame())
+        except Exception as e:
+            print(f"Failed to load rollups for {topic_filter}: {e}")
+        # Streaming spike/drift/stuck detector, primed with the newest stored readings
+        detector = AnomalyDetector()
+        detector.score_frame(history.frame(ANOMALY_WARM_ROWS))
+        # Online Holt forecaster, updated with every reading from here on
+        forecaster = HoltForecaster()
+        forecaster.update_frame(history.frame(FORECAST_WARM_ROWS))
+        feeds[topic_filter] = Feed(topic_filter, history, writer, rollups, detector, forecaster)
+    service = IngestService(broker, port, MQTT_TOPICS, feeds,
+                            queue_size=INGEST_QUEUE_SIZE, queue_policy=INGEST_QUEUE_POLICY)
+    atexit.register(service.stop)
+    return service.start()
+
+ingest_service = get_ingest_service(BROKER, PORT)
+
+# Per-session cursors into the shared per-site histories (sessions only read, never connect)
+if 'iot_cursors' not in st.session_state:
+    st.session_state.iot_cursors = {}
+
+# --- Live IoT Panel (refreshed as a fragment) ---
+# How often the live panel polls the ingest service for new readings (seconds)
+LIVE_REFRESH_S = 1.0
+# Charts are reduced server-side to about CHART_POINTS points per series
+CHART_DOWNSAMPLE = "minmax"   # "minmax" keeps every peak, "lttb" follows the line shape more closely
+# Rows per page in the history table
+TABLE_PAGE_SIZES = [50, 200, 1000]
+# Recent readings summarised on the recommendations card (~1 h at one reading every 5 s)
+ANOMALY_WINDOW = 720
+# Newest flagged readings marked on each raw chart
+ANOMALY_CHART_POINTS = 500
+ANOMALY_MESSAGES = {
+    "spike": "⚡ Sudden {label} spike. Check the sensor and the process.",
+    "drift": "📈 {label} is drifting away from its usual level.",
+    "stuck": "🔧 {label} reading has not changed for a while. The sensor may be stuck.",
+}
+SENSOR_LABELS = {"Temperature": "temperature", "CO2": "CO₂", "PM2_5": "dust"}
+
+def _feed_forecast(site, feed):
+    """Forecast for the site's feed, recomputed only when a new reading has arrived."""
+    cache = st.session_state.get('iot_forecast_cache')
+    key = (site, feed.version)
+    if cache is None or cache[0] != key:
+        cache = (key, feed.forecaster.forecast() if feed.forecaster is not None else {})
+        st.session_state.iot_forecast_cache = cache
+    return cache[1]
+
+def _raw_chart(series_df, flagged_df, column, y_min=None, forecast_df=None):
+    """Downsampled line for one raw series, flagged readings in red and the forecast band."""
+    if y_min is not None:
+        y_max = series_df[column].max() if not series_df[column].isnull().all() else y_min
+        scale = alt.Scale(domain=[y_min, y_max])
+    else:
+        scale = alt.Scale(zero=False)
+    layers = [alt.Chart(series_df).mark_line().encode(
+        x=alt.X('timestamp:T', title='Timestamp'),
+        y=alt.Y(f'{column}:Q', scale=scale),
+        tooltip=['timestamp:T', column])]
+    if not flagged_df.empty:
+        layers.append(alt.Chart(flagged_df).mark_point(color='red', filled=True, size=40).encode(
+            x='timestamp:T', y=f'{column}:Q', tooltip=['timestamp:T', column, 'anomaly:N']))
+    if forecast_df is not None:
+        fc = alt.Chart(forecast_df).encode(x='timestamp:T')
+        layers.append(fc.mark_area(color='orange', opacity=0.2).encode(y='lower:Q', y2='upper:Q'))
+        layers.append(fc.mark_line(color='orange', strokeDash=[4, 3]).encode(
+            y='mean:Q', tooltip=['timestamp:T', 'horizon_min', 'mean', 'lower', 'upper']))
+    return alt.layer(*layers).interactive()
+
+def _flagged_rows(history_df, column):
+    """Newest ANOMALY_CHART_POINTS readings with an anomaly flag on ``column``."""
+    flagged = history_df.loc[column_flags(history_df["anomaly"].to_numpy(), column), [column, "anomaly"]]
+    flagged = flagged.iloc[-ANOMALY_CHART_POINTS:].reset_index()
+    flagged["anomaly"] = [", ".join(kind for c, kind in describe_flags(m) if c == column) for m in flagged["anomaly"]]
+    return flagged
+
+def _rollup_chart(rollup_df, column, title, y_min=None):
+    """Mean line with a min-max band for one series of a rollup table."""
+    base = alt.Chart(rollup_df).encode(x=alt.X('bucket:T', title='Timestamp'))
+    scale = alt.Scale(domain=[y_min, rollup_df[f"{column}_max"].max()]) if y_min is not None else alt.Scale(zero=False)
+    band = base.mark_area(opacity=0.25).encode(
+        y=alt.Y(f'{column}_min:Q', title=title, scale=scale), y2=f'{column}_max:Q')
+    line = base.mark_line().encode(
+        y=f'{column}_mean:Q',
+        tooltip=['bucket:T', f'{column}_mean', f'{column}_min', f'{column}_max', 'danger', 'warning'])
+    return (band + line).interactive()
+
+def _history_charts(site, feed, resolution="Raw"):
+    """Build the history charts once per new reading and reuse them on idle refreshes."""
+    cache = st.session_state.get('iot_chart_cache')
+    key = (site, feed.version, resolution)
+    if cache is not None and cache[0] == key:
+        return cache[1]
+
+    if resolution != "Raw" and feed.rollups is not None:
+        # Pre-aggregated buckets, merged further so the chart gets at most CHART_POINTS rows
+        rollup_df = feed.rollups.frame(resolution, max_points=CHART_POINTS)
+        charts = None
+        if not rollup_df.empty:
+            charts = {
+                "rollup": True,
+                "Temperature": _rollup_chart(rollup_df, "Temperature", "Temperature", y_min=10),
+                "CO2": _rollup_chart(rollup_df, "CO2", "CO2"),
+                "PM2_5": _rollup_chart(rollup_df, "PM2_5", "PM2_5"),
+            }
+        st.session_state.iot_chart_cache = (key, charts)
+        return charts
+
+    # frame() is a view over the ring buffer, no full copy
+    history_df = feed.history.frame().set_index("timestamp")
+    charts = None
+    if not history_df.empty:
+        # Each series is downsampled on its own so peaks in one are not lost to another
+        series = {c: downsample(history_df[[c]], c, CHART_POINTS, CHART_DOWNSAMPLE)
+                  for c in ["Temperature", "CO2", "PM2_5"]}
+        # Flags and forecasts were computed at ingest time; the charts only read them
+        forecast = _feed_forecast(site, feed)
+        raw_charts = {}
+        for c in series:
+            try:
+                # Temperature y-axis starts at 10
+                raw_charts[c] = _raw_chart(series[c].reset_index(), _flagged_rows(history_df, c), c,
+                                           y_min=10 if c == "Temperature" else None,
+                                           forecast_df=forecast.get(c))
+            except Exception:
+                raw_charts[c] = None
+        charts = {
+            "rollup": False,
+            "raw": raw_charts,
+            "series": series,
+        }
+    st.session_state.iot_chart_cache = (key, charts)
+    return charts
+
+def _panel_state(site, feed):
+    """Status card, recommendations and metric deltas, rebuilt only when the feed has changed."""
+    cache = st.session_state.get('iot_panel_cache')
+    key = (site, feed.version)
+    if cache is not None and cache[0] == key:
+        return cache[1]
+
+    history = feed.history
+    latest_data = feed.latest
     status = latest_data["status"]
 
     if status == "DANGER":
@@ -413,26 +361,6 @@ def page_iot():
         status_color = "#52c41a"
         status_icon = "✅"
 
-    with col1:
-        st.markdown(f"""
-        <div style="
-            border: 2px solid {status_color};
-            border-radius: 12px;
-            padding: 20px;
-            background-color: #ffffff;
-        ">
-            <h3>System Status</h3>
-            <p style="
-                color:{status_color};
-                font-size:20px;
-                font-weight:bold;
-                margin-top:10px;
-            ">
-                {status_icon} {status}
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-
     temp = latest_data['Temperature']
     gas = latest_data['CO2']
     dust = latest_data['PM2_5']
@@ -450,10 +378,83 @@ def page_iot():
     if dust > 50:
         recommendations.append("🌫️ High dust levels. Clean filters or reduce particulate sources.")
 
+    # Anomaly flags on the newest reading, then a count over the recent window
+    for column, kind in describe_flags(latest_data.get("anomaly", 0)):
+        recommendations.append(ANOMALY_MESSAGES[kind].format(label=SENSOR_LABELS[column]))
+    recent_flags = history.frame(ANOMALY_WINDOW)["anomaly"].to_numpy()
+    n_flagged = int(np.count_nonzero(recent_flags))
+    if n_flagged:
+        recommendations.append(f"🔎 {n_flagged} of the last {len(recent_flags)} readings were flagged as anomalous.")
+
     if not recommendations:
         recommendations.append("✅ All parameters within optimal range. System operating normally.")
 
-    rec_html = "".join(f"<li>{r}</li>" for r in recommendations)
+    state = {
+        "latest": latest_data,
+        # Calculate deltas for metrics. Handle initial state where history might be empty or short.
+        "prev": history.last(2) or latest_data,
+        "status": status,
+        "status_color": status_color,
+        "status_icon": status_icon,
+        "rec_html": "".join(f"<li>{r}</li>" for r in recommendations),
+    }
+    st.session_state.iot_panel_cache = (key, state)
+    return state
+
+def _table_page(site, feed, page_size, page):
+    """One page of the history table (newest first), sliced again only when the feed or page changes."""
+    cache = st.session_state.get('iot_table_cache')
+    key = (site, feed.version, page_size, page)
+    if cache is None or cache[0] != key:
+        history_frame = feed.history.frame()
+        end = len(history_frame) - (page - 1) * page_size
+        cache = (key, history_frame.iloc[max(end - page_size, 0):end].iloc[::-1].copy())
+        st.session_state.iot_table_cache = cache
+    return cache[1]
+
+@st.fragment(run_every=LIVE_REFRESH_S)
+def iot_live_panel():
+    """Status, recommendations, metrics and charts for the selected site.
+
+    A timed fragment: every tick and every widget change (resolution,
+    forecast horizon, table page) rerun only this block, never the page.
+    Cards, metrics, forecast, chart specs and the table page are cached
+    per feed version, so an idle tick only re-emits them.
+    """
+    site = st.session_state.selected_sensor
+    feed = ingest_service.feed(site)
+    st.session_state.iot_cursors[site] = feed.version
+    panel = _panel_state(site, feed)
+    latest_data = panel["latest"]
+
+    col1, col2 = st.columns(2)
+
+    # =====================
+    # STATUS CARD
+    # =====================
+    status_color, status_icon, status = panel["status_color"], panel["status_icon"], panel["status"]
+
+    with col1:
+        st.markdown(f"""
+        <div style="
+            border: 2px solid {status_color};
+            border-radius: 12px;
+            padding: 20px;
+            background-color: #ffffff;
+        ">
+            <h3>System Status</h3>
+            <p style="
+                color:{status_color};
+                font-size:20px;
+                font-weight:bold;
+                margin-top:10px;
+            ">
+                {status_icon} {status}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    rec_html = panel["rec_html"]
 
     with col2:
         st.markdown(f"""
@@ -475,42 +476,122 @@ def page_iot():
     st.divider()
     col1, col2, col3 = st.columns(3)
 
-    # Calculate deltas for metrics. Handle initial state where history might be empty or short.
-    prev_temp = st.session_state.iot_history.iloc[-2]['Temperature'] if len(st.session_state.iot_history) > 1 else latest_data['Temperature']
-    prev_gas = st.session_state.iot_history.iloc[-2]['CO2'] if len(st.session_state.iot_history) > 1 else latest_data['CO2']
-    prev_dust = st.session_state.iot_history.iloc[-2]['PM2_5'] if len(st.session_state.iot_history) > 1 else latest_data['PM2_5']
+    prev_row = panel["prev"]
+    prev_temp = prev_row['Temperature']
+    prev_gas = prev_row['CO2']
+    prev_dust = prev_row['PM2_5']
 
     col1.metric(T["current_temp"], f"{latest_data['Temperature']:.1f} °C", f"{latest_data['Temperature'] - prev_temp:+.1f}")
     col2.metric(T["current_co2"], f"{latest_data['CO2']:.1f} ppb", f"{latest_data['CO2'] - prev_gas:+.1f}") # Air quality (gas in ppb)
     col3.metric(T["current_pm25"], f"{latest_data['PM2_5']:.1f} %", f"{latest_data['PM2_5'] - prev_dust:+.1f}") # Dust level in %
+
+    # Short-horizon forecast from the feed's online model (no refit on rerun)
+    forecast = _feed_forecast(site, feed)
+    if forecast:
+        horizon = st.select_slider("Forecast horizon (min)", options=CALIBRATION_HORIZONS_MIN, value=30,
+                                   key="iot_forecast_horizon")
+        units = {"Temperature": "°C", "CO2": "ppb", "PM2_5": "%"}
+        for col, column in zip(st.columns(3), ["Temperature", "CO2", "PM2_5"]):
+            if column not in forecast:
+                continue
+            fc = forecast[column].set_index("horizon_min").loc[horizon]
+            col.metric(f"{column} in {horizon} min",
+                       f"{fc['mean']:.1f} {units[column]}", f"{fc['mean'] - latest_data[column]:+.1f}",
+                       delta_color="off", help=f"{FORECAST_LEVEL}% band {fc['lower']:.1f} – {fc['upper']:.1f} {units[column]}")
     st.divider()
 
     # Display historical charts
-    history_df = st.session_state.iot_history.set_index("timestamp")
+    resolution = st.radio("Chart resolution", ["Raw"] + list(ROLLUP_WINDOWS), horizontal=True, key="iot_resolution")
+    charts = _history_charts(site, feed, resolution)
 
-    if not history_df.empty:
+    if charts is not None and charts["rollup"]:
         st.subheader(T["historical_temp"])
-        # Altair chart with y-axis starting at 10
-        temp_df = history_df["Temperature"].reset_index().rename(columns={'timestamp': 'timestamp', 'Temperature': 'Temperature'})
-        try:
-            chart = alt.Chart(temp_df).mark_line().encode(
-                x=alt.X('timestamp:T', title='Timestamp'),
-                y=alt.Y('Temperature:Q', scale=alt.Scale(domain=[10, temp_df['Temperature'].max() if not temp_df['Temperature'].isnull().all() else 10])),
-                tooltip=['timestamp:T','Temperature']
-            ).interactive()
-            st.altair_chart(chart, use_container_width=True)
-        except Exception:
-            # Fallback
-            st.line_chart(history_df["Temperature"])
-
+        st.altair_chart(charts["Temperature"], use_container_width=True)
         st.subheader("Historical Gas (CO2) - ppb")
-        st.line_chart(history_df[["CO2"]])
-
+        st.altair_chart(charts["CO2"], use_container_width=True)
         st.subheader("Historical Dust (PM2.5) - %")
-        st.line_chart(history_df[["PM2_5"]])
-
+        st.altair_chart(charts["PM2_5"], use_container_width=True)
+
+    if charts is not None and not charts["rollup"]:
+        series = charts["series"]
+        titles = {"Temperature": T["historical_temp"], "CO2": "Historical Gas (CO2) - ppb",
+                  "PM2_5": "Historical Dust (PM2.5) - %"}
+        for column, title in titles.items():
+            st.subheader(title)
+            if charts["raw"][column] is not None:
+                st.altair_chart(charts["raw"][column], use_container_width=True)
+            else:
+                # Fallback
+                st.line_chart(series[column])
+
+    if charts is not None:
+        # Paged history table: only the visible page is sent to the browser
         st.subheader(T["historical_data_header"])
-        st.dataframe(st.session_state.iot_history.sort_values('timestamp', ascending=False), use_container_width=True, height=400)
+        n_rows = len(feed.history)
+        col_size, col_page, col_info = st.columns([1, 1, 2])
+        page_size = col_size.selectbox("Rows per page", TABLE_PAGE_SIZES, key="iot_page_size")
+        n_pages = max(-(-n_rows // page_size), 1)
+        page = col_page.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key="iot_page")
+        col_info.caption(f"{n_rows} readings, newest first ({n_pages} pages)")
+        st.dataframe(_table_page(site, feed, page_size, page), use_container_width=True, height=400)
+
+
+# --- Page 1: IoT Sensor Dashboard ---
+def page_iot():
+    st.subheader(T["iot_subheader"])
+    # Sensor Location Selection and Monitoring in one row
+    st.markdown("""
+    <style>
+    .sensor-row {
+        display: flex;
+        align-items: flex-end;
+        gap: 1rem;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+    
+    with st.container():
+        col_sel, col_mon = st.columns([1, 1])
+        
+        with col_sel:
+            sensor_locations = ["Jharkhand", "Chhattisgarh", "Odisha"]
+            if 'selected_sensor' not in st.session_state:
+                st.session_state.selected_sensor = "Jharkhand"
+            
+            st.session_state.selected_sensor = st.selectbox(
+                "Select Sensor Location:",
+                options=sensor_locations,
+                index=sensor_locations.index(st.session_state.selected_sensor)
+            )
+        
+        with col_mon:
+            st.info(f"📍 Currently monitoring: **{st.session_state.selected_sensor}**")
+    
+    # Every site is already subscribed and buffered by the shared ingest service, so
+    # switching location is just a lookup: no broker round-trip, no gap in history.
+    if ingest_service.last_error and not ingest_service.connected:
+        st.error(f"MQTT broker connection problem: {ingest_service.last_error}")
+    queue_stats = ingest_service.queue.stats()
+    if queue_stats["dropped"] or queue_stats["coalesced"]:
+        st.caption(f"Ingest queue ({queue_stats['policy']}): {queue_stats['dropped']} dropped, "
+                   f"{queue_stats['coalesced']} replaced by a newer reading while full, peak depth {queue_stats['high_watermark']}"
+                   f"/{queue_stats['maxsize']}")
+
+    # Live cards, metrics and charts refresh on their own (a timed fragment, not a page rerun)
+    iot_live_panel()
+
+    site = st.session_state.selected_sensor
+    feed = ingest_service.feed(site)
+    history_writer = feed.writer
+    history_frame = feed.history.frame()
+
+    if not history_frame.empty:
+        # CSV export of the full persisted history (built on demand, not on every rerun)
+        if st.button("Prepare history CSV export"):
+            st.session_state.history_export = (site, history_writer.load().to_csv(index=False).encode())
+        if st.session_state.get('history_export', (None,))[0] == site:
+            st.download_button("Download history CSV", st.session_state.history_export[1],
+                               file_name=f"iot_history_{site}.csv", mime="text/csv")
 
         # CSV importer placed below historical data table
         uploaded = st.file_uploader("Import history CSV", type=["csv"], accept_multiple_files=False)
@@ -530,16 +611,13 @@ def page_iot():
                         imported_df = imported_df[["timestamp", "Temperature", "CO2", "PM2_5"]]
                         # ensure timestamp dtype
                         imported_df['timestamp'] = pd.to_datetime(imported_df['timestamp'])
-                        if mode == 'replace':
-                            st.session_state.iot_history = imported_df
-                        else:
-                            combined = pd.concat([st.session_state.iot_history, imported_df], ignore_index=True)
-                            combined = combined.drop_duplicates(subset=['timestamp'])
-                            combined = combined.sort_values('timestamp')
-                            st.session_state.iot_history = combined
-                        # persist
+                        # persist (replaces the shared history for every session)
                         try:
-                            st.session_state.iot_history.to_csv(DATA_FILE, index=False)
+                            if mode == 'replace':
+                                feed.replace_history(imported_df)
+                            else:
+                                # Merged with the whole store, not just the rows held in memory
+                                feed.merge_history(imported_df)
                             st.success('Import applied and saved')
                             st.rerun()  # Refresh charts with new data
                         except Exception as e:
@@ -547,44 +625,54 @@ def page_iot():
             except Exception as e:
                 st.error(f"Failed to parse uploaded CSV: {e}")
 
-    # Periodic rerun every 5 seconds to refresh data
-    time.sleep(5)
-    st.rerun()
+# --- Fleet Model Setup ---
+# Optional extra plants (CSV with plant_name, coal_tons and optionally TSP, PM10, PM2.5, SO2)
+PLANT_REGISTRY_FILE = Path(__file__).parent / "plants.csv"
+# Biogas fractions precomputed for the fleet view (the slider picks the nearest one)
+FLEET_FRAC_GRID = np.round(np.linspace(0.0, 1.0, 101), 2)
+
+def _file_mtime(path):
+    return path.stat().st_mtime_ns if path.exists() else None
+
+@st.cache_resource
+def get_model_context(path, mtime):
+    """Plant registry and emission factors, built once per process.
+
+    ``mtime`` is part of the cache key, so editing PLANT_REGISTRY_FILE
+    rebuilds the context on the next rerun.
+    """
+    return build_model_context(path)
+
+@st.cache_data(max_entries=64)
+def get_fleet_grid(path, mtime, esp, fgd):
+    """Emissions of every plant over FLEET_FRAC_GRID for one ESP/FGD setting."""
+    return fleet_emissions(get_model_context(path, mtime)["df_plants"], FLEET_FRAC_GRID, esp, fgd)
+
+# Monte Carlo draw counts offered in the results table (fixed seed: reruns are stable)
+MC_DRAW_OPTIONS = [10_000, 100_000, 1_000_000]
+MC_SEED = 42
+
+@st.cache_data(max_entries=32)
+def get_uncertainty_table(coal_consumption, biogas_frac, esp, fgd, coal_baseline, path, mtime, n_draws):
+    """Results table with confidence intervals for one input state."""
+    model = get_model_context(path, mtime)
+    return uncertainty_table(coal_consumption, biogas_frac, esp, fgd, coal_baseline, model["df_plants"],
+                             n_draws=n_draws, biogas_ef=model["biogas_EF"], seed=MC_SEED)
+
+@st.cache_data(max_entries=32)
+def run_optimizer(coal_consumption, coal_baseline, weights, targets, frac_bounds, esp_bounds, fgd_bounds, biogas_ef):
+    """optimize_blend with a bounded LRU over identical slider/input states."""
+    return optimize_blend(coal_consumption, coal_baseline, weights=weights, targets=targets,
+                          frac_bounds=frac_bounds, esp_bounds=esp_bounds, fgd_bounds=fgd_bounds,
+                          biogas_ef=biogas_ef)
 
 # --- Page 2: AI Blend Optimizer ---
 def page_ai_optimizer():
-    # ---------------------------------------------------
-    # 1. REAL COAL PLANT DATA (YOUR PROVIDED DATA)
-    # ---------------------------------------------------
-    plants_data = [
-        {'plant_name':'North Karanpura STPP','coal_tons':7969147,'TSP':23907,'PM10':14344,'PM2.5':12910,'SO2':55784},
-        {'plant_name':'Patratu STPP','coal_tons':8229144,'TSP':28802,'PM10':17281,'PM2.5':15553,'SO2':41146},
-        {'plant_name':'Tenughat TPS','coal_tons':2233800,'TSP':15637,'PM10':9382,'PM2.5':8444,'SO2':13403},
-        {'plant_name':'Talcher Kaniha','coal_tons':10704720,'TSP':42819,'PM10':25691,'PM2.5':23122,'SO2':85638},
-        {'plant_name':'Darlipali','coal_tons':8563776,'TSP':29117,'PM10':17470,'PM2.5':15723,'SO2':33913},
-        {'plant_name':'IB Thermal','coal_tons':9493650,'TSP':34177,'PM10':20506,'PM2.5':18456,'SO2':28196},
-        {'plant_name':'Korba Super Thermal','coal_tons':9825216,'TSP':29476,'PM10':17685,'PM2.5':15917,'SO2':29181},
-        {'plant_name':'Sipat Super Thermal','coal_tons':10233432,'TSP':34794,'PM10':20876,'PM2.5':18789,'SO2':50655}
-    ]
-
-    df_plants = pd.DataFrame(plants_data)
-
-    # ---------------------------------------------------
-    # LEARN AVERAGE COAL EMISSION FACTORS
-    # ---------------------------------------------------
-    pollutants = ["TSP", "PM10", "PM2.5", "SO2"]
-    coal_EF_real = {pol: (df_plants[pol] / df_plants["coal_tons"]).mean() for pol in pollutants}
-
-    # ---------------------------------------------------
-    # BIOGAS EMISSION FACTORS (tons/ton fuel)
-    # ---------------------------------------------------
-    biogas_EF = {
-        'TSP':   0.05/1000,
-        'PM10':  0.05/1000,
-        'PM2.5': 0.02/1000,
-        'SO2':   0.01/1000,
-        'NOx':   0.50/1000
-    }
+    # Static model inputs (plants, emission factors) are built once per process
+    registry_mtime = _file_mtime(PLANT_REGISTRY_FILE)
+    model = get_model_context(PLANT_REGISTRY_FILE, registry_mtime)
+    df_plants = model["df_plants"]
+    biogas_EF = model["biogas_EF"]
 
     # ---------------------------------------------------
     # STREAMlit UI
@@ -630,9 +718,6 @@ def page_ai_optimizer():
     # ---------------------------------------------------
     # CALCULATE OUTPUTS
     # ---------------------------------------------------
-    coal_share = 1 - biogas_frac
-    bio_share = biogas_frac
-
     coal_baseline = {
         "TSP": TSP_in,
         "PM10": PM10_in,
@@ -641,113 +726,341 @@ def page_ai_optimizer():
         "NOx": 0.0
     }
 
-    results = {}
+    # One vectorized evaluation (same model as the scenario sweep below), memoized per input state
+    df_out = memo_scenario_table(coal_consumption, biogas_frac, ESP, FGD, coal_baseline, biogas_EF)
 
-    for pol in coal_baseline:
-        coal_part = coal_baseline[pol] * coal_share
-        bio_part = biogas_EF[pol] * coal_consumption * bio_share
-        total = coal_part + bio_part
+    st.subheader("Final Results")
 
-        if pol in ["TSP","PM10","PM2.5"]:
-            total *= (1 - ESP/100)
+    col_mc, col_draws = st.columns([1, 2])
+    with col_mc:
+        show_uncertainty = st.toggle("Uncertainty (Monte Carlo)", value=False,
+                                     help="Samples coal emission factors (fitted to the plant registry), "
+                                          "biogas factors and ESP/FGD efficiency.")
+    if show_uncertainty:
+        with col_draws:
+            n_draws = st.select_slider("Draws", options=MC_DRAW_OPTIONS, value=MC_DRAW_OPTIONS[1])
+        df_ci = get_uncertainty_table(coal_consumption, biogas_frac, ESP, FGD, coal_baseline,
+                                      PLANT_REGISTRY_FILE, registry_mtime, n_draws)
+        st.dataframe(df_ci, use_container_width=True)
+        st.caption(f"{CI_LEVEL}% intervals from {n_draws:,} draws.")
+    else:
+        st.dataframe(df_out, use_container_width=True)
 
-        if pol == "SO2":
-            total *= (1 - FGD/100)
+    st.subheader("Summary")
 
-        results[pol] = total
+    for pol in ["TSP", "PM10", "PM2.5", "SO2"]:
+        reduction = df_out.loc[df_out["Pollutant"] == pol, "Reduction (%)"].values[0]
+        st.success(f"**{pol} Reduction:** {reduction}%")
 
     # ---------------------------------------------------
-    # OUTPUT TABLE DISPLAY
+    # BLEND OPTIMIZER
     # ---------------------------------------------------
-    df_out = pd.DataFrame({
-        "Pollutant": list(coal_baseline.keys()),
-        "Baseline_Emissions (tons)": list(coal_baseline.values()),
-        "Blended_Emissions (tons)": [results[p] for p in coal_baseline],
-        "Reduction (%)": [
-            round((1 - results[p]/coal_baseline[p])*100,2) if coal_baseline[p] > 0 else "N/A"
-            for p in coal_baseline.keys()
-        ]
-    })
+    st.subheader(T["ai_recommendation"])
+    opt_mode = st.radio("Optimization goal", ["Minimize weighted emissions", "Meet per-pollutant targets"], horizontal=True)
+    weights, targets = {}, None
+    if opt_mode == "Minimize weighted emissions":
+        st.caption("Relative importance of each pollutant (tons are multiplied by these weights)")
+        wcols = st.columns(len(POLLUTANTS))
+        for wcol, pol in zip(wcols, POLLUTANTS):
+            weights[pol] = wcol.number_input(f"{pol} weight", min_value=0.0, value=1.0, key=f"w_{pol}")
+    else:
+        st.caption("Maximum allowed blended emissions (tons/year); leave 0 for no target")
+        tcols = st.columns(len(POLLUTANTS))
+        targets = {}
+        for tcol, pol in zip(tcols, POLLUTANTS):
+            value = tcol.number_input(f"{pol} target", min_value=0.0, value=0.0, key=f"t_{pol}")
+            targets[pol] = value if value > 0 else None
+
+    b1, b2, b3 = st.columns(3)
+    with b1:
+        max_frac = st.slider("Max biogas fraction", 0.0, 1.0, SAFE_BIOGAS_FRAC)
+    with b2:
+        esp_bounds = st.slider("ESP operating range (%)", 0.0, 99.9, (90.0, 99.5))
+    with b3:
+        fgd_bounds = st.slider("FGD operating range (%)", 0.0, 99.9, (70.0, 95.0))
+
+    if st.button(T["optimize_button"], type="primary"):
+        started = time.perf_counter()
+        opt = run_optimizer(coal_consumption, coal_baseline, weights, targets,
+                            (0.0, max_frac), esp_bounds, fgd_bounds, biogas_EF)
+        elapsed = time.perf_counter() - started
+        best = opt["best"]
+        st.info(f"{T['optimal_blend_is']} **{best['biogas_frac']*100:.1f}% biogas**, "
+                f"ESP {best['ESP']:.1f}%, FGD {best['FGD']:.1f}%")
+        if targets is not None and not opt["meets_targets"]:
+            st.warning("No setting in the allowed ranges meets every target; showing the closest one.")
+        m1, m2 = st.columns(2)
+        m1.metric(T["pred_reduction"], f"{opt['reduction_pct']['PM2.5']:.1f} %")
+        m2.metric("Weighted emissions (tons/year)", f"{best['weighted_total']:,.1f}")
+
+        st.subheader(T["safety_check"])
+        if best["biogas_frac"] > SAFE_BIOGAS_FRAC:
+            st.warning(T["safety_warn"])
+        else:
+            st.success(T["safety_ok"])
+
+        st.caption(f"Pareto front: weighted particulate/SO2 emissions vs. NOx "
+                   f"({opt['evaluated']:,} scenarios in {elapsed*1000:.0f} ms)")
+        pareto = opt["pareto"].assign(other_weighted=lambda d: d["weighted_total"] - weights.get("NOx", 1.0) * d["NOx"])
+        st.altair_chart(alt.Chart(pareto).mark_line(point=True).encode(
+            x=alt.X("NOx:Q", title="NOx (tons/year)"),
+            y=alt.Y("other_weighted:Q", title="Weighted TSP/PM/SO2"),
+            color=alt.Color("biogas_frac:Q", title="Biogas fraction"),
+            tooltip=["biogas_frac", "ESP", "FGD"] + POLLUTANTS
+        ), use_container_width=True)
 
-    st.subheader("Final Results")
+    # ---------------------------------------------------
+    # FLEET VIEW (every plant in the registry, per-plant factors)
+    # ---------------------------------------------------
+    with st.expander(f"Fleet view ({len(df_plants)} plants)"):
+        fleet = get_fleet_grid(PLANT_REGISTRY_FILE, registry_mtime, ESP, FGD)
+        k = int(np.abs(FLEET_FRAC_GRID - biogas_frac).argmin())
+        st.caption(f"Each plant's reported emissions are its baseline (own emission factors); "
+                   f"biogas fraction {FLEET_FRAC_GRID[k]:.2f}, ESP {ESP}%, FGD {FGD}%")
+        fleet_now = df_plants[["plant_name", "coal_tons"]].copy()
+        for j, pol in enumerate(POLLUTANTS):
+            if pol in PLANT_POLLUTANTS:
+                fleet_now[f"{pol} baseline"] = df_plants[pol]
+            fleet_now[f"{pol} blended"] = fleet[:, k, j]
+        st.dataframe(fleet_now, use_container_width=True)
+
+        totals = pd.DataFrame(fleet.sum(axis=0), columns=POLLUTANTS).assign(biogas_frac=FLEET_FRAC_GRID)
+        totals = totals.melt("biogas_frac", var_name="Pollutant", value_name="Fleet emissions (tons/year)")
+        st.altair_chart(alt.Chart(totals).mark_line().encode(
+            x=alt.X("biogas_frac:Q", title="Biogas fraction"),
+            y="Fleet emissions (tons/year):Q",
+            color="Pollutant:N",
+        ), use_container_width=True)
 
-    st.dataframe(df_out, use_container_width=True)
+    # ---------------------------------------------------
+    # SCENARIO SWEEP (whole design space in one pass)
+    # ---------------------------------------------------
+    with st.expander("Scenario sweep"):
+        st.write("Evaluate every combination of the ranges below against the baseline emissions above.")
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            coal_default = min(coal_consumption, 20_000_000.0)
+            coal_range = st.slider("Coal consumption range (tons/year)", 0.0, 20_000_000.0,
+                                   (coal_default, coal_default), step=100_000.0)
+            coal_steps = st.number_input("Coal steps", 1, 200, 1)
+        with c2:
+            frac_range = st.slider("Biogas fraction range", 0.0, 1.0, (0.0, 0.4))
+            frac_steps = st.number_input("Biogas steps", 1, 1000, 41)
+        with c3:
+            esp_range = st.slider("ESP range (%)", 0, 100, (80, 99))
+            fgd_range = st.slider("FGD range (%)", 0, 100, (50, 95))
+            control_steps = st.number_input("ESP/FGD steps", 1, 200, 20)
+
+        axes = [sweep_values(*coal_range, coal_steps), sweep_values(*frac_range, frac_steps),
+                sweep_values(*esp_range, control_steps), sweep_values(*fgd_range, control_steps)]
+        n_scenarios = int(np.prod([len(a) for a in axes]))
+        st.caption(f"{n_scenarios:,} scenarios")
+        if st.button("Run sweep"):
+            sweep = evaluate_scenarios(*axes, coal_baseline, biogas_ef=biogas_EF)
+            sweep["total_blended"] = sweep[[f"{p}_blended" for p in POLLUTANTS]].sum(axis=1)
+            best = sweep.nsmallest(500, "total_blended")
+            st.dataframe(best, use_container_width=True, height=400)
+            st.download_button("Download all scenarios (CSV)", sweep.to_csv(index=False).encode(),
+                               file_name="blend_scenarios.csv", mime="text/csv")
 
-    st.subheader("Summary")
 
-    for pol in ["TSP", "PM10", "PM2.5", "SO2"]:
-        reduction = df_out.loc[df_out["Pollutant"] == pol, "Reduction (%)"].values[0]
-        st.success(f"**{pol} Reduction:** {reduction}%")
+# --- Page 3: GIS Feedstock Map ---
+# --- GIS layer setup ---
+KML_FILE = Path(__file__).parent / "Only 2 checked KORBA (1).kml"
 
+@st.cache_resource
+def get_gis_base_map(extent):
+    """Base map fitted to the layer extent; features are added per viewport."""
+    m = folium.Map(location=[23.5, 85.0], zoom_start=8)
+    if extent is not None:
+        m.fit_bounds([[extent[1], extent[0]], [extent[3], extent[2]]])
+    return m
+
+# Client-side clustering: one row array for all points, popups built as text nodes
+GIS_RENDER_MODES = ["Viewport (server clustering)", "GeoJSON layer (client clustering)"]
+FAST_CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    var label = document.createElement('span');
+    label.textContent = row[2];
+    marker.bindPopup(label);
+    return marker;
+}"""
+
+@st.cache_resource(max_entries=4)
+def get_geojson_map_html(fingerprint, _layer):
+    """Whole-layer map as HTML, serialized once per dataset (``fingerprint``: content hash)."""
+    from folium.plugins import FastMarkerCluster
+    m = folium.Map(location=[23.5, 85.0], zoom_start=8)
+    extent = _layer.extent
+    if extent is not None:
+        m.fit_bounds([[extent[1], extent[0]], [extent[3], extent[2]]])
+    shapes = to_geojson(_layer.geometry, kinds=(LINE, OUTER_RING))
+    if shapes["features"]:
+        folium.GeoJson(shapes, name="Routes & areas",
+                       style_function=lambda feature: {"weight": 3, "fillOpacity": 0.2},
+                       tooltip=folium.GeoJsonTooltip(fields=["name", "folder"], aliases=["", ""])).add_to(m)
+    FastMarkerCluster(point_rows(_layer.geometry), callback=FAST_CLUSTER_CALLBACK, name="Sites").add_to(m)
+    return m.get_root().render()
+
+# --- Logistics routing ---
+GIS_SOURCE_FOLDERS = ["Biomass / Feedstock Source Villages", "Waste Sources & Environmental Hotspots"]
+GIS_PLANT_FOLDERS = ["Industrial Locations"]
+GIS_ROAD_FOLDERS = ["Logistics & Transport Infrastructure"]
+# Optional OSM XML road extract; the KML transport lines are used without it
+ROAD_NETWORK_FILE = Path(__file__).parent / "roads.osm"
+
+def gis_points(layer, folders):
+    """Point features of the given KML folders (name, folder, lon, lat, ...)."""
+    f = layer.features
+    return f[(f["geom_type"] == "Point") & f["folder"].isin(folders)].reset_index(drop=True)
+
+@st.cache_resource(max_entries=4)
+def get_routing_engine(fingerprint, road_mtime, _layer):
+    """Road graph plus per-plant shortest-path trees, built once per dataset."""
+    if ROAD_NETWORK_FILE.exists():
+        graph = graph_from_osm(ROAD_NETWORK_FILE)
+    else:
+        f = _layer.features
+        roads = f.index[f["folder"].isin(GIS_ROAD_FOLDERS) & (f["geom_type"] != "Point")]
+        graph = graph_from_lines([xy for i in roads for kind, xy in _layer.geometry.parts(i) if kind != POINT])
+    plants = gis_points(_layer, GIS_PLANT_FOLDERS)
+    return RoutingEngine(graph, plants["lon"].to_numpy(), plants["lat"].to_numpy()), plants
+
+# --- Feedstock supply allocation ---
+# Biogas-equivalent feedstock per source (tons/year) when FEEDSTOCK_FILE does not list it
+FEEDSTOCK_DEFAULT_TONS = {
+    "Biomass / Feedstock Source Villages": 20_000.0,
+    "Waste Sources & Environmental Hotspots": 8_000.0,
+}
+# Optional CSV with columns name, supply_tons
+FEEDSTOCK_FILE = Path(__file__).parent / "feedstock.csv"
+
+def feedstock_supply(sources):
+    """Feedstock tons/year per source: FEEDSTOCK_FILE entry, else the folder default."""
+    overrides = load_feedstock_overrides(FEEDSTOCK_FILE)
+    return np.array([overrides.get(name, FEEDSTOCK_DEFAULT_TONS.get(folder, 0.0))
+                     for name, folder in zip(sources["name"], sources["folder"])])
+
+@st.cache_data(max_entries=32)
+def get_allocation(fingerprint, road_mtime, registry_mtime, feedstock_mtime, biogas_frac, _layer):
+    """(plant summary, shipments, solver message) for one target fraction, or (None, None, None)."""
+    engine, plants = get_routing_engine(fingerprint, road_mtime, _layer)
+    registry = get_model_context(PLANT_REGISTRY_FILE, registry_mtime)["df_plants"]
+    match = match_plants(plants["name"], registry["plant_name"])
+    if (match < 0).all():
+        return None, None, None
+    matched = np.flatnonzero(match >= 0)
+    coal_tons = registry["coal_tons"].to_numpy()[match[matched]]
+    sources = gis_points(_layer, GIS_SOURCE_FOLDERS)
+    supply = feedstock_supply(sources)
+    km = engine.matrix(sources["lon"].to_numpy(), sources["lat"].to_numpy())[:, matched]
+    result = solve_allocation(supply, biogas_frac * coal_tons, km)
+    plant_names = [f"{plants['name'][i]} ({registry['plant_name'][match[i]]})" for i in matched]
+    summary, flows = allocation_tables(result, sources["name"], plant_names, coal_tons, km)
+    return summary, flows, result["message"]
+
+# --- Catchments ---
+CATCHMENT_MODES = ["Straight line", "Road"]
+
+@st.cache_data(max_entries=32)
+def get_catchment(fingerprint, road_mtime, feedstock_mtime, radius_km, mode, _layer):
+    """Sources and feedstock tons within distance bands of every plant."""
+    plants = gis_points(_layer, GIS_PLANT_FOLDERS)
+    sources = gis_points(_layer, GIS_SOURCE_FOLDERS)
+    index = CatchmentIndex(sources["lon"].to_numpy(), sources["lat"].to_numpy())
+    plant, src, km = index.pairs(plants["lon"].to_numpy(), plants["lat"].to_numpy(), radius_km)
+    if mode == "Road":
+        # Road km is (up to junction snapping) never shorter than the straight line,
+        # so the ball query already holds every candidate
+        engine, _ = get_routing_engine(fingerprint, road_mtime, _layer)
+        km = engine.pair_km(sources["lon"].to_numpy()[src], sources["lat"].to_numpy()[src], plant)
+        inside = km <= radius_km
+        plant, src, km = plant[inside], src[inside], km[inside]
+    bands = [b for b in CATCHMENT_BANDS_KM if b < radius_km] + [radius_km]
+    return catchment_table(plant, src, km, feedstock_supply(sources), plants["name"], bands)
+
+# --- Dispersion ---
+PLUME_POLLUTANTS = ["PM2.5", "SO2", "PM10", "TSP", "NOx"]
+# Raster margin around the emitting plants (degrees, ~33 km)
+PLUME_MARGIN_DEG = 0.3
+
+@st.cache_resource(max_entries=8)
+def get_plume_model(fingerprint, registry_mtime, pollutant, biogas_frac, esp, fgd, wind_dir, wind_speed,
+                    stability, _layer):
+    """PlumeModel for the registry-matched map plants, or None (keeps its tile cache across reruns)."""
+    plants = gis_points(_layer, GIS_PLANT_FOLDERS)
+    registry = get_model_context(PLANT_REGISTRY_FILE, registry_mtime)["df_plants"]
+    match = match_plants(plants["name"], registry["plant_name"])
+    matched = np.flatnonzero(match >= 0)
+    if len(matched) == 0:
+        return None
+    rows = registry.iloc[match[matched]].reset_index(drop=True)
+    tons = fleet_emissions(rows, biogas_frac, esp, fgd)[:, 0, POLLUTANTS.index(pollutant)]
+    height = (pd.to_numeric(rows["stack_height_m"], errors="coerce").fillna(STACK_HEIGHT_M).to_numpy()
+              if "stack_height_m" in rows.columns else STACK_HEIGHT_M)
+    return PlumeModel(plants["lon"].to_numpy()[matched], plants["lat"].to_numpy()[matched],
+                      tons_per_year_to_g_per_s(tons), height, wind_dir, wind_speed, stability)
+
+@st.cache_data(max_entries=32)
+def get_plume_raster(fingerprint, registry_mtime, pollutant, biogas_frac, esp, fgd, wind_dir, wind_speed,
+                     stability, _layer):
+    """(RGBA image, bounds, peak ug/m3) around the emitting plants, or None."""
+    model = get_plume_model(fingerprint, registry_mtime, pollutant, biogas_frac, esp, fgd, wind_dir,
+                            wind_speed, stability, _layer)
+    if model is None:
+        return None
+    lon, lat = model.src[0], model.src[1]
+    bbox = (lon.min() - PLUME_MARGIN_DEG, lat.min() - PLUME_MARGIN_DEG,
+            lon.max() + PLUME_MARGIN_DEG, lat.max() + PLUME_MARGIN_DEG)
+    grid, bounds = model.raster(bbox)
+    return heatmap_rgba(grid), bounds, float(grid.max())
 
-# --- Page 3: GIS Feedstock Map ---
 def page_gis_map():
     st.write("Interactive GIS Feedstock & Logistics Dashboard")
     # st.write("Map showing industries, coal mines, biomass villages, waste sites, pollution hotspots, and transport routes.")
     
-    # Sample data - replace with your actual geocoded data from Google My Maps
-    # Industries (power plants)
-    industries = [
-        {"name": "North Karanpura STPP", "lat": 23.8, "lon": 85.5},
-        {"name": "Patratu STPP", "lat": 23.7, "lon": 85.3},
-        {"name": "Tenughat TPS", "lat": 23.6, "lon": 85.1},
-    ]
-    
-    # Coal mines
-    coal_mines = [
-        {"name": "Coal Mine 1", "lat": 23.9, "lon": 85.6},
-        {"name": "Coal Mine 2", "lat": 23.5, "lon": 85.2},
-    ]
-    
-    # Biomass villages
-    biomass_villages = [
-        {"name": "Biomass Village A", "lat": 23.4, "lon": 85.0},
-        {"name": "Biomass Village B", "lat": 23.3, "lon": 84.9},
-    ]
-    
-    # Waste sites
-    waste_sites = [
-        {"name": "Waste Site 1", "lat": 23.2, "lon": 84.8},
-    ]
-    
-    # Pollution hotspots
-    pollution_hotspots = [
-        {"name": "Hotspot 1", "lat": 23.1, "lon": 84.7},
-    ]
-    
-    # Transport routes (lines connecting sources to destinations)
-    routes = [
-        {"from": biomass_villages[0], "to": industries[0], "color": "green"},
-        {"from": biomass_villages[1], "to": industries[1], "color": "blue"},
-        {"from": coal_mines[0], "to": industries[0], "color": "black"},
-    ]
-    
     # Create folium map
     import folium
-    from streamlit_folium import st_folium
-    import fastkml
-    
-    m = folium.Map(location=[23.5, 85.0], zoom_start=8)
     
-    # Load KML file
-    kml_file = 'Only 2 checked KORBA (1).kml'
+    # Load KML/KMZ file (all geometry types, parsed and indexed once per process)
     try:
-        tree = ET.parse(kml_file)
-        root = tree.getroot()
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        for placemark in root.findall('.//kml:Placemark', ns):
-            name_elem = placemark.find('kml:name', ns)
-            name = name_elem.text if name_elem is not None else 'Unknown'
-            point = placemark.find('.//kml:Point', ns)
-            if point is not None:
-                coord_elem = point.find('kml:coordinates', ns)
-                if coord_elem is not None and coord_elem.text:
-                    coords = coord_elem.text.strip().split(',')
-                    if len(coords) >= 2:
-                        lon, lat = float(coords[0]), float(coords[1])
-                        folium.Marker(location=[lat, lon], popup=name).add_to(m)
+        layer = cached_layer(KML_FILE)
     except Exception as e:
         st.error(f"Error loading KML: {e}")
+        layer = None
+
+    render_mode = st.radio("Map rendering", GIS_RENDER_MODES, horizontal=True, key="gis_render_mode")
+    if layer is not None and render_mode == GIS_RENDER_MODES[1]:
+        # One static GeoJSON/cluster layer; unchanged data is never re-serialized
+        components.html(get_geojson_map_html(layer.fingerprint, layer), width=700, height=500)
+        st.caption(f"{len(layer.features)} features, clustered in the browser")
+        return
+
+    # The component's last viewport (pan/zoom) is in session_state under its key
+    view = st.session_state.get("gis_map") or {}
+    bbox = bounds_to_bbox(view.get("bounds"))
+    m = get_gis_base_map(layer.extent if layer is not None else None)
+
+    # Only features inside the viewport are sent; dense areas arrive pre-clustered
+    fg = folium.FeatureGroup(name="KML features")
+    if layer is not None:
+        markers, clusters = layer.view(bbox)
+        for i, name, folder in zip(markers.index, markers["name"], markers["folder"]):
+            for kind, xy in layer.geometry.parts(i):
+                latlon = xy[:, ::-1].tolist()
+                if kind == POINT:
+                    folium.Marker(location=latlon[0], popup=name, tooltip=folder).add_to(fg)
+                elif kind == OUTER_RING:
+                    folium.Polygon(latlon, popup=name, tooltip=folder, weight=2, fill=True, fill_opacity=0.2).add_to(fg)
+                else:
+                    folium.PolyLine(latlon, popup=name, tooltip=folder, weight=3).add_to(fg)
+        for count, lon, lat in clusters[["count", "lon", "lat"]].itertuples(index=False):
+            folium.CircleMarker(location=[lat, lon], radius=6 + 3 * np.log10(count), weight=1,
+                                fill=True, fill_opacity=0.6, tooltip=f"{int(count)} features").add_to(fg)
+        in_view = len(markers) + int(clusters["count"].sum())
+        st.caption(f"{in_view} of {len(layer.features)} features in view"
+                   + (f" ({len(clusters)} clusters)" if len(clusters) else ""))
     
     # # Add markers for industries
     # for ind in industries:
@@ -798,28 +1111,108 @@ def page_gis_map():
     #         popup=f"Route from {route['from']['name']} to {route['to']['name']}"
     #     ).add_to(m)
     
-    # Display the map
-    folium_static(m, width=700, height=500)
-    
-    # st.write("### Routing Logic")
-    # st.write("To automate routing, you can integrate APIs like OpenRouteService or Google Directions API.")
-    # st.write("For example, select a source and destination to calculate the optimal route:")
+    # Selected route (selectboxes below keep their value in session_state)
+    route, route_km = None, None
+    if layer is not None and st.session_state.get("gis_route_source") and st.session_state.get("gis_route_plant"):
+        engine, plants = get_routing_engine(layer.fingerprint, _file_mtime(ROAD_NETWORK_FILE), layer)
+        sources = gis_points(layer, GIS_SOURCE_FOLDERS)
+        src = sources[sources["name"] == st.session_state.gis_route_source]
+        dst = np.flatnonzero(plants["name"].to_numpy() == st.session_state.gis_route_plant)
+        if len(src) and len(dst):
+            route = engine.path(src["lon"].iloc[0], src["lat"].iloc[0], int(dst[0]))
+            route_km = float(engine.matrix(src["lon"].iloc[:1].to_numpy(), src["lat"].iloc[:1].to_numpy())[0, dst[0]])
+            folium.PolyLine(route[:, ::-1].tolist(), color="red", weight=5,
+                            tooltip=f"{route_km:.1f} km").add_to(fg)
+
+    # Catchment buffers around every plant
+    if layer is not None and st.session_state.get("gis_catch_on"):
+        radius_m = st.session_state.gis_catch_km * 1000
+        for name, lon, lat in gis_points(layer, GIS_PLANT_FOLDERS)[["name", "lon", "lat"]].itertuples(index=False):
+            folium.Circle(location=[lat, lon], radius=radius_m, color="green", weight=1, fill=True,
+                          fill_opacity=0.05, tooltip=name).add_to(fg)
+
+    # Dispersion overlay (settings come from the widgets below, via session_state)
+    if layer is not None and st.session_state.get("gis_plume_on"):
+        ss = st.session_state
+        plume = get_plume_raster(layer.fingerprint, _file_mtime(PLANT_REGISTRY_FILE), ss.gis_plume_pol,
+                                 ss.get("gis_alloc_frac", 0.1), ss.gis_plume_esp, ss.gis_plume_fgd,
+                                 ss.gis_plume_dir, ss.gis_plume_speed, ss.gis_plume_stab, layer)
+        if plume is not None:
+            image, image_bounds, peak = plume
+            folium.raster_layers.ImageOverlay(image, bounds=image_bounds, mercator_project=True,
+                                              name="Dispersion").add_to(fg)
+            st.caption(f"Peak ground-level {ss.gis_plume_pol}: {peak:.1f} ug/m3")
+
+    # Display the map; only the feature group is swapped when the viewport changes
+    center = view.get("center")
+    st_folium(m, width=700, height=500, key="gis_map", feature_group_to_add=fg,
+              center=(center["lat"], center["lng"]) if center else None, zoom=view.get("zoom"),
+              returned_objects=["bounds", "center", "zoom"])
     
-    # # Simple routing demo (placeholder)
-    # source_options = [v["name"] for v in biomass_villages + coal_mines]
-    # dest_options = [i["name"] for i in industries]
-    
-    # col1, col2 = st.columns(2)
-    # with col1:
-    #     source = st.selectbox("Select Source", source_options)
-    # with col2:
-    #     dest = st.selectbox("Select Destination", dest_options)
-    
-    # if st.button("Calculate Route"):
-    #     # Placeholder for API call
-    #     st.write(f"Calculating route from {source} to {dest}...")
-    #     st.write("Distance: ~50 km, Time: ~1.5 hours (example)")
-    #     # In real implementation, call routing API here
+    st.write("### Routing Logic")
+    if layer is None:
+        return
+    engine, plants = get_routing_engine(layer.fingerprint, _file_mtime(ROAD_NETWORK_FILE), layer)
+    sources = gis_points(layer, GIS_SOURCE_FOLDERS)
+    graph = engine.graph
+    st.caption(f"Offline road graph: {graph.n_nodes} nodes, {graph.n_edges} edges"
+               + (f" from {ROAD_NETWORK_FILE.name}" if ROAD_NETWORK_FILE.exists() else " from the KML transport lines"))
+    if len(sources) == 0 or len(plants) == 0:
+        st.info("No feedstock sources or plants in the KML.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.selectbox("Select Source", sources["name"].tolist(), key="gis_route_source")
+    with col2:
+        st.selectbox("Select Destination", plants["name"].tolist(), key="gis_route_plant")
+    if route is not None:
+        st.write(f"Road distance: **{route_km:.1f} km** (drawn on the map)")
+
+    with st.expander("Distance matrix (km, all sources x all plants)"):
+        matrix = engine.matrix(sources["lon"].to_numpy(), sources["lat"].to_numpy())
+        st.dataframe(pd.DataFrame(matrix.round(1), index=sources["name"], columns=plants["name"]),
+                     use_container_width=True)
+
+    st.write("### Biogas Supply Allocation")
+    alloc_frac = st.slider("Target biogas blending fraction", 0.0, 1.0, 0.1, key="gis_alloc_frac")
+    plant_summary, flows, message = get_allocation(
+        layer.fingerprint, _file_mtime(ROAD_NETWORK_FILE), _file_mtime(PLANT_REGISTRY_FILE),
+        _file_mtime(FEEDSTOCK_FILE), alloc_frac, layer)
+    if plant_summary is None:
+        st.info("No map plant matches the plant registry by name; add plants to plants.csv to set their demand.")
+        return
+    st.caption(f"Least-cost haul (ton-km) within {MAX_HAUL_KM:.0f} km. Feedstock per source: "
+               f"{FEEDSTOCK_FILE.name} if present, otherwise defaults per map folder. Solver: {message}")
+    st.dataframe(plant_summary, use_container_width=True)
+    with st.expander(f"Shipments ({len(flows)})"):
+        st.dataframe(flows, use_container_width=True)
+
+    st.write("### Catchment Analysis")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.slider("Catchment radius (km)", 1.0, 100.0, 25.0, key="gis_catch_km")
+    with col2:
+        st.radio("Distance", CATCHMENT_MODES, horizontal=True, key="gis_catch_mode")
+    st.checkbox("Show catchment buffers on the map", key="gis_catch_on")
+    catchment = get_catchment(layer.fingerprint, _file_mtime(ROAD_NETWORK_FILE), _file_mtime(FEEDSTOCK_FILE),
+                              st.session_state.gis_catch_km, st.session_state.gis_catch_mode, layer)
+    st.dataframe(catchment, use_container_width=True)
+
+    st.write("### Dispersion Heatmap")
+    st.checkbox("Show ground-level concentration on the map", key="gis_plume_on")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.selectbox("Pollutant", PLUME_POLLUTANTS, key="gis_plume_pol")
+        st.selectbox("Stability class", STABILITY_CLASSES, index=STABILITY_CLASSES.index("D"), key="gis_plume_stab")
+    with col2:
+        st.slider("Wind from (deg)", 0, 359, 225, key="gis_plume_dir")
+        st.slider("Wind speed (m/s)", 0.5, 15.0, 3.0, key="gis_plume_speed")
+    with col3:
+        st.slider("ESP Efficiency (%)", 0, 100, 90, key="gis_plume_esp")
+        st.slider("FGD Efficiency (%)", 0, 100, 70, key="gis_plume_fgd")
+    st.caption("Blended emissions of the registry-matched plants at the target biogas fraction above, "
+               f"released at {STACK_HEIGHT_M:.0f} m unless plants.csv gives stack_height_m.")
 
 # --- Page Navigation (Replaced with Sidebar) ---
 
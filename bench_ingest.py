@@ -0,0 +1,260 @@
+"""Ingest throughput benchmark: synthetic or recorded sensor messages through the real ingest path.
+
+Examples:
+    python bench_ingest.py --rates 100,1000,10000,50000 --topics 50
+    python bench_ingest.py --replay iot_history.csv --rates 5000 --policy coalesce --backend csv
+    python bench_ingest.py --rates 20000 --duration 30 --no-trace --json
+
+No broker is needed: an in-process stand-in for the paho client delivers
+messages to IngestService._on_message from its own "network" thread at
+the requested rate, and each feed is built as get_ingest_service builds
+it in app.py, so the bounded queue, drain thread, anomaly detector,
+forecaster, rollups and batched store writes all run as in the app.
+Latency is measured from _on_message to the end of Feed.ingest.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from iot_anomaly import AnomalyDetector
+from iot_buffer import TelemetryBuffer
+from iot_forecast import HoltForecaster
+from iot_rollups import RollupSet
+from iot_storage import STORAGE_BACKENDS, BatchedWriter, normalize_history
+from mqtt_ingest import QUEUE_POLICIES, Feed, IngestService
+
+TOPIC_PREFIX = "bench"
+# Latency percentiles reported (percent)
+PERCENTILES = [50, 90, 99, 99.9]
+# The producer sends in bursts of at most this many messages between clock checks
+MAX_BURST = 256
+
+
+class FakeClient:
+    """Just enough of paho.mqtt.client.Client for IngestService, with a publish loop instead of a socket."""
+
+    def __init__(self):
+        self.on_connect = self.on_disconnect = self.on_message = None
+        self.subscriptions = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def connect_async(self, host, port, keepalive):
+        pass
+
+    def loop_start(self):
+        self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topics):
+        self.subscriptions.extend(topics)
+
+    def replay(self, messages, rate, duration):
+        """Deliver (topic, payload) pairs at ``rate`` msg/s for ``duration`` s on a background thread."""
+        self._stop.clear()
+        self.sent = 0
+
+        def run():
+            start = time.perf_counter()
+            n = len(messages)
+            while not self._stop.is_set():
+                elapsed = time.perf_counter() - start
+                if elapsed >= duration:
+                    break
+                due = min(int(elapsed * rate) - self.sent, MAX_BURST)
+                if due <= 0:
+                    time.sleep(min(1.0 / rate, 0.001))
+                    continue
+                for _ in range(due):
+                    topic, payload = messages[self.sent % n]
+                    self.on_message(self, None, SimpleNamespace(topic=topic, payload=payload))
+                    self.sent += 1
+            self.elapsed = time.perf_counter() - start
+
+        self._thread = threading.Thread(target=run, name="fake-mqtt-network", daemon=True)
+        self._thread.start()
+        return self._thread
+
+
+class TimedFeed(Feed):
+    """Feed that records how long each reading took from _on_message to stored."""
+
+    def __init__(self, *args, latencies, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = latencies
+
+    def ingest(self, row):
+        super().ingest(row)
+        self.latencies.record((datetime.now() - row["timestamp"]).total_seconds())
+
+
+class LatencyLog:
+    """Preallocated latency samples (s) so recording does not itself grow memory."""
+
+    def __init__(self, capacity):
+        self.values = np.empty(capacity)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            if self.count < len(self.values):
+                self.values[self.count] = seconds
+            self.count += 1
+
+    def samples(self):
+        return self.values[:min(self.count, len(self.values))]
+
+
+def topic_name(t, n_feeds):
+    """Topic of sensor ``t``; sensors are dealt round-robin to the feeds' ``bench/<k>/+`` filters."""
+    return f"{TOPIC_PREFIX}/{t % n_feeds}/sensor{t}"
+
+
+def synthetic_messages(n_topics, n_feeds, per_topic=200, seed=0):
+    """(topic, payload) pairs in the sensor schema (pm25/gas/temp/status), interleaved across topics."""
+    rng = np.random.default_rng(seed)
+    temp = 25 + rng.normal(0, 0.5, (per_topic, n_topics))
+    gas = 80 + rng.normal(0, 3, (per_topic, n_topics))
+    dust = np.abs(30 + rng.normal(0, 5, (per_topic, n_topics)))
+    status = np.where(dust > 45, "WARNING", "NORMAL")
+    return [(topic_name(t, n_feeds), json.dumps({"pm25": round(dust[i, t], 2), "gas": round(gas[i, t], 2),
+                                              "temp": round(temp[i, t], 2), "status": status[i, t]}).encode())
+            for i in range(per_topic) for t in range(n_topics)]
+
+
+def recorded_messages(path, n_topics, n_feeds):
+    """Payloads rebuilt from a history CSV (timestamp, Temperature, CO2, PM2_5, status), spread over topics."""
+    df = normalize_history(pd.read_csv(path))
+    if df.empty:
+        raise ValueError(f"no readings in {path}")
+    return [(topic_name(i % n_topics, n_feeds), json.dumps({"pm25": r.PM2_5, "gas": r.CO2, "temp": r.Temperature,
+                                                         "status": str(r.status)}).encode())
+            for i, r in enumerate(df.itertuples(index=False))]
+
+
+def run_once(messages, rate, duration, n_feeds, policy, queue_size, backend, models, trace):
+    """Replay ``messages`` at ``rate`` msg/s through a fresh IngestService; returns a result dict."""
+    latencies = LatencyLog(int(rate * duration) + 1)
+    with tempfile.TemporaryDirectory() as root:
+        client = FakeClient()
+        feeds = {}
+        for k in range(n_feeds):
+            # One wildcard filter per feed, like sites sharing a topic filter in the app
+            topic_filter = f"{TOPIC_PREFIX}/{k}/+"
+            directory = f"{root}/feed{k}"
+            writer = BatchedWriter(STORAGE_BACKENDS[backend](directory)) if backend != "none" else None
+            history = TelemetryBuffer()
+            # Rollups persisted next to the history, as in app.get_ingest_service
+            rollups = RollupSet(directory if backend != "none" else None).load(history.frame())
+            feeds[topic_filter] = TimedFeed(topic_filter, history, writer, rollups,
+                                            detector=AnomalyDetector() if models else None,
+                                            forecaster=HoltForecaster() if models else None,
+                                            latencies=latencies)
+        service = IngestService("localhost", 1883, {f: f for f in feeds}, feeds,
+                                client_factory=lambda: client, queue_size=queue_size, queue_policy=policy)
+        service.start()
+
+        if trace:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        client.replay(messages, rate, duration).join()
+        service.stop()
+        wall = time.perf_counter() - t0
+        if trace:
+            mem_end, mem_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        stats = service.queue.stats()
+        ingested = sum(f.history.total_appended for f in feeds.values())
+        lat_ms = latencies.samples() * 1e3
+        result = {
+            "target_rate": rate,
+            "sent": client.sent,
+            "send_rate": client.sent / client.elapsed,
+            "ingested": ingested,
+            "throughput": ingested / wall,
+            "dropped": stats["dropped"],
+            "coalesced": stats["coalesced"],
+            # Readings stamped with the same time as the previous one in their feed are skipped by Feed.ingest
+            "duplicates": stats["dequeued"] - ingested,
+            "peak_queue": stats["high_watermark"],
+            "latency_ms": {f"p{p:g}": float(np.percentile(lat_ms, p)) if len(lat_ms) else None
+                           for p in PERCENTILES},
+            "latency_max_ms": float(lat_ms.max()) if len(lat_ms) else None,
+        }
+        if trace:
+            result["memory_growth_mb"] = (mem_end - mem_start) / 1e6
+            result["memory_peak_mb"] = (mem_peak - mem_start) / 1e6
+        return result
+
+
+def format_result(r):
+    lat = ", ".join(f"{k} {v:.2f}" for k, v in r["latency_ms"].items() if v is not None)
+    lines = [
+        f"target {r['target_rate']:>8,.0f} msg/s | sent {r['sent']:,} ({r['send_rate']:,.0f}/s) | "
+        f"ingested {r['ingested']:,} ({r['throughput']:,.0f}/s)",
+        f"    queue: dropped {r['dropped']:,}, coalesced {r['coalesced']:,}, peak depth {r['peak_queue']:,}"
+        f" | duplicate timestamps {r['duplicates']:,}",
+        f"    latency ms: {lat}, max {r['latency_max_ms'] or 0:.2f}",
+    ]
+    if "memory_growth_mb" in r:
+        lines.append(f"    traced memory: +{r['memory_growth_mb']:.1f} MB at end, +{r['memory_peak_mb']:.1f} MB peak")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MQTT ingest path without a broker.")
+    parser.add_argument("--rates", default="100,1000,10000", help="comma-separated target rates (msg/s), 1 to 50000")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    parser.add_argument("--topics", type=int, default=20, help="distinct sensor topics")
+    parser.add_argument("--feeds", type=int, default=3, help="topic filters (feeds) the topics are spread over")
+    parser.add_argument("--replay", help="history CSV to replay instead of synthetic readings")
+    parser.add_argument("--policy", choices=QUEUE_POLICIES, default="drop_oldest")
+    parser.add_argument("--queue-size", type=int, default=10_000)
+    parser.add_argument("--backend", choices=list(STORAGE_BACKENDS) + ["none"], default="columnar",
+                        help="history store written to a temporary directory")
+    parser.add_argument("--no-models", action="store_true", help="skip the anomaly detector and forecaster")
+    parser.add_argument("--no-trace", action="store_true",
+                        help="skip tracemalloc (it slows allocation-heavy code noticeably)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args(argv)
+
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    if any(r < 1 or r > 50_000 for r in rates):
+        parser.error("rates must be between 1 and 50000 msg/s")
+    if args.topics < 1 or args.feeds < 1:
+        parser.error("--topics and --feeds must be positive")
+    n_feeds = min(args.feeds, args.topics)
+    if args.replay:
+        messages = recorded_messages(args.replay, args.topics, n_feeds)
+    else:
+        messages = synthetic_messages(args.topics, n_feeds)
+
+    for rate in rates:
+        result = run_once(messages, rate, args.duration, n_feeds, args.policy,
+                          args.queue_size, args.backend, not args.no_models, not args.no_trace)
+        print(json.dumps(result) if args.json else format_result(result), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Headless blend calculator: batch scenarios in, emissions out (no Streamlit).
+
+Examples:
+    python blend_cli.py scenarios.csv -o results.csv
+    python blend_cli.py scenarios.json -o results.csv   # JSON array of scenario objects
+    cat scenarios.jsonl | python blend_cli.py - --input-format jsonl --format jsonl
+    python blend_cli.py --serve 8502
+
+Each scenario row needs coal_consumption (or coal_tons), biogas_frac,
+ESP and FGD; baseline columns TSP/PM10/PM2.5/SO2/NOx are optional (see
+blend_model.evaluate_batch). Input is read and written in chunks, so
+batches of any size stream through in bounded memory.
+"""
+import argparse
+import io
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from blend_model import BIOGAS_EF, build_model_context, evaluate_batch
+
+CHUNK_ROWS = 50_000
+
+
+def _input_format(path, fmt):
+    if fmt:
+        return fmt
+    if str(path).endswith(".json"):
+        return "json"
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def read_chunks(source, fmt, chunk_rows=CHUNK_ROWS):
+    """Scenario frames of up to ``chunk_rows`` rows from a path or file object.
+
+    A JSON array (``fmt="json"``) has to be parsed whole; it is still
+    evaluated and written out in chunks.
+    """
+    if fmt == "json":
+        df = pd.read_json(source, orient="records")
+        return (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
+    if fmt == "jsonl":
+        return pd.read_json(source, lines=True, chunksize=chunk_rows)
+    return pd.read_csv(source, chunksize=chunk_rows)
+
+
+def write_chunk(df, out, fmt, first):
+    if fmt == "jsonl":
+        text = df.to_json(orient="records", lines=True)
+        out.write(text if not text or text.endswith("\n") else text + "\n")
+    else:
+        df.to_csv(out, header=first, index=False)
+    out.flush()
+
+
+def run_batch(source, out, in_fmt, out_fmt, coal_ef, chunk_rows=CHUNK_ROWS):
+    """Stream every chunk of ``source`` through the model into ``out``; returns the row count."""
+    rows = 0
+    for i, chunk in enumerate(read_chunks(source, in_fmt, chunk_rows)):
+        write_chunk(evaluate_batch(chunk, coal_ef, BIOGAS_EF), out, out_fmt, i == 0)
+        rows += len(chunk)
+    return rows
+
+
+def make_handler(coal_ef):
+    class BlendHandler(BaseHTTPRequestHandler):
+        """POST /evaluate with a JSON object/list, JSON lines or CSV body."""
+
+        def _reply(self, code, body, content_type="application/json"):
+            data = body.encode()
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, json.dumps({"status": "ok"}))
+            else:
+                self._reply(404, json.dumps({"error": "not found"}))
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/evaluate":
+                self._reply(404, json.dumps({"error": "not found"}))
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+            content_type = self.headers.get("Content-Type", "application/json")
+            try:
+                if "csv" in content_type:
+                    scenarios = pd.read_csv(io.StringIO(body))
+                elif "ndjson" in content_type or "jsonl" in content_type:
+                    scenarios = pd.read_json(io.StringIO(body), lines=True)
+                else:
+                    payload = json.loads(body)
+                    scenarios = pd.DataFrame(payload if isinstance(payload, list) else [payload])
+                result = evaluate_batch(scenarios, coal_ef, BIOGAS_EF)
+            except Exception as e:
+                self._reply(400, json.dumps({"error": str(e)}))
+                return
+            if "csv" in self.headers.get("Accept", ""):
+                self._reply(200, result.to_csv(index=False), "text/csv")
+            else:
+                self._reply(200, result.to_json(orient="records"))
+
+        def log_message(self, fmt, *args):
+            print(f"blend_cli: {self.address_string()} {fmt % args}")
+
+    return BlendHandler
+
+
+def serve(host, port, coal_ef):
+    server = ThreadingHTTPServer((host, port), make_handler(coal_ef))
+    print(f"Blend API listening on http://{host}:{port}/evaluate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate coal/biogas blend scenarios without the UI.")
+    parser.add_argument("input", nargs="?", default="-", help="scenario CSV/JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout")
+    parser.add_argument("--input-format", choices=["csv", "jsonl", "json"],
+                        help="json = one array of scenario objects; default: from the file extension (stdin: csv)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="output format")
+    parser.add_argument("--registry", help="plant registry CSV used for the default coal emission factors")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="run the HTTP endpoint instead of a batch")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args(argv)
+
+    coal_ef = build_model_context(args.registry)["coal_EF_real"]
+    if args.serve:
+        serve(args.host, args.serve, coal_ef)
+        return 0
+
+    source = sys.stdin if args.input == "-" else args.input
+    in_fmt = _input_format(args.input, args.input_format)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        rows = run_batch(source, out, in_fmt, args.format, coal_ef, args.chunk_rows)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Evaluated {rows} scenarios.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
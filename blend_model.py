@@ -0,0 +1,445 @@
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------
+# 1. REAL COAL PLANT DATA (YOUR PROVIDED DATA)
+# ---------------------------------------------------
+PLANTS_DATA = [
+    {'plant_name':'North Karanpura STPP','coal_tons':7969147,'TSP':23907,'PM10':14344,'PM2.5':12910,'SO2':55784},
+    {'plant_name':'Patratu STPP','coal_tons':8229144,'TSP':28802,'PM10':17281,'PM2.5':15553,'SO2':41146},
+    {'plant_name':'Tenughat TPS','coal_tons':2233800,'TSP':15637,'PM10':9382,'PM2.5':8444,'SO2':13403},
+    {'plant_name':'Talcher Kaniha','coal_tons':10704720,'TSP':42819,'PM10':25691,'PM2.5':23122,'SO2':85638},
+    {'plant_name':'Darlipali','coal_tons':8563776,'TSP':29117,'PM10':17470,'PM2.5':15723,'SO2':33913},
+    {'plant_name':'IB Thermal','coal_tons':9493650,'TSP':34177,'PM10':20506,'PM2.5':18456,'SO2':28196},
+    {'plant_name':'Korba Super Thermal','coal_tons':9825216,'TSP':29476,'PM10':17685,'PM2.5':15917,'SO2':29181},
+    {'plant_name':'Sipat Super Thermal','coal_tons':10233432,'TSP':34794,'PM10':20876,'PM2.5':18789,'SO2':50655}
+]
+
+# Pollutants in the order used by every array in this module (last axis)
+POLLUTANTS = ["TSP", "PM10", "PM2.5", "SO2", "NOx"]
+# Removed by the electrostatic precipitator / flue gas desulfurization
+PARTICULATES = ["TSP", "PM10", "PM2.5"]
+
+# ---------------------------------------------------
+# BIOGAS EMISSION FACTORS (tons/ton fuel)
+# ---------------------------------------------------
+BIOGAS_EF = {
+    'TSP':   0.05/1000,
+    'PM10':  0.05/1000,
+    'PM2.5': 0.02/1000,
+    'SO2':   0.01/1000,
+    'NOx':   0.50/1000
+}
+
+
+def coal_emission_factors(df_plants, pollutants=("TSP", "PM10", "PM2.5", "SO2")):
+    """LEARN AVERAGE COAL EMISSION FACTORS (tons pollutant / ton coal) over the plants."""
+    return {pol: (df_plants[pol] / df_plants["coal_tons"]).mean() for pol in pollutants}
+
+
+def _baseline_array(baseline):
+    """Baseline emissions as an array with POLLUTANTS on the last axis."""
+    if isinstance(baseline, dict):
+        cols = [np.asarray(baseline.get(p, 0.0), dtype=np.float64) for p in POLLUTANTS]
+        return np.stack(np.broadcast_arrays(*cols), axis=-1)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    if baseline.shape[-1] == len(POLLUTANTS) - 1:
+        # No NOx column given: coal NOx baseline is 0 (as in the calculator)
+        baseline = np.concatenate([baseline, np.zeros(baseline.shape[:-1] + (1,))], axis=-1)
+    return baseline
+
+
+def control_factors(esp, fgd):
+    """Fraction of each pollutant left after ESP/FGD (efficiencies in %), POLLUTANTS last."""
+    esp_left = 1 - np.asarray(esp, dtype=np.float64) / 100
+    fgd_left = 1 - np.asarray(fgd, dtype=np.float64) / 100
+    esp_left, fgd_left = np.broadcast_arrays(esp_left, fgd_left)
+    ones = np.ones_like(esp_left)
+    return np.stack([esp_left if p in PARTICULATES else fgd_left if p == "SO2" else ones
+                     for p in POLLUTANTS], axis=-1)
+
+
+def blend_emissions(coal_consumption, biogas_frac, esp, fgd, baseline, biogas_ef=BIOGAS_EF):
+    """Blended emissions (tons/year) for any broadcastable mix of inputs.
+
+    coal_consumption: tons/year; biogas_frac: 0..1; esp/fgd: efficiency
+    in %; baseline: dict pollutant -> value(s) or an array with the
+    pollutants on the last axis. Returns an array shaped like the
+    broadcast inputs plus a trailing POLLUTANTS axis.
+    """
+    base = _baseline_array(baseline)
+    frac = np.asarray(biogas_frac, dtype=np.float64)[..., None]
+    coal = np.asarray(coal_consumption, dtype=np.float64)[..., None]
+    ef = np.array([biogas_ef.get(p, 0.0) for p in POLLUTANTS])
+    coal_part = base * (1 - frac)
+    bio_part = ef * coal * frac
+    return (coal_part + bio_part) * control_factors(esp, fgd)
+
+
+def reduction_pct(baseline, blended):
+    """Percent reduction vs. baseline (NaN where the baseline is 0)."""
+    base = _baseline_array(baseline)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(base > 0, (1 - blended / base) * 100, np.nan)
+
+
+def scenario_grid(coal_consumption, biogas_frac, esp, fgd):
+    """Cartesian product of the given value lists, as flat arrays (one entry per scenario)."""
+    axes = [np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (coal_consumption, biogas_frac, esp, fgd)]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return dict(zip(["coal_consumption", "biogas_frac", "ESP", "FGD"], (m.ravel() for m in mesh)))
+
+
+def evaluate_scenarios(coal_consumption, biogas_frac, esp, fgd, baseline, grid=True, biogas_ef=BIOGAS_EF):
+    """Evaluate many scenarios in one broadcasted pass and return a tidy table.
+
+    With ``grid=True`` every combination of the given values is
+    evaluated; otherwise the inputs are taken as aligned columns. The
+    baseline is shared by all scenarios unless it is given per scenario
+    (aligned mode). One row per scenario, with blended emissions and
+    reductions per pollutant.
+    """
+    if grid:
+        inputs = scenario_grid(coal_consumption, biogas_frac, esp, fgd)
+    else:
+        arrays = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (coal_consumption, biogas_frac, esp, fgd)))
+        inputs = dict(zip(["coal_consumption", "biogas_frac", "ESP", "FGD"], (a.ravel() for a in arrays)))
+    base = _baseline_array(baseline)
+    blended = blend_emissions(inputs["coal_consumption"], inputs["biogas_frac"], inputs["ESP"], inputs["FGD"],
+                              base, biogas_ef)
+    reduction = reduction_pct(base, blended)
+    out = dict(inputs)
+    for j, p in enumerate(POLLUTANTS):
+        out[f"{p}_blended"] = blended[:, j]
+    for j, p in enumerate(POLLUTANTS):
+        out[f"{p}_reduction_pct"] = reduction[:, j]
+    return pd.DataFrame(out)
+
+
+def single_scenario_table(coal_consumption, biogas_frac, esp, fgd, coal_baseline, biogas_ef=BIOGAS_EF):
+    """The calculator's per-pollutant results table for one scenario."""
+    blended = blend_emissions(coal_consumption, biogas_frac, esp, fgd, coal_baseline, biogas_ef)
+    return pd.DataFrame({
+        "Pollutant": list(coal_baseline.keys()),
+        "Baseline_Emissions (tons)": list(coal_baseline.values()),
+        "Blended_Emissions (tons)": [blended[POLLUTANTS.index(p)] for p in coal_baseline],
+        "Reduction (%)": [
+            round((1 - blended[POLLUTANTS.index(p)]/coal_baseline[p])*100,2) if coal_baseline[p] > 0 else "N/A"
+            for p in coal_baseline.keys()
+        ]
+    })
+
+
+# Scenario batch columns (aliases accepted by evaluate_batch)
+BATCH_INPUTS = ["coal_consumption", "biogas_frac", "ESP", "FGD"]
+BATCH_ALIASES = {"coal_tons": "coal_consumption", "esp": "ESP", "fgd": "FGD", "PM2_5": "PM2.5"}
+
+
+def evaluate_batch(scenarios, coal_ef=None, biogas_ef=BIOGAS_EF):
+    """Evaluate a frame of scenarios, one row each (the headless/batch entry point).
+
+    Needs the BATCH_INPUTS columns; baseline emissions are read from
+    per-pollutant columns (TSP, PM10, PM2.5, SO2, NOx) where present and
+    otherwise estimated as ``coal_ef * coal_consumption`` (NOx: 0).
+    Extra columns (ids, labels) are passed through in front.
+    """
+    df = scenarios.rename(columns=BATCH_ALIASES)
+    missing = [c for c in BATCH_INPUTS if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing scenario column(s): {', '.join(missing)}")
+    if coal_ef is None:
+        coal_ef = coal_emission_factors(pd.DataFrame(PLANTS_DATA))
+    inputs = [pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64) for c in BATCH_INPUTS]
+    coal = inputs[0]
+    baseline = np.empty((len(df), len(POLLUTANTS)))
+    for j, p in enumerate(POLLUTANTS):
+        estimate = coal * coal_ef.get(p, 0.0)
+        given = pd.to_numeric(df[p], errors="coerce").to_numpy(dtype=np.float64) if p in df.columns else estimate
+        baseline[:, j] = np.where(np.isnan(given), estimate, given)
+    result = evaluate_scenarios(*inputs, baseline, grid=False, biogas_ef=biogas_ef)
+    for j, p in enumerate(POLLUTANTS):
+        result.insert(4 + j, f"{p}_baseline", baseline[:, j])
+    extra = df[[c for c in df.columns if c not in BATCH_INPUTS and c not in POLLUTANTS]].reset_index(drop=True)
+    return pd.concat([extra, result], axis=1) if len(extra.columns) else result
+
+
+# Identical calculator inputs are served from a bounded LRU cache
+SCENARIO_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=SCENARIO_CACHE_SIZE)
+def _cached_scenario_table(coal_consumption, biogas_frac, esp, fgd, baseline_items, ef_items):
+    return single_scenario_table(coal_consumption, biogas_frac, esp, fgd, dict(baseline_items), dict(ef_items))
+
+
+def memo_scenario_table(coal_consumption, biogas_frac, esp, fgd, coal_baseline, biogas_ef=BIOGAS_EF):
+    """``single_scenario_table`` memoized on the exact inputs (repeated what-if toggles are free)."""
+    table = _cached_scenario_table(float(coal_consumption), float(biogas_frac), float(esp), float(fgd),
+                                   tuple(coal_baseline.items()), tuple(biogas_ef.items()))
+    return table.copy()
+
+
+def sweep_values(lo, hi, steps):
+    """Evenly spaced sweep values (a single value when lo == hi or steps == 1)."""
+    if steps <= 1 or lo == hi:
+        return np.array([lo], dtype=np.float64)
+    return np.linspace(lo, hi, int(steps))
+
+
+# ---------------------------------------------------
+# FLEET MODEL (every plant in the registry at once)
+# ---------------------------------------------------
+PLANT_POLLUTANTS = ["TSP", "PM10", "PM2.5", "SO2"]
+
+
+def load_plant_registry(path=None):
+    """PLANTS_DATA plus any plants listed in ``path`` (CSV or JSON records, same columns).
+
+    Plants from file may omit pollutant columns; those are estimated
+    from coal_tons with the fleet-average coal emission factors
+    (coal_EF_real). Per-plant emission factors are added as ``<pol>_EF``.
+    """
+    df = pd.DataFrame(PLANTS_DATA)
+    if path is not None and Path(path).exists():
+        path = Path(path)
+        extra = pd.read_json(path) if path.suffix.lower() == ".json" else pd.read_csv(path)
+        df = pd.concat([df, extra], ignore_index=True).drop_duplicates("plant_name", keep="last")
+    df = df.reset_index(drop=True)
+    df["coal_tons"] = pd.to_numeric(df["coal_tons"], errors="coerce").fillna(0.0)
+    for pol in PLANT_POLLUTANTS:
+        if pol not in df.columns:
+            df[pol] = np.nan
+        df[pol] = pd.to_numeric(df[pol], errors="coerce")
+    known = df.dropna(subset=PLANT_POLLUTANTS)
+    coal_EF_real = coal_emission_factors(known[known["coal_tons"] > 0], PLANT_POLLUTANTS)
+    for pol in PLANT_POLLUTANTS:
+        df[pol] = df[pol].fillna(df["coal_tons"] * coal_EF_real[pol])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df[f"{pol}_EF"] = np.where(df["coal_tons"] > 0, df[pol] / df["coal_tons"], np.nan)
+    return df
+
+
+def build_model_context(registry_path=None):
+    """Static inputs of the blend model, meant to be built once per process.
+
+    Returns a dict with the plant registry (``df_plants``), the fleet
+    average coal emission factors (``coal_EF_real``) and the biogas
+    emission factors (``biogas_EF``).
+    """
+    df_plants = load_plant_registry(registry_path)
+    return {
+        "df_plants": df_plants,
+        "coal_EF_real": coal_emission_factors(df_plants, PLANT_POLLUTANTS),
+        "biogas_EF": dict(BIOGAS_EF),
+    }
+
+
+def fleet_emissions(registry, biogas_frac, esp, fgd, biogas_ef=BIOGAS_EF):
+    """Blended emissions for every plant x scenario: array (plants, scenarios, POLLUTANTS).
+
+    ``biogas_frac``, ``esp`` and ``fgd`` are aligned 1-D scenario arrays
+    (or scalars).
+    """
+    base = _baseline_array(registry[PLANT_POLLUTANTS].to_numpy(dtype=np.float64))[:, None, :]
+    coal = registry["coal_tons"].to_numpy(dtype=np.float64)[:, None]
+    frac, esp, fgd = (np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (biogas_frac, esp, fgd))
+    return blend_emissions(coal, frac[None, :], esp[None, :], fgd[None, :], base, biogas_ef)
+
+
+def fleet_table(registry, emissions, biogas_frac):
+    """Tidy table (one row per plant and scenario) from ``fleet_emissions`` output."""
+    frac = np.atleast_1d(np.asarray(biogas_frac, dtype=np.float64))
+    n_plants, n_scen = emissions.shape[:2]
+    out = {
+        "plant_name": np.repeat(registry["plant_name"].to_numpy(), n_scen),
+        "biogas_frac": np.broadcast_to(frac, (n_plants, n_scen)).ravel(),
+    }
+    for j, p in enumerate(POLLUTANTS):
+        out[p] = emissions[:, :, j].ravel()
+    return pd.DataFrame(out)
+
+# ---------------------------------------------------
+# MONTE CARLO UNCERTAINTY
+# ---------------------------------------------------
+# Spreads with no plant data behind them (assumptions, not fits):
+# log-sd of each biogas emission factor and sd of the control efficiencies (% points)
+BIOGAS_EF_LOG_SD = 0.5
+ESP_EFF_SD = 1.0
+FGD_EFF_SD = 5.0
+MC_DRAWS = 100_000
+MC_CHUNK = 250_000
+CI_LEVEL = 95
+
+
+def fit_factor_spread(df_plants, pollutants=PLANT_POLLUTANTS):
+    """Lognormal fit of the per-plant coal emission factors.
+
+    Returns (log_mean, log_cov) over ``pollutants``; the covariance keeps
+    the strong correlation between the particulate factors.
+    """
+    ok = df_plants["coal_tons"] > 0
+    log_ef = np.log(np.column_stack([df_plants.loc[ok, p] / df_plants.loc[ok, "coal_tons"] for p in pollutants]))
+    return log_ef.mean(axis=0), np.atleast_2d(np.cov(log_ef, rowvar=False))
+
+
+def _sample_blend(n, seed, coal_consumption, biogas_frac, esp, fgd, base, biogas_ef, spread):
+    """``n`` draws of blended emissions, array (n, POLLUTANTS)."""
+    rng = np.random.default_rng(seed)
+    k = len(POLLUTANTS)
+    # Coal: correlated lognormal multipliers with mean 1 on the baseline
+    mult = np.ones((n, k))
+    if spread is not None:
+        cols, log_cov = spread
+        w, v = np.linalg.eigh(log_cov)
+        root = v * np.sqrt(np.clip(w, 0, None))
+        z = rng.standard_normal((n, len(cols))) @ root.T
+        mult[:, [POLLUTANTS.index(p) for p in cols]] = np.exp(z - np.diag(log_cov) / 2)
+    coal_part = base * mult * (1 - biogas_frac)
+    ef = np.array([biogas_ef.get(p, 0.0) for p in POLLUTANTS])
+    ef = ef * np.exp(rng.standard_normal((n, k)) * BIOGAS_EF_LOG_SD - BIOGAS_EF_LOG_SD ** 2 / 2)
+    bio_part = ef * (coal_consumption * biogas_frac)
+    esp_draw = np.clip(rng.normal(esp, ESP_EFF_SD, n), 0, 100)
+    fgd_draw = np.clip(rng.normal(fgd, FGD_EFF_SD, n), 0, 100)
+    return (coal_part + bio_part) * control_factors(esp_draw, fgd_draw)
+
+
+def monte_carlo_emissions(coal_consumption, biogas_frac, esp, fgd, baseline, n_draws=MC_DRAWS,
+                          spread=None, biogas_ef=BIOGAS_EF, seed=None, workers=1, chunk=MC_CHUNK):
+    """Blended-emission draws for one scenario: array (n_draws, POLLUTANTS).
+
+    ``spread`` is ``(pollutants, log_cov)`` from ``fit_factor_spread``
+    (None keeps the coal factors fixed). Draws are generated in chunks
+    of ``chunk`` with independent child seeds (SeedSequence), so the
+    result for a given ``seed`` is the same with or without the process
+    pool (``workers > 1``).
+    """
+    base = _baseline_array(baseline)
+    sizes = [min(chunk, n_draws - i) for i in range(0, n_draws, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = (float(coal_consumption), float(biogas_frac), float(esp), float(fgd), base, dict(biogas_ef), spread)
+    if workers and workers > 1 and len(sizes) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_sample_blend, sizes, seeds, *([a] * len(sizes) for a in args)))
+    else:
+        parts = [_sample_blend(n, s, *args) for n, s in zip(sizes, seeds)]
+    return np.concatenate(parts) if parts else np.empty((0, len(POLLUTANTS)))
+
+
+def uncertainty_table(coal_consumption, biogas_frac, esp, fgd, coal_baseline, df_plants=None,
+                      n_draws=MC_DRAWS, level=CI_LEVEL, biogas_ef=BIOGAS_EF, seed=None, workers=1):
+    """The calculator table with mean and ``level``% confidence interval columns.
+
+    Coal factor spread is fitted to ``df_plants`` (default PLANTS_DATA).
+    """
+    if df_plants is None:
+        df_plants = pd.DataFrame(PLANTS_DATA)
+    spread = (PLANT_POLLUTANTS, fit_factor_spread(df_plants)[1])
+    draws = monte_carlo_emissions(coal_consumption, biogas_frac, esp, fgd, coal_baseline, n_draws,
+                                  spread, biogas_ef, seed, workers)
+    lo_q, hi_q = (100 - level) / 2, 100 - (100 - level) / 2
+    # One partition per pollutant for both bounds, on contiguous rows
+    lo, hi = np.percentile(np.ascontiguousarray(draws.T), [lo_q, hi_q], axis=1)
+    mean = draws.mean(axis=0)
+    table = single_scenario_table(coal_consumption, biogas_frac, esp, fgd, coal_baseline, biogas_ef)
+    idx = [POLLUTANTS.index(p) for p in coal_baseline]
+    base = np.array(list(coal_baseline.values()), dtype=np.float64)
+    table["Blended mean (tons)"] = mean[idx]
+    table[f"Blended {lo_q:g}% (tons)"] = lo[idx]
+    table[f"Blended {hi_q:g}% (tons)"] = hi[idx]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Highest emissions give the lowest reduction
+        table[f"Reduction {lo_q:g}% (%)"] = np.where(base > 0, np.round((1 - hi[idx] / base) * 100, 2), np.nan)
+        table[f"Reduction {hi_q:g}% (%)"] = np.where(base > 0, np.round((1 - lo[idx] / base) * 100, 2), np.nan)
+    return table
+
+# ---------------------------------------------------
+# BLEND OPTIMIZER
+# ---------------------------------------------------
+# Above this biogas fraction equipment retrofitting may be required (see safety_warn)
+SAFE_BIOGAS_FRAC = 0.40
+
+
+def pareto_front(obj_a, obj_b):
+    """Indices of the points not dominated when minimizing both objectives (2-D, O(n log n))."""
+    obj_a, obj_b = np.asarray(obj_a), np.asarray(obj_b)
+    order = np.lexsort((obj_b, obj_a))
+    b_sorted = obj_b[order]
+    best_before = np.minimum.accumulate(np.concatenate([[np.inf], b_sorted[:-1]]))
+    return order[b_sorted < best_before]
+
+
+def _effort(frac, esp, fgd, frac_bounds, esp_bounds, fgd_bounds):
+    """How hard a setting pushes the plant, 0 (all at lower bounds) .. 3 (all at upper)."""
+    span = lambda v, lo, hi: (v - lo) / (hi - lo) if hi > lo else np.zeros_like(v)
+    return (span(frac, *frac_bounds) + span(esp, *esp_bounds) + span(fgd, *fgd_bounds))
+
+
+def optimize_blend(coal_consumption, baseline, weights=None, targets=None,
+                   frac_bounds=(0.0, SAFE_BIOGAS_FRAC), esp_bounds=(90.0, 99.5), fgd_bounds=(70.0, 95.0),
+                   resolution=(81, 40, 40), refine_rounds=2, biogas_ef=BIOGAS_EF):
+    """Search biogas fraction and ESP/FGD settings with the vectorized model.
+
+    Without ``targets`` the weighted sum of emissions (``weights``:
+    pollutant -> weight, default 1) is minimized. With ``targets``
+    (pollutant -> max tons/year) the least-effort setting meeting every
+    target is chosen, or the one closest to meeting them if none does.
+    Each round evaluates a full grid in one pass, then zooms in around
+    the best point. Returns a dict with the best scenario (Series), the
+    Pareto front of weighted non-NOx emissions vs. NOx (DataFrame),
+    whether the targets are met and how many scenarios were evaluated.
+    """
+    weights = np.array([(weights or {}).get(p, 1.0) for p in POLLUTANTS])
+    base = _baseline_array(baseline)
+    bounds = [tuple(map(float, frac_bounds)), tuple(map(float, esp_bounds)), tuple(map(float, fgd_bounds))]
+    limit = None
+    if targets:
+        limit = np.array([targets.get(p, np.inf) if targets.get(p) is not None else np.inf for p in POLLUTANTS])
+
+    search = list(bounds)
+    evaluated, frames = 0, []
+    best = None
+    for _ in range(refine_rounds + 1):
+        axes = [np.linspace(lo, hi, n) if hi > lo else np.array([lo]) for (lo, hi), n in zip(search, resolution)]
+        frac, esp, fgd = (m.ravel() for m in np.meshgrid(*axes, indexing="ij"))
+        emissions = blend_emissions(coal_consumption, frac, esp, fgd, base, biogas_ef)
+        evaluated += len(frac)
+        weighted = emissions @ weights
+        if limit is None:
+            score = weighted
+            feasible = np.ones(len(frac), dtype=bool)
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                excess = np.where(np.isfinite(limit), np.maximum(emissions - limit, 0) / np.maximum(limit, 1e-9), 0)
+            violation = excess.sum(axis=1)
+            feasible = violation == 0
+            effort = _effort(frac, esp, fgd, *bounds)
+            # Feasible points rank by effort; infeasible ones after them by violation
+            score = np.where(feasible, effort, 10.0 + violation)
+        frames.append((frac, esp, fgd, emissions, weighted, feasible))
+        i = int(np.argmin(score))
+        best = (frac[i], esp[i], fgd[i], bool(feasible[i]))
+        # Zoom into one grid step around the best point for the next round
+        search = [(max(lo, v - (hi - lo) / max(n - 1, 1)), min(hi, v + (hi - lo) / max(n - 1, 1)))
+                  for v, (lo, hi), n in zip(best[:3], search, resolution)]
+
+    frac, esp, fgd, emissions, weighted, feasible = (np.concatenate(parts) for parts in zip(*frames))
+    nox = emissions[:, POLLUTANTS.index("NOx")]
+    others = weighted - weights[POLLUTANTS.index("NOx")] * nox
+    front = pareto_front(others, nox)
+    table = pd.DataFrame({"biogas_frac": frac, "ESP": esp, "FGD": fgd,
+                          **{p: emissions[:, j] for j, p in enumerate(POLLUTANTS)},
+                          "weighted_total": weighted, "meets_targets": feasible})
+    best_row = blend_emissions(coal_consumption, best[0], best[1], best[2], base, biogas_ef)
+    best_series = pd.Series({"biogas_frac": best[0], "ESP": best[1], "FGD": best[2],
+                             **dict(zip(POLLUTANTS, best_row)), "weighted_total": float(best_row @ weights)})
+    return {
+        "best": best_series,
+        "reduction_pct": pd.Series(reduction_pct(base, best_row), index=POLLUTANTS),
+        "pareto": table.iloc[front].sort_values("NOx").reset_index(drop=True),
+        "meets_targets": best[3],
+        "evaluated": evaluated,
+    }
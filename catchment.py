@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from routing import EARTH_RADIUS_KM, haversine_km, unit_vectors
+
+# Distance bands reported per plant (km); the selected radius is always added
+CATCHMENT_BANDS_KM = [10.0, 25.0, 50.0]
+
+
+def chord_for_km(km):
+    """Unit-sphere chord length equivalent to a great-circle distance in km."""
+    return 2 * np.sin(np.asarray(km, dtype=np.float64) / (2 * EARTH_RADIUS_KM))
+
+
+class CatchmentIndex:
+    """Ball-query index over feedstock sources.
+
+    Sources are stored as unit-sphere vectors in a cKDTree, where a
+    great-circle radius is an exact Euclidean (chord) radius. Every
+    plant's catchment is one tree query; distances of the hits are then
+    computed with vectorized haversine.
+    """
+
+    def __init__(self, lon, lat):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.tree = cKDTree(unit_vectors(self.lon, self.lat))
+
+    def pairs(self, plant_lon, plant_lat, radius_km):
+        """(plant index, source index, km) for every source within ``radius_km`` of every plant."""
+        plant_lon = np.atleast_1d(np.asarray(plant_lon, dtype=np.float64))
+        plant_lat = np.atleast_1d(np.asarray(plant_lat, dtype=np.float64))
+        hits = self.tree.query_ball_point(unit_vectors(plant_lon, plant_lat), chord_for_km(radius_km), workers=-1)
+        counts = np.fromiter((len(h) for h in hits), dtype=np.int64, count=len(hits))
+        plant = np.repeat(np.arange(len(hits)), counts)
+        src = np.concatenate([np.asarray(h, dtype=np.int64) for h in hits]) if counts.sum() else np.arange(0)
+        km = haversine_km(plant_lon[plant], plant_lat[plant], self.lon[src], self.lat[src])
+        return plant, src, km
+
+
+def catchment_table(plant, src, km, tonnage, plant_names, bands_km=CATCHMENT_BANDS_KM):
+    """Per-plant source count and tonnage within each band (km), one row per plant."""
+    tonnage = np.asarray(tonnage, dtype=np.float64)
+    n = len(plant_names)
+    out = {"plant": list(plant_names)}
+    for band in sorted(set(bands_km)):
+        inside = km <= band
+        out[f"sources <= {band:g} km"] = np.bincount(plant[inside], minlength=n)
+        out[f"tons <= {band:g} km"] = np.bincount(plant[inside], weights=tonnage[src[inside]], minlength=n)
+    return pd.DataFrame(out)
@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Briggs rural dispersion coefficients per Pasquill-Gifford stability class:
+# sigma_y = a x (1 + b x)^-0.5, sigma_z = c x (1 + d x)^e  (x downwind, m)
+BRIGGS_RURAL = {
+    "A": (0.22, 0.0001, 0.20, 0.0, 1.0),
+    "B": (0.16, 0.0001, 0.12, 0.0, 1.0),
+    "C": (0.11, 0.0001, 0.08, 0.0002, -0.5),
+    "D": (0.08, 0.0001, 0.06, 0.0015, -0.5),
+    "E": (0.06, 0.0001, 0.03, 0.0003, -1.0),
+    "F": (0.04, 0.0001, 0.016, 0.0003, -1.0),
+}
+STABILITY_CLASSES = list(BRIGGS_RURAL)
+# Effective release height when a plant gives none (m)
+STACK_HEIGHT_M = 150.0
+# Grid cell size (degrees, ~550 m) and cells per tile side
+CELL_DEG = 0.005
+TILE_CELLS = 64
+# Cells evaluated per chunk (bounds the plants x cells temporaries)
+CHUNK_CELLS = 65_536
+# Computed tiles kept per model
+TILE_CACHE_SIZE = 256
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+M_PER_DEG_LAT = 111_320.0
+
+
+def tons_per_year_to_g_per_s(tons):
+    return np.asarray(tons, dtype=np.float64) * 1e6 / SECONDS_PER_YEAR
+
+
+def briggs_sigmas(x, stability):
+    """(sigma_y, sigma_z) in m at downwind distance ``x`` (m) for a rural site."""
+    a, b, c, d, e = BRIGGS_RURAL[stability]
+    return a * x / np.sqrt(1 + b * x), c * x * (1 + d * x) ** e
+
+
+def plume_concentration(lon, lat, src_lon, src_lat, rate_g_s, height_m, wind_from_deg, wind_speed, stability):
+    """Ground-level concentration (ug/m3) at points ``lon``/``lat``, summed over sources.
+
+    Steady-state Gaussian plume with ground reflection. ``wind_from_deg``
+    is the meteorological direction the wind blows from (0 = north).
+    Distances use a local equirectangular projection, fine at the tens
+    of km a plume model is meant for.
+    """
+    lon, lat = np.asarray(lon, dtype=np.float64)[:, None], np.asarray(lat, dtype=np.float64)[:, None]
+    src_lon, src_lat = np.asarray(src_lon, dtype=np.float64)[None, :], np.asarray(src_lat, dtype=np.float64)[None, :]
+    east = (lon - src_lon) * M_PER_DEG_LAT * np.cos(np.radians(src_lat))
+    north = (lat - src_lat) * M_PER_DEG_LAT
+    # Unit vector the wind blows towards
+    theta = np.radians(wind_from_deg)
+    to_e, to_n = -np.sin(theta), -np.cos(theta)
+    x = east * to_e + north * to_n
+    y = east * to_n - north * to_e
+    downwind = x > 1.0
+    x = np.where(downwind, x, 1.0)
+    sy, sz = briggs_sigmas(x, stability)
+    h = np.asarray(height_m, dtype=np.float64)[None, :]
+    q = np.asarray(rate_g_s, dtype=np.float64)[None, :]
+    c = q / (np.pi * max(wind_speed, 0.5) * sy * sz) * np.exp(-0.5 * (y / sy) ** 2 - 0.5 * (h / sz) ** 2)
+    return np.where(downwind, c, 0.0).sum(axis=1) * 1e6
+
+
+class PlumeModel:
+    """Concentration raster for fixed sources and weather, computed tile by tile.
+
+    The grid is anchored at (0, 0) with ``cell_deg`` cells, so tiles line
+    up across calls: rasters of overlapping areas reuse cached tiles and
+    only new tiles are evaluated (in chunks, on ``workers`` threads).
+    """
+
+    def __init__(self, src_lon, src_lat, rate_g_s, height_m, wind_from_deg, wind_speed, stability,
+                 cell_deg=CELL_DEG, tile_cells=TILE_CELLS, workers=4):
+        self.src = (np.asarray(src_lon, dtype=np.float64), np.asarray(src_lat, dtype=np.float64),
+                    np.asarray(rate_g_s, dtype=np.float64), np.broadcast_to(np.asarray(height_m, dtype=np.float64),
+                                                                            np.shape(src_lon)))
+        self.weather = (float(wind_from_deg), float(wind_speed), stability)
+        self.cell_deg = cell_deg
+        self.tile_cells = tile_cells
+        self.workers = workers
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evaluate(self, lon, lat):
+        out = np.empty(len(lon))
+        chunk = max(CHUNK_CELLS // max(len(self.src[0]), 1), 1024)
+        spans = [(i, min(i + chunk, len(lon))) for i in range(0, len(lon), chunk)]
+
+        def run(span):
+            lo, hi = span
+            out[lo:hi] = plume_concentration(lon[lo:hi], lat[lo:hi], *self.src, *self.weather)
+
+        if self.workers > 1 and len(spans) > 1:
+            with ThreadPoolExecutor(self.workers) as pool:
+                list(pool.map(run, spans))
+        else:
+            for span in spans:
+                run(span)
+        return out
+
+    def tile(self, tx, ty):
+        """(tile_cells, tile_cells) concentrations, row 0 = southernmost, cell centres."""
+        with self._lock:
+            cached = self._tiles.get((tx, ty))
+            if cached is not None:
+                self._tiles.move_to_end((tx, ty))
+                return cached
+        n = self.tile_cells
+        ix = (tx * n + np.arange(n) + 0.5) * self.cell_deg
+        iy = (ty * n + np.arange(n) + 0.5) * self.cell_deg
+        lon, lat = np.meshgrid(ix, iy)
+        values = self._evaluate(lon.ravel(), lat.ravel()).reshape(n, n)
+        with self._lock:
+            self._tiles[(tx, ty)] = values
+            while len(self._tiles) > TILE_CACHE_SIZE:
+                self._tiles.popitem(last=False)
+        return values
+
+    def raster(self, bbox):
+        """(grid, bounds) covering ``bbox`` (min_lon, min_lat, max_lon, max_lat).
+
+        ``grid`` has row 0 at the south edge; ``bounds`` is the exact
+        [[south, west], [north, east]] of the returned cells.
+        """
+        span = self.cell_deg * self.tile_cells
+        tx0, ty0 = int(np.floor(bbox[0] / span)), int(np.floor(bbox[1] / span))
+        tx1, ty1 = int(np.floor(bbox[2] / span)), int(np.floor(bbox[3] / span))
+        grid = np.block([[self.tile(tx, ty) for tx in range(tx0, tx1 + 1)] for ty in range(ty0, ty1 + 1)])
+        bounds = [[ty0 * span, tx0 * span], [(ty1 + 1) * span, (tx1 + 1) * span]]
+        return grid, bounds
+
+
+def heatmap_rgba(grid, vmax=None, alpha=0.65):
+    """Yellow-to-red RGBA image (north row first) for ``ImageOverlay``; zero stays transparent."""
+    vmax = vmax if vmax else float(np.nanmax(grid)) if grid.size and np.nanmax(grid) > 0 else 1.0
+    t = np.clip(np.sqrt(grid / vmax), 0, 1)[::-1]
+    rgba = np.empty(t.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (230 * (1 - t)).astype(np.uint8)
+    rgba[..., 2] = 0
+    rgba[..., 3] = (255 * alpha * np.clip(t * 4, 0, 1)).astype(np.uint8)
+    return rgba
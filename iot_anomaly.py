@@ -0,0 +1,120 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from iot_buffer import VALUE_COLUMNS
+
+# Anomaly kinds; each value column gets its own group of bits in the int16 mask
+SPIKE, DRIFT, STUCK = 1, 2, 4
+KIND_BITS = 3
+KIND_NAMES = {SPIKE: "spike", DRIFT: "drift", STUCK: "stuck"}
+
+# EWMA weights: level (~20 readings), noise variance (~50) and slow baseline (~400)
+FAST_ALPHA = 0.1
+VAR_ALPHA = 0.02
+SLOW_ALPHA = 0.005
+# Readings per series before spikes / drift are flagged
+WARMUP_READINGS = 30
+DRIFT_WARMUP_READINGS = 200
+# A reading this many standard deviations from the level is a spike
+SPIKE_Z = 5.0
+# The level this many of its own standard errors away from the baseline is drift
+DRIFT_Z = 6.0
+# This many identical consecutive values is a stuck sensor
+STUCK_READINGS = 30
+# Floor for the standard deviation, relative to the level (quantised sensors)
+MIN_REL_STD = 1e-3
+
+DRIFT_SE = math.sqrt(FAST_ALPHA / (2 - FAST_ALPHA))
+
+
+def flag_bit(column, kind):
+    """Bit for ``kind`` (SPIKE/DRIFT/STUCK) of a VALUE_COLUMNS ``column``."""
+    return kind << (KIND_BITS * VALUE_COLUMNS.index(column))
+
+
+def describe_flags(mask):
+    """[(column, kind name)] set in one anomaly mask."""
+    mask = int(mask)
+    return [(c, name) for j, c in enumerate(VALUE_COLUMNS) for kind, name in KIND_NAMES.items()
+            if mask & (kind << (KIND_BITS * j))]
+
+
+def column_flags(masks, column, kinds=SPIKE | DRIFT | STUCK):
+    """Boolean array: which masks have any of ``kinds`` set for ``column`` (vectorized)."""
+    return (np.asarray(masks, dtype=np.int64) >> (KIND_BITS * VALUE_COLUMNS.index(column))) & kinds != 0
+
+
+class _SeriesState:
+    __slots__ = ("n", "mean", "var", "baseline", "last", "repeats")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = self.var = self.baseline = 0.0
+        self.last = None
+        self.repeats = 0
+
+
+class AnomalyDetector:
+    """Incremental spike / drift / stuck-sensor detector for one feed.
+
+    Every series keeps an EWMA level and noise variance, a slow EWMA
+    baseline and a run length of identical values, so ``update`` costs
+    O(1) per reading whatever the history length. Spikes are scored
+    against the state *before* the reading and enter the state clipped,
+    so one outlier does not inflate the variance for the readings after it.
+    """
+
+    def __init__(self, columns=VALUE_COLUMNS):
+        self.columns = list(columns)
+        self._state = [_SeriesState() for _ in self.columns]
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._state = [_SeriesState() for _ in self.columns]
+
+    def update(self, row):
+        """Fold in one reading (dict with VALUE_COLUMNS); returns its anomaly mask."""
+        mask = 0
+        with self._lock:
+            for j, (column, s) in enumerate(zip(self.columns, self._state)):
+                try:
+                    x = float(row.get(column))
+                except (TypeError, ValueError):
+                    continue
+                if math.isnan(x):
+                    continue
+                mask |= self._update_series(s, x) << (KIND_BITS * j)
+        return mask
+
+    @staticmethod
+    def _update_series(s, x):
+        flags = 0
+        s.repeats = s.repeats + 1 if x == s.last else 1
+        s.last = x
+        s.n += 1
+        std = math.sqrt(max(s.var, (MIN_REL_STD * max(abs(s.baseline), 1.0)) ** 2))
+        if s.n > WARMUP_READINGS:
+            if abs(x - s.mean) > SPIKE_Z * std:
+                flags |= SPIKE
+                # Clip the outlier before it enters the state
+                x = s.mean + math.copysign(SPIKE_Z * std, x - s.mean)
+            if s.repeats >= STUCK_READINGS:
+                flags |= STUCK
+        # Weights start at 1/n so early estimates are plain running means
+        diff = x - s.mean
+        s.var = (1 - max(VAR_ALPHA, 1 / s.n)) * (s.var + max(VAR_ALPHA, 1 / s.n) * diff * diff)
+        s.mean += max(FAST_ALPHA, 1 / s.n) * diff
+        s.baseline += max(SLOW_ALPHA, 1 / s.n) * (x - s.baseline)
+        # Standard error of an EWMA level around a stationary baseline
+        if s.n > DRIFT_WARMUP_READINGS and abs(s.mean - s.baseline) > DRIFT_Z * std * DRIFT_SE:
+            flags |= DRIFT
+        return flags
+
+    def score_frame(self, df):
+        """Masks for every row of ``df`` in order (updates the state; used for imports)."""
+        values = df[self.columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        return np.array([self.update(dict(zip(self.columns, row))) for row in values], dtype=np.int16)
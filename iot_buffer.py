@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+# Columns kept for every sensor reading (same layout as the old iot_history DataFrame)
+HISTORY_COLUMNS = ["timestamp", "Temperature", "CO2", "PM2_5", "status", "anomaly"]
+VALUE_COLUMNS = ["Temperature", "CO2", "PM2_5"]
+
+# Default number of readings kept in memory (~11.5 days at one reading every 5 s)
+HISTORY_CAPACITY = 200_000
+
+
+class TelemetryBuffer:
+    """Fixed-capacity columnar ring buffer for IoT readings.
+
+    Every column is a preallocated NumPy array. Each row is written twice
+    (at ``i`` and ``i + slots``) so the newest ``capacity`` rows always sit
+    in one contiguous slice and ``frame()`` can hand out views instead of
+    copying the history. The extra ``headroom`` slots mean a view taken by
+    a chart stays intact for that many further appends.
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, headroom=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = int(capacity)
+        self.headroom = int(headroom if headroom is not None else max(1024, capacity // 8))
+        self._slots = self.capacity + self.headroom
+        self._timestamps = np.zeros(2 * self._slots, dtype="datetime64[ns]")
+        self._values = np.zeros((2 * self._slots, len(VALUE_COLUMNS)), dtype=np.float64)
+        self._status = np.zeros(2 * self._slots, dtype=np.int16)
+        # Anomaly bitmask per reading (see iot_anomaly), 0 = normal
+        self._flags = np.zeros(2 * self._slots, dtype=np.int16)
+        self._categories = []
+        self._category_codes = {}
+        self._count = 0  # rows appended since the last clear
+        self._generation = 0  # bumped on every change, never reset
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def total_appended(self):
+        """Number of rows appended since creation or the last ``clear``."""
+        return self._count
+
+    @property
+    def generation(self):
+        """Change counter: grows with every append, bulk append and replace, never goes back.
+
+        Unlike ``total_appended`` it survives ``replace``, so caches keyed
+        on it see an import even when the row count ends up the same.
+        """
+        return self._generation
+
+    @property
+    def empty(self):
+        return self._count == 0
+
+    def _status_code(self, status):
+        status = "UNKNOWN" if status is None else str(status)
+        code = self._category_codes.get(status)
+        if code is None:
+            code = len(self._categories)
+            self._categories.append(status)
+            self._category_codes[status] = code
+        return code
+
+    def append(self, row):
+        """Append one reading (dict with the HISTORY_COLUMNS keys) in O(1)."""
+        i = self._count % self._slots
+        ts = np.datetime64(pd.Timestamp(row["timestamp"]).to_datetime64(), "ns")
+        values = [_as_float(row.get(c)) for c in VALUE_COLUMNS]
+        code = self._status_code(row.get("status"))
+        flags = row.get("anomaly") or 0
+        for pos in (i, i + self._slots):
+            self._timestamps[pos] = ts
+            self._values[pos] = values
+            self._status[pos] = code
+            self._flags[pos] = flags
+        self._count += 1
+        self._generation += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def extend_frame(self, df):
+        """Bulk-append a DataFrame with (a subset of) the HISTORY_COLUMNS."""
+        if df is None or len(df) == 0:
+            return
+        df = df.iloc[-self.capacity:]
+        n = len(df)
+        timestamps = pd.to_datetime(df["timestamp"]).to_numpy(dtype="datetime64[ns]")
+        values = np.column_stack([
+            pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64) if c in df.columns
+            else np.zeros(n)
+            for c in VALUE_COLUMNS
+        ])
+        if "status" in df.columns:
+            statuses = df["status"].where(df["status"].notna(), "UNKNOWN").astype(str)
+        else:
+            statuses = pd.Series(["UNKNOWN"] * n)
+        uniques, inverse = np.unique(statuses.to_numpy(), return_inverse=True)
+        codes = np.array([self._status_code(s) for s in uniques], dtype=np.int16)[inverse]
+        if "anomaly" in df.columns:
+            flags = pd.to_numeric(df["anomaly"], errors="coerce").fillna(0).to_numpy(dtype=np.int16)
+        else:
+            flags = np.zeros(n, dtype=np.int16)
+
+        # Write in at most two contiguous chunks (before and after the wrap point)
+        start = self._count % self._slots
+        first = min(n, self._slots - start)
+        for lo, hi, dst in ((0, first, start), (first, n, 0)):
+            if hi <= lo:
+                continue
+            for base in (dst, dst + self._slots):
+                self._timestamps[base:base + hi - lo] = timestamps[lo:hi]
+                self._values[base:base + hi - lo] = values[lo:hi]
+                self._status[base:base + hi - lo] = codes[lo:hi]
+                self._flags[base:base + hi - lo] = flags[lo:hi]
+        self._count += n
+        self._generation += 1
+
+    def clear(self):
+        self._count = 0
+
+    def replace(self, df):
+        """Drop everything and load ``df`` instead (used by the CSV importer)."""
+        self.clear()
+        self.extend_frame(df)
+        self._generation += 1
+
+    def _window(self, n=None):
+        size = len(self)
+        if n is not None:
+            size = min(size, max(int(n), 0))
+        end = self._count % self._slots + self._slots
+        return end - size, end
+
+    def last(self, offset=1):
+        """Return the ``offset``-th newest reading as a dict, or None."""
+        if offset < 1 or offset > len(self):
+            return None
+        pos = self._count % self._slots + self._slots - offset
+        row = {"timestamp": pd.Timestamp(self._timestamps[pos])}
+        row.update({c: float(v) for c, v in zip(VALUE_COLUMNS, self._values[pos])})
+        row["status"] = self._categories[self._status[pos]]
+        row["anomaly"] = int(self._flags[pos])
+        return row
+
+    def frame(self, n=None):
+        """DataFrame view of the newest ``n`` rows (all rows by default).
+
+        The numeric columns are views into the ring, so the result must be
+        treated as read-only and should not be held across more than
+        ``headroom`` appends.
+        """
+        lo, hi = self._window(n)
+        df = pd.DataFrame(self._values[lo:hi], columns=VALUE_COLUMNS, copy=False)
+        df.insert(0, "timestamp", self._timestamps[lo:hi])
+        df["status"] = pd.Categorical.from_codes(
+            self._status[lo:hi], categories=pd.Index(self._categories, dtype=object)
+        ) if self._categories else pd.Categorical([])
+        df["anomaly"] = self._flags[lo:hi]
+        return df
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
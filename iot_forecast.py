@@ -0,0 +1,190 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from iot_buffer import VALUE_COLUMNS
+from iot_anomaly import SPIKE, flag_bit
+
+# Holt smoothing weights per typical reading interval: level, trend (alpha * beta*)
+LEVEL_ALPHA = 0.1
+TREND_BETA = 0.001
+# Readings per series before a forecast is served
+MIN_READINGS = 20
+# Forecast horizons (minutes) served to the charts
+FORECAST_HORIZONS_MIN = list(range(5, 65, 5))
+# Horizons (minutes) whose band width is measured from past forecasts
+CALIBRATION_HORIZONS_MIN = [5, 15, 30, 60]
+# A forecast snapshot is kept every this many seconds for calibration
+SNAPSHOT_INTERVAL_S = 15.0
+# Weight of each new squared error in the one-step and calibrated variances
+RESIDUAL_ALPHA = 0.02
+# Two-sided band (percent)
+FORECAST_LEVEL = 95
+
+# z for common band levels (avoids a scipy import on the ingest path)
+Z_SCORES = {80: 1.2816, 90: 1.6449, 95: 1.9600, 99: 2.5758}
+
+
+class _HoltState:
+    __slots__ = ("n", "level", "trend", "resid_var", "step_s", "last_ts")
+
+    def __init__(self):
+        self.n = 0
+        self.level = self.trend = self.resid_var = 0.0
+        self.step_s = None
+        self.last_ts = None
+
+
+class HoltForecaster:
+    """Online Holt linear-trend forecaster for the IoT series of one feed.
+
+    Each series keeps a level, a trend per typical reading interval and
+    an EWMA of that interval, so ``update`` is O(1) per reading; uneven
+    gaps scale the smoothing weights by the number of intervals elapsed.
+    Band widths are empirical: every SNAPSHOT_INTERVAL_S the current
+    forecasts are kept, and once a calibration horizon has passed they
+    are scored against the reading that arrived, feeding an EWMA of
+    squared errors per horizon. Readings flagged as spikes by
+    iot_anomaly are not learned from.
+    """
+
+    def __init__(self, columns=VALUE_COLUMNS, alpha=LEVEL_ALPHA, beta=TREND_BETA,
+                 calibration_min=CALIBRATION_HORIZONS_MIN):
+        self.columns = list(columns)
+        self.alpha = alpha
+        self.beta = beta
+        self.calibration_s = np.asarray(calibration_min, dtype=np.float64) * 60
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = {c: _HoltState() for c in self.columns}
+            self._latest_ts = None
+            # (ts, states copied at ts) every SNAPSHOT_INTERVAL_S, enough to cover the longest horizon
+            self._snapshots = deque(maxlen=int(self.calibration_s.max() / SNAPSHOT_INTERVAL_S) + 2)
+            self._snap_total = 0
+            # Next snapshot (absolute index) to score, per calibration horizon
+            self._cursor = np.zeros(len(self.calibration_s), dtype=np.int64)
+            self._cal_var = np.zeros((len(self.calibration_s), len(self.columns)))
+            self._cal_n = np.zeros((len(self.calibration_s), len(self.columns)), dtype=np.int64)
+
+    def update(self, row):
+        """Fold in one reading (dict with timestamp, VALUE_COLUMNS and optional anomaly mask)."""
+        ts = pd.Timestamp(row["timestamp"]).value / 1e9
+        mask = int(row.get("anomaly") or 0)
+        values = []
+        for column in self.columns:
+            try:
+                x = float(row.get(column))
+            except (TypeError, ValueError):
+                x = math.nan
+            values.append(math.nan if mask & flag_bit(column, SPIKE) else x)
+        with self._lock:
+            if self._latest_ts is not None and ts <= self._latest_ts:
+                return
+            self._latest_ts = ts
+            self._calibrate(ts, values)
+            for column, x in zip(self.columns, values):
+                if not math.isnan(x):
+                    self._update_series(self._state[column], ts, x)
+            if not self._snapshots or ts - self._snapshots[-1][0] >= SNAPSHOT_INTERVAL_S:
+                self._snapshots.append((ts, [(s.n, s.level, s.trend, s.step_s, s.last_ts)
+                                             for s in self._state.values()]))
+                self._snap_total += 1
+
+    def _calibrate(self, ts, values):
+        """Score every snapshot whose calibration horizon has just been reached."""
+        first = self._snap_total - len(self._snapshots)
+        for k, horizon in enumerate(self.calibration_s):
+            self._cursor[k] = max(self._cursor[k], first)
+            while self._cursor[k] < self._snap_total:
+                snap_ts, states = self._snapshots[self._cursor[k] - first]
+                if snap_ts + horizon > ts:
+                    break
+                for j, (x, (n, level, trend, step_s, last_ts)) in enumerate(zip(values, states)):
+                    if math.isnan(x) or n < MIN_READINGS or not step_s:
+                        continue
+                    error = x - (level + trend * (ts - last_ts) / step_s)
+                    self._cal_n[k, j] += 1
+                    w = max(RESIDUAL_ALPHA, 1 / self._cal_n[k, j])
+                    self._cal_var[k, j] += w * (error * error - self._cal_var[k, j])
+                self._cursor[k] += 1
+
+    def _update_series(self, s, ts, x):
+        if s.n == 0:
+            s.level, s.last_ts, s.n = x, ts, 1
+            return
+        dt = ts - s.last_ts
+        s.last_ts = ts
+        s.step_s = dt if s.step_s is None else s.step_s + 0.05 * (dt - s.step_s)
+        steps = dt / s.step_s
+        # Weights for ``steps`` intervals elapsed at once (plain Holt when steps == 1)
+        alpha = 1 - (1 - self.alpha) ** steps
+        beta = 1 - (1 - self.beta / self.alpha) ** steps
+        predicted = s.level + s.trend * steps
+        error = x - predicted
+        if s.n > 2:
+            w = max(RESIDUAL_ALPHA, 1 / s.n)
+            s.resid_var += w * (error * error / max(steps, 1.0) - s.resid_var)
+        new_level = predicted + alpha * error
+        s.trend += beta * (new_level - s.level - s.trend * steps) / steps
+        s.level = new_level
+        s.n += 1
+
+    def _band_variance(self, j, s, lead_s):
+        """Forecast error variance at ``lead_s`` seconds ahead for series ``j``.
+
+        Interpolated between the one-step variance and the calibrated
+        horizons; beyond the last calibrated horizon it grows linearly.
+        Uncalibrated, it falls back to the random-walk level term alone.
+        """
+        known = self._cal_n[:, j] >= MIN_READINGS
+        xs = np.concatenate([[s.step_s], self.calibration_s[known]])
+        ys = np.concatenate([[s.resid_var], self._cal_var[known, j]])
+        if len(xs) == 1:
+            steps = np.maximum(lead_s / s.step_s, 1.0)
+            return s.resid_var * (1 + (steps - 1) * self.alpha ** 2)
+        var = np.interp(lead_s, xs, ys)
+        beyond = lead_s > xs[-1]
+        var[beyond] = ys[-1] * lead_s[beyond] / xs[-1]
+        return var
+
+    def forecast(self, horizons_min=FORECAST_HORIZONS_MIN, level=FORECAST_LEVEL):
+        """{column: DataFrame(timestamp, horizon_min, mean, lower, upper)} from the latest reading.
+
+        Series with fewer than MIN_READINGS readings are left out.
+        """
+        z = Z_SCORES[level]
+        out = {}
+        with self._lock:
+            if self._latest_ts is None:
+                return out
+            base = self._latest_ts
+            horizon_s = np.asarray(horizons_min, dtype=np.float64) * 60
+            for j, (column, s) in enumerate(self._state.items()):
+                if s.n < MIN_READINGS or not s.step_s:
+                    continue
+                # Lead from the series' own last reading (it may lag the feed)
+                lead_s = base - s.last_ts + horizon_s
+                mean = s.level + s.trend * lead_s / s.step_s
+                half = z * np.sqrt(self._band_variance(j, s, lead_s))
+                out[column] = pd.DataFrame({
+                    "timestamp": pd.to_datetime((base + horizon_s) * 1e9),
+                    "horizon_min": list(horizons_min),
+                    "mean": mean,
+                    "lower": mean - half,
+                    "upper": mean + half,
+                })
+        return out
+
+    def update_frame(self, df):
+        """Fold in every row of ``df`` in order (priming from stored history or an import)."""
+        if df is None or len(df) == 0:
+            return
+        df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+        for row in df.to_dict("records"):
+            self.update(row)
@@ -0,0 +1,297 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from iot_buffer import VALUE_COLUMNS
+
+# Bucket widths maintained for every feed (label -> seconds)
+ROLLUP_WINDOWS = {"1 min": 60, "15 min": 900, "1 h": 3600}
+
+# Closed buckets kept in memory per window (1 min buckets: ~70 days)
+MAX_BUCKETS = 100_000
+# First allocation per window; it then doubles up to MAX_BUCKETS as buckets close
+INITIAL_BUCKETS = 256
+
+# Bucket starts are always written with the time part, even at midnight
+ROLLUP_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+ROLLUP_COLUMNS = (
+    ["bucket", "rows"]
+    + [f"{c}_{stat}" for c in VALUE_COLUMNS for stat in ("min", "max", "mean", "count")]
+    + ["danger", "warning"]
+)
+
+
+class RollupWindow:
+    """Incrementally maintained min/max/mean/count and status counts per time bucket.
+
+    ``update`` is O(1): it folds the reading into the open bucket and,
+    when a reading lands in a later bucket, closes the open one into the
+    closed-bucket arrays (and hands it to ``on_close`` for persistence).
+    Those arrays grow by doubling up to ``max_buckets`` and are then used
+    as a ring, so the oldest bucket is overwritten instead of shifted out.
+    """
+
+    _FIELDS = ("_start", "_rows", "_min", "_max", "_sum", "_count", "_danger", "_warning")
+
+    def __init__(self, label, seconds, max_buckets=MAX_BUCKETS, on_close=None):
+        self.label = label
+        self.width = np.int64(seconds * 1_000_000_000)
+        self.max_buckets = max_buckets
+        self.on_close = on_close
+        k = len(VALUE_COLUMNS)
+        self._start = np.zeros(0, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._min = np.zeros((0, k))
+        self._max = np.zeros((0, k))
+        self._sum = np.zeros((0, k))
+        self._count = np.zeros((0, k), dtype=np.int64)
+        self._danger = np.zeros(0, dtype=np.int64)
+        self._warning = np.zeros(0, dtype=np.int64)
+        self._head = 0  # slot of the oldest closed bucket
+        self._n = 0
+        self._open = None
+
+    @property
+    def closed_until(self):
+        """End (ns) of the newest closed bucket, or None."""
+        return int(self._start[self._slots(self._n - 1, self._n)[0]] + self.width) if self._n else None
+
+    def _slots(self, lo, hi):
+        """Array slots of closed buckets ``lo:hi`` (0 = oldest)."""
+        return (self._head + np.arange(lo, hi)) % max(len(self._start), 1)
+
+    def _grow(self, needed):
+        """Reallocate for at least ``needed`` buckets (doubling, capped at max_buckets), oldest first."""
+        size = min(max(needed, 2 * len(self._start), INITIAL_BUCKETS), self.max_buckets)
+        slots = self._slots(0, self._n)
+        for name in self._FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((size,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[slots]
+            setattr(self, name, new)
+        self._head = 0
+
+    def _new_open(self, bucket):
+        k = len(VALUE_COLUMNS)
+        return {"bucket": bucket, "rows": 0, "min": np.full(k, np.inf), "max": np.full(k, -np.inf),
+                "sum": np.zeros(k), "count": np.zeros(k, dtype=np.int64), "danger": 0, "warning": 0}
+
+    def update(self, ts_ns, values, status):
+        bucket = ts_ns - ts_ns % self.width
+        if self._open is None:
+            self._open = self._new_open(bucket)
+        elif bucket > self._open["bucket"]:
+            self._close_open()
+            self._open = self._new_open(bucket)
+        elif bucket < self._open["bucket"]:
+            return  # late reading for an already closed bucket; raw history still has it
+        b = self._open
+        values = np.asarray(values, dtype=np.float64)
+        ok = ~np.isnan(values)
+        b["rows"] += 1
+        b["min"] = np.where(ok, np.minimum(b["min"], values), b["min"])
+        b["max"] = np.where(ok, np.maximum(b["max"], values), b["max"])
+        b["sum"] += np.where(ok, values, 0.0)
+        b["count"] += ok
+        b["danger"] += status == "DANGER"
+        b["warning"] += status == "WARNING"
+
+    def _append_closed(self, start, rows, mins, maxs, sums, counts, danger, warning):
+        """Store closed buckets after the newest one; returns how many were stored.
+
+        Past ``max_buckets`` the oldest buckets are overwritten (bounded memory).
+        """
+        if len(start) > self.max_buckets:
+            start, rows, mins, maxs, sums, counts, danger, warning = (
+                a[-self.max_buckets:] for a in (start, rows, mins, maxs, sums, counts, danger, warning))
+        m = len(start)
+        if self._n + m > len(self._start) and len(self._start) < self.max_buckets:
+            self._grow(self._n + m)
+        sl = (self._head + self._n + np.arange(m)) % len(self._start)
+        self._start[sl], self._rows[sl] = start, rows
+        self._min[sl], self._max[sl], self._sum[sl], self._count[sl] = mins, maxs, sums, counts
+        self._danger[sl], self._warning[sl] = danger, warning
+        overwritten = max(self._n + m - len(self._start), 0)
+        self._head = (self._head + overwritten) % len(self._start)
+        self._n += m - overwritten
+        return m
+
+    def _close_open(self):
+        b = self._open
+        self._append_closed(np.array([b["bucket"]]), np.array([b["rows"]]), b["min"][None], b["max"][None],
+                            b["sum"][None], b["count"][None], np.array([b["danger"]]), np.array([b["warning"]]))
+        if self.on_close is not None:
+            self.on_close(self, self._frame(self._n - 1, self._n))
+
+    def load_closed(self, df):
+        """Restore persisted closed buckets (a frame with ROLLUP_COLUMNS)."""
+        if df is None or len(df) == 0:
+            return
+        # ISO8601 also reads files written before ROLLUP_DATE_FORMAT (bare dates at midnight)
+        df = df.assign(bucket=pd.to_datetime(df["bucket"], format="ISO8601"))
+        df = df.drop_duplicates(subset="bucket", keep="last").sort_values("bucket")
+        if self._n:
+            df = df[df["bucket"].to_numpy(dtype="datetime64[ns]").view(np.int64) >= self.closed_until]
+        mean = lambda c: df[f"{c}_mean"].to_numpy(dtype=np.float64)
+        count = lambda c: df[f"{c}_count"].to_numpy(dtype=np.int64)
+        self._append_closed(
+            df["bucket"].to_numpy(dtype="datetime64[ns]").view(np.int64),
+            df["rows"].to_numpy(dtype=np.int64),
+            np.column_stack([df[f"{c}_min"].to_numpy(dtype=np.float64) for c in VALUE_COLUMNS]),
+            np.column_stack([df[f"{c}_max"].to_numpy(dtype=np.float64) for c in VALUE_COLUMNS]),
+            np.column_stack([np.nan_to_num(mean(c)) * count(c) for c in VALUE_COLUMNS]),
+            np.column_stack([count(c) for c in VALUE_COLUMNS]),
+            df["danger"].to_numpy(dtype=np.int64),
+            df["warning"].to_numpy(dtype=np.int64),
+        )
+
+    def bulk_update(self, history):
+        """Fold a history frame (sorted by time) in one vectorized pass.
+
+        Complete buckets are aggregated with groupby; rows of the newest
+        bucket go through ``update`` so it stays open for live readings.
+        """
+        if history is None or len(history) == 0:
+            return
+        ts = pd.to_datetime(history["timestamp"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        since = self.closed_until
+        if since is not None:
+            keep = ts >= since
+            history, ts = history[keep], ts[keep]
+            if len(ts) == 0:
+                return
+        buckets = ts - ts % self.width
+        last = buckets.max()
+        full = buckets < last
+        if full.any():
+            part = history[full]
+            values = part[VALUE_COLUMNS].apply(pd.to_numeric, errors="coerce")
+            status = part["status"].astype(str).to_numpy()
+            g = values.groupby(buckets[full])
+            counts = g.count()
+            agg = pd.DataFrame({"rows": pd.Series(1, index=values.index).groupby(buckets[full]).sum(),
+                                "danger": pd.Series(status == "DANGER", index=values.index).groupby(buckets[full]).sum(),
+                                "warning": pd.Series(status == "WARNING", index=values.index).groupby(buckets[full]).sum()})
+            added = self._append_closed(
+                agg.index.to_numpy(dtype=np.int64), agg["rows"].to_numpy(),
+                g.min().fillna(np.inf).to_numpy(), g.max().fillna(-np.inf).to_numpy(),
+                g.sum().to_numpy(), counts.to_numpy(), agg["danger"].to_numpy(), agg["warning"].to_numpy(),
+            )
+            if self.on_close is not None and added:
+                self.on_close(self, self._frame(self._n - added, self._n))
+        tail = history[~full]
+        for ts_ns, row in zip(ts[~full], tail[VALUE_COLUMNS + ["status"]].itertuples(index=False)):
+            self.update(ts_ns, [_to_float(v) for v in row[:-1]], str(row[-1]))
+
+    def _frame(self, lo, hi, extra=None, max_points=None):
+        sl = self._slots(lo, hi)
+        start, rows = self._start[sl], self._rows[sl]
+        mins, maxs, sums, counts = self._min[sl], self._max[sl], self._sum[sl], self._count[sl]
+        danger, warning = self._danger[sl], self._warning[sl]
+        if extra is not None:
+            start, rows = np.append(start, extra["bucket"]), np.append(rows, extra["rows"])
+            mins, maxs = np.vstack([mins, extra["min"]]), np.vstack([maxs, extra["max"]])
+            sums, counts = np.vstack([sums, extra["sum"]]), np.vstack([counts, extra["count"]])
+            danger, warning = np.append(danger, extra["danger"]), np.append(warning, extra["warning"])
+        if max_points is not None and len(start) > max_points:
+            # Merge runs of consecutive buckets (labelled by their first bucket) into at most max_points
+            at = np.arange(0, len(start), -(-len(start) // max_points))
+            start, rows = start[at], np.add.reduceat(rows, at)
+            mins, maxs = np.fmin.reduceat(mins, at, axis=0), np.fmax.reduceat(maxs, at, axis=0)
+            sums, counts = np.add.reduceat(sums, at, axis=0), np.add.reduceat(counts, at, axis=0)
+            danger, warning = np.add.reduceat(danger, at), np.add.reduceat(warning, at)
+        out = {"bucket": start.view("datetime64[ns]"), "rows": rows}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for j, c in enumerate(VALUE_COLUMNS):
+                empty = counts[:, j] == 0
+                out[f"{c}_min"] = np.where(empty, np.nan, mins[:, j])
+                out[f"{c}_max"] = np.where(empty, np.nan, maxs[:, j])
+                out[f"{c}_mean"] = np.where(empty, np.nan, sums[:, j] / counts[:, j])
+                out[f"{c}_count"] = counts[:, j]
+        out["danger"], out["warning"] = danger, warning
+        return pd.DataFrame(out, columns=ROLLUP_COLUMNS)
+
+    def frame(self, include_open=True, max_points=None):
+        """All buckets as a DataFrame (the open bucket last, if any).
+
+        With ``max_points``, runs of consecutive buckets are merged so at
+        most that many rows come back (min/max/mean stay exact per run).
+        """
+        return self._frame(0, self._n, self._open if include_open else None, max_points)
+
+
+class RollupSet:
+    """The ROLLUP_WINDOWS for one feed, optionally persisted as CSV next to its history."""
+
+    def __init__(self, directory=None, windows=ROLLUP_WINDOWS, max_buckets=MAX_BUCKETS):
+        self.directory = Path(directory) if directory is not None else None
+        self._lock = threading.Lock()
+        on_close = self._persist if self.directory is not None else None
+        self.windows = {label: RollupWindow(label, seconds, max_buckets, on_close)
+                        for label, seconds in windows.items()}
+
+    def _path(self, window):
+        return self.directory / f"rollup_{int(window.width // 1_000_000_000)}s.csv"
+
+    def _persist(self, window, df):
+        path = self._path(window)
+        try:
+            df.to_csv(path, mode="a", header=not path.exists(), index=False, date_format=ROLLUP_DATE_FORMAT)
+        except Exception as e:
+            print(f"Failed to persist {window.label} rollup: {e}")
+
+    def _restore(self, window):
+        path = self._path(window)
+        try:
+            df = pd.read_csv(path)
+            window.load_closed(df)
+        except Exception as e:
+            # Set the file aside so freshly closed buckets are not appended to it
+            path.replace(path.with_name(path.name + ".unreadable"))
+            print(f"Moved unreadable {window.label} rollup aside ({e}); rebuilding from history")
+            return
+        if len(df) != len(window.frame(include_open=False)):
+            # Duplicate buckets (re-appended by older versions): compact the file
+            window.frame(include_open=False).to_csv(path, index=False, date_format=ROLLUP_DATE_FORMAT)
+
+    def load(self, history=None):
+        """Restore persisted buckets, then fold in any newer raw history."""
+        with self._lock:
+            for window in self.windows.values():
+                if self.directory is not None and self._path(window).exists():
+                    self._restore(window)
+                window.bulk_update(history)
+        return self
+
+    def update(self, row):
+        ts_ns = pd.Timestamp(row["timestamp"]).value
+        values = [_to_float(row.get(c)) for c in VALUE_COLUMNS]
+        status = str(row.get("status"))
+        with self._lock:
+            for window in self.windows.values():
+                window.update(ts_ns, values, status)
+
+    def frame(self, label, max_points=None):
+        with self._lock:
+            return self.windows[label].frame(max_points=max_points)
+
+    def reset(self, history):
+        """Rebuild from scratch (after a history import replaced the raw data)."""
+        with self._lock:
+            for window in self.windows.values():
+                if self.directory is not None and self._path(window).exists():
+                    self._path(window).unlink()
+                fresh = RollupWindow(window.label, int(window.width // 1_000_000_000),
+                                     window.max_buckets, window.on_close)
+                fresh.bulk_update(history)
+                self.windows[window.label] = fresh
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
@@ -0,0 +1,411 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from iot_buffer import HISTORY_COLUMNS, VALUE_COLUMNS
+
+# Default write-path tuning (see BatchedWriter)
+SEGMENT_ROWS = 50_000       # rows per segment file before rotating
+FLUSH_ROWS = 200            # flush once this many rows are pending...
+FLUSH_INTERVAL_S = 10.0     # ...or once the oldest pending row is this old
+FSYNC_INTERVAL_S = 60.0     # 0 = fsync every flush, None = leave it to the OS
+
+
+def normalize_history(df):
+    """Return ``df`` with exactly the HISTORY_COLUMNS, parsed timestamps and no bad rows."""
+    df = df.copy()
+    if 'PM2_5' not in df.columns and 'PM2.5' in df.columns:
+        df = df.rename(columns={'PM2.5': 'PM2_5'})
+    for c in HISTORY_COLUMNS:
+        if c not in df.columns:
+            df[c] = 'UNKNOWN' if c == 'status' else (pd.NaT if c == 'timestamp' else 0.0)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    df['anomaly'] = pd.to_numeric(df['anomaly'], errors='coerce').fillna(0).astype(np.int16)
+    return df[HISTORY_COLUMNS].dropna(subset=['timestamp'])
+
+
+def _time_slice(df, start=None, end=None):
+    if start is not None:
+        df = df[df['timestamp'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['timestamp'] <= pd.Timestamp(end)]
+    return df
+
+
+class CsvSegmentStore:
+    """Append-only IoT history stored as numbered CSV segment files.
+
+    Rows are only ever appended to the newest segment; once it holds
+    ``segment_rows`` rows a new segment is started, so no write ever
+    touches more than one batch worth of data. Reads and writes share a
+    lock, so ``load`` never sees a half-appended batch.
+    """
+
+    suffix = ".csv"
+
+    def __init__(self, directory, segment_rows=SEGMENT_ROWS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_rows = int(segment_rows)
+        self._lock = threading.RLock()
+        segments = self.segments()
+        self._current = segments[-1] if segments else None
+        if self._current:
+            self._trim_torn_line(self._current)
+        self._current_rows = self._count_rows(self._current) if self._current else 0
+        if self._current and self._read_header(self._current) != HISTORY_COLUMNS:
+            # Segment written with an older column layout: start a fresh one
+            self._current_rows = self.segment_rows
+
+    def segments(self):
+        return sorted(self.directory.glob(f"segment-*{self.suffix}"))
+
+    def _segment_path(self, index):
+        return self.directory / f"segment-{index:06d}{self.suffix}"
+
+    def _next_segment(self):
+        segments = self.segments()
+        index = int(segments[-1].stem.split("-")[1]) + 1 if segments else 0
+        return self._segment_path(index)
+
+    @staticmethod
+    def _read_header(path):
+        with open(path, newline="") as f:
+            return f.readline().strip().split(",")
+
+    @staticmethod
+    def _trim_torn_line(path):
+        """Cut an unterminated last line (an append interrupted by a crash) off ``path``."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if data and not data.endswith(b"\n"):
+            os.truncate(path, data.rfind(b"\n") + 1)
+            print(f"Dropped a torn last line from history segment {path.name}")
+
+    @staticmethod
+    def _count_rows(path):
+        with open(path, "rb") as f:
+            return max(sum(1 for _ in f) - 1, 0)
+
+    def adopt_legacy(self, csv_path):
+        """One-time migration: turn the old single ``iot_history.csv`` into segment 0."""
+        csv_path = Path(csv_path)
+        if self.segments() or not csv_path.exists():
+            return False
+        df = normalize_history(pd.read_csv(csv_path))
+        self.rewrite(df)
+        csv_path.rename(csv_path.with_name(csv_path.name + ".migrated"))
+        print(f"Migrated {len(df)} rows from {csv_path.name} into {self.directory.name}/")
+        return True
+
+    def write_rows(self, df, fsync=False):
+        """Append a batch of rows, rotating segments as they fill up."""
+        with self._lock:
+            self._write_rows(df, fsync)
+
+    def _write_rows(self, df, fsync):
+        start = 0
+        while start < len(df):
+            if self._current is None or self._current_rows >= self.segment_rows:
+                self._current = self._next_segment()
+                self._current_rows = 0
+            take = min(len(df) - start, self.segment_rows - self._current_rows)
+            chunk = df.iloc[start:start + take]
+            with open(self._current, "a", newline="") as f:
+                chunk.to_csv(f, header=self._current_rows == 0, index=False)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._current_rows += take
+            start += take
+
+    def load(self, start=None, end=None):
+        """All stored rows (optionally a time range).
+
+        An unreadable segment raises rather than being skipped, so an
+        import never rewrites the store from a partial history.
+        """
+        with self._lock:
+            frames = [pd.read_csv(path) for path in self.segments() if path.stat().st_size]
+        if not frames:
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        return _time_slice(normalize_history(pd.concat(frames, ignore_index=True)), start, end)
+
+    def rewrite(self, df):
+        """Replace the whole history with ``df`` (used by imports; compacts segments)."""
+        with self._lock:
+            self._rewrite(df)
+
+    def _rewrite(self, df):
+        staging = self.directory / ".rewrite"
+        shutil.rmtree(staging, ignore_errors=True)
+        staged = type(self)(staging, self.segment_rows)
+        staged.write_rows(normalize_history(df), fsync=True)
+        for path in self.segments():
+            path.unlink()
+        for path in staged.segments():
+            path.rename(self.directory / path.name)
+        shutil.rmtree(staging, ignore_errors=True)
+        self._current = staged._current and self.directory / staged._current.name
+        self._current_rows = staged._current_rows
+
+
+class ColumnarStore:
+    """Binary columnar IoT history: one raw little-endian file per column.
+
+    New rows are appended to the end of each column file, and ``load``
+    memory-maps the files instead of parsing text, so cold start cost is
+    a page-in rather than a CSV parse. Timestamps are int64 nanoseconds
+    kept in arrival order, which lets ``load(start, end)`` binary-search
+    straight to a time range. Status strings are stored as int16 codes
+    with the code table in ``status.json``.
+    """
+
+    DTYPES = {"timestamp": "<i8", "Temperature": "<f8", "CO2": "<f8", "PM2_5": "<f8", "status": "<i2",
+              "anomaly": "<i2"}
+    # Columns added after the first release; stores written before them get zeros
+    ADDED_COLUMNS = ("anomaly",)
+
+    def __init__(self, directory, segment_rows=None):
+        # segment_rows is accepted for interface parity with CsvSegmentStore
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._meta_path = self.directory / "status.json"
+        meta = json.loads(self._meta_path.read_text()) if self._meta_path.exists() else {}
+        self._categories = meta.get("categories", [])
+        self._sorted = meta.get("sorted", True)
+        self._rows = self._repair()
+
+    def _column_path(self, column):
+        return self.directory / f"{column}.col"
+
+    def _repair(self):
+        """Zero-fill columns newer than the store, then truncate all columns to the shortest one
+        (recovers from a torn write)."""
+        rows = self._column_rows("timestamp")
+        for column in self.ADDED_COLUMNS:
+            path = self._column_path(column)
+            if rows and not path.exists():
+                with open(path, "wb") as f:
+                    f.truncate(rows * np.dtype(self.DTYPES[column]).itemsize)
+        rows = min(self._column_rows(c) for c in self.DTYPES)
+        for column, dtype in self.DTYPES.items():
+            path = self._column_path(column)
+            if path.exists() and path.stat().st_size != rows * np.dtype(dtype).itemsize:
+                os.truncate(path, rows * np.dtype(dtype).itemsize)
+        return rows
+
+    def _column_rows(self, column):
+        path = self._column_path(column)
+        return path.stat().st_size // np.dtype(self.DTYPES[column]).itemsize if path.exists() else 0
+
+    def __len__(self):
+        return self._rows
+
+    def _save_meta(self):
+        self._meta_path.write_text(json.dumps({"categories": self._categories, "sorted": self._sorted}))
+
+    def adopt_legacy(self, csv_path):
+        """One-shot migration of the old CSV history (single file and/or segments) into columns."""
+        csv_path = Path(csv_path)
+        if self._rows:
+            return False
+        sources = sorted(self.directory.glob("segment-*.csv"))
+        if csv_path.exists():
+            sources.insert(0, csv_path)
+        if not sources:
+            return False
+        df = pd.concat([pd.read_csv(p) for p in sources], ignore_index=True)
+        df = normalize_history(df).sort_values('timestamp', kind='stable')
+        self.rewrite(df)
+        for p in sources:
+            p.rename(p.with_name(p.name + ".migrated"))
+        print(f"Migrated {len(df)} rows from {len(sources)} CSV file(s) into columnar storage")
+        return True
+
+    def write_rows(self, df, fsync=False):
+        if len(df) == 0:
+            return
+        df = normalize_history(df)
+        timestamps = df['timestamp'].to_numpy(dtype="datetime64[ns]").view("<i8")
+        statuses = df['status'].where(df['status'].notna(), 'UNKNOWN').astype(str)
+        codes = []
+        for status in statuses:
+            if status not in self._categories:
+                self._categories.append(status)
+            codes.append(self._categories.index(status))
+        self._save_meta()
+
+        if self._sorted:
+            last = self._last_timestamp()
+            if (last is not None and timestamps[0] < last) or np.any(np.diff(timestamps) < 0):
+                self._sorted = False
+                self._save_meta()
+
+        columns = {"timestamp": timestamps, "status": np.asarray(codes), "anomaly": df['anomaly'].to_numpy()}
+        columns.update({c: pd.to_numeric(df[c], errors='coerce').to_numpy() for c in VALUE_COLUMNS})
+        for column, dtype in self.DTYPES.items():
+            with open(self._column_path(column), "ab") as f:
+                f.write(np.ascontiguousarray(columns[column], dtype=dtype).tobytes())
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        self._rows += len(df)
+
+    def _last_timestamp(self):
+        if not self._rows:
+            return None
+        with open(self._column_path("timestamp"), "rb") as f:
+            f.seek((self._rows - 1) * 8)
+            return np.frombuffer(f.read(8), dtype="<i8")[0]
+
+    def columns(self, start=None, end=None):
+        """Memory-mapped column arrays for rows in [start, end] (no copy when sorted)."""
+        if not self._rows:
+            return None
+        maps = {c: np.memmap(self._column_path(c), dtype=d, mode="r", shape=(self._rows,))
+                for c, d in self.DTYPES.items()}
+        ts = maps["timestamp"]
+        lo_ns = pd.Timestamp(start).value if start is not None else None
+        hi_ns = pd.Timestamp(end).value if end is not None else None
+        if self._sorted:
+            lo = int(np.searchsorted(ts, lo_ns, side="left")) if lo_ns is not None else 0
+            hi = int(np.searchsorted(ts, hi_ns, side="right")) if hi_ns is not None else self._rows
+            return {c: m[lo:hi] for c, m in maps.items()}
+        mask = np.ones(self._rows, dtype=bool)
+        if lo_ns is not None:
+            mask &= ts >= lo_ns
+        if hi_ns is not None:
+            mask &= ts <= hi_ns
+        return {c: m[mask] for c, m in maps.items()}
+
+    def load(self, start=None, end=None):
+        cols = self.columns(start, end)
+        if cols is None:
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        df = pd.DataFrame({c: cols[c] for c in VALUE_COLUMNS}, copy=False)
+        df.insert(0, "timestamp", cols["timestamp"].view("datetime64[ns]"))
+        df["status"] = pd.Categorical.from_codes(cols["status"], categories=pd.Index(self._categories, dtype=object))
+        df["anomaly"] = cols["anomaly"]
+        return df
+
+    def rewrite(self, df):
+        staging = self.directory / ".rewrite"
+        shutil.rmtree(staging, ignore_errors=True)
+        staged = type(self)(staging)
+        staged.write_rows(df, fsync=True)
+        for column in self.DTYPES:
+            src = staged._column_path(column)
+            if src.exists():
+                src.replace(self._column_path(column))
+            elif self._column_path(column).exists():
+                self._column_path(column).unlink()
+        shutil.rmtree(staging, ignore_errors=True)
+        self._categories, self._sorted, self._rows = staged._categories, staged._sorted, staged._rows
+        self._save_meta()
+
+
+def feed_directory(root, topic_filter):
+    """Per-topic-filter history directory under ``root`` (wildcards spelled out)."""
+    name = topic_filter.replace("#", "ALL").replace("+", "ANY")
+    return Path(root) / re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_")
+
+
+def move_flat_history(root, directory):
+    """Move history files written directly in ``root`` (pre multi-site layout) into ``directory``."""
+    root, directory = Path(root), Path(directory)
+    patterns = ["segment-*.csv*", "*.col", "status.json"]
+    files = [p for pattern in patterns for p in root.glob(pattern) if p.is_file()]
+    if not files or any(directory.glob("*")):
+        return False
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in files:
+        path.rename(directory / path.name)
+    print(f"Moved {len(files)} history file(s) into {directory.name}/")
+    return True
+
+
+# Storage backends selectable from app.py (HISTORY_BACKEND)
+STORAGE_BACKENDS = {"csv": CsvSegmentStore, "columnar": ColumnarStore}
+
+
+class BatchedWriter:
+    """Buffers new rows and flushes them to a store in batches.
+
+    A flush happens when ``flush_rows`` rows are pending or the oldest
+    pending row is older than ``flush_interval`` seconds. Files are
+    fsynced at most every ``fsync_interval`` seconds (0 = every flush,
+    None = never, leaving it to the OS).
+    """
+
+    def __init__(self, store, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL_S,
+                 fsync_interval=FSYNC_INTERVAL_S):
+        self.store = store
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._pending = []
+        self._first_pending_at = None
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, row):
+        with self._lock:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append(row)
+            if self._due():
+                self._flush_locked()
+
+    def _due(self):
+        if len(self._pending) >= self.flush_rows:
+            return True
+        return bool(self._pending) and time.monotonic() - self._first_pending_at >= self.flush_interval
+
+    def maybe_flush(self):
+        """Flush if the time threshold has passed (call this periodically)."""
+        with self._lock:
+            if self._due():
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked(force_fsync=True)
+
+    def _flush_locked(self, force_fsync=False):
+        if not self._pending:
+            return
+        batch = pd.DataFrame(self._pending, columns=HISTORY_COLUMNS)
+        now = time.monotonic()
+        fsync = force_fsync or (
+            self.fsync_interval is not None and now - self._last_fsync >= self.fsync_interval
+        )
+        try:
+            self.store.write_rows(batch, fsync=fsync)
+        except Exception as e:
+            # Keep the rows so the next flush can retry
+            print(f"Failed to persist IoT history batch: {e}")
+            return
+        if fsync:
+            self._last_fsync = now
+        self._pending = []
+        self._first_pending_at = None
+
+    def load(self, start=None, end=None):
+        """Flush pending rows and return the persisted history (optionally a time range)."""
+        with self._lock:
+            self._flush_locked(force_fsync=True)
+            return self.store.load(start, end)
+
+    def rewrite(self, df):
+        with self._lock:
+            self._pending = []
+            self._first_pending_at = None
+            self.store.rewrite(df)
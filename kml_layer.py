@@ -0,0 +1,401 @@
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Items per R-tree node
+STR_NODE_SIZE = 16
+# Above this many visible features the viewport is clustered on a grid
+MAX_VIEW_MARKERS = 400
+# Grid cells across the viewport width when clustering
+CLUSTER_GRID_CELLS = 40
+
+# Part kinds in KmlGeometry.part_kind
+POINT, LINE, OUTER_RING, INNER_RING = 0, 1, 2, 3
+GEOMETRY_TAGS = {"Point", "LineString", "LinearRing", "Polygon", "MultiGeometry"}
+FEATURE_COLUMNS = ["name", "folder", "geom_type", "lon", "lat", "min_lon", "min_lat", "max_lon", "max_lat"]
+
+
+def _local(tag):
+    """Tag without its namespace ('{http://www.opengis.net/kml/2.2}Point' -> 'Point')."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_coordinates(text):
+    """KML ``lon,lat[,alt]`` tuples as an (n, 2) float array."""
+    tuples = text.split()
+    if not tuples:
+        return np.empty((0, 2))
+    dims = tuples[0].count(",") + 1
+    try:
+        return np.array(",".join(tuples).split(","), dtype=np.float64).reshape(-1, dims)[:, :2]
+    except ValueError:
+        # Mixed 2-D/3-D tuples: fall back to one tuple at a time
+        return np.array([[float(v) for v in t.split(",")[:2]] for t in tuples], dtype=np.float64)
+
+
+class KmlGeometry:
+    """Every placemark of a KML file in flat arrays.
+
+    ``coords`` holds all vertices (lon, lat); ``part_offsets`` splits
+    them into parts (a point, a line or a polygon ring, see
+    ``part_kind``) and ``feature_parts`` groups parts per feature.
+    ``features`` has one row per placemark: name, folder (category),
+    geometry type, a representative point and the bounding box.
+    """
+
+    def __init__(self, features, coords, part_offsets, part_kind, feature_parts):
+        self.features = features
+        self.coords = coords
+        self.part_offsets = part_offsets
+        self.part_kind = part_kind
+        self.feature_parts = feature_parts
+
+    def parts(self, i):
+        """[(kind, (n, 2) array)] for feature ``i``."""
+        lo, hi = self.feature_parts[i], self.feature_parts[i + 1]
+        return [(int(self.part_kind[p]), self.coords[self.part_offsets[p]:self.part_offsets[p + 1]])
+                for p in range(lo, hi)]
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.part_offsets.nbytes + self.part_kind.nbytes + self.feature_parts.nbytes
+
+
+def _geojson_geometry(parts, precision):
+    round_xy = lambda xy: np.round(xy, precision).tolist()
+    geoms, polygon = [], None
+    for kind, xy in parts:
+        if kind == POINT:
+            geoms.append({"type": "Point", "coordinates": round_xy(xy[0])})
+        elif kind == LINE:
+            geoms.append({"type": "LineString", "coordinates": round_xy(xy)})
+        elif kind == OUTER_RING:
+            polygon = {"type": "Polygon", "coordinates": [round_xy(xy)]}
+            geoms.append(polygon)
+        elif polygon is not None:
+            polygon["coordinates"].append(round_xy(xy))
+    return geoms[0] if len(geoms) == 1 else {"type": "GeometryCollection", "geometries": geoms}
+
+
+def to_geojson(geometry, kinds=None, precision=6):
+    """FeatureCollection (dict) of the features, properties name and folder.
+
+    ``kinds`` limits it to features whose first part is one of the given
+    part kinds (e.g. ``(LINE, OUTER_RING)`` for everything but points).
+    Coordinates are rounded to ``precision`` decimals (6: ~0.1 m) to
+    keep the payload small.
+    """
+    features = []
+    first_kind = geometry.part_kind[geometry.feature_parts[:-1]] if len(geometry.part_kind) else []
+    for i, (name, folder) in enumerate(zip(geometry.features["name"], geometry.features["folder"])):
+        if kinds is not None and first_kind[i] not in kinds:
+            continue
+        features.append({"type": "Feature", "properties": {"name": name, "folder": folder},
+                         "geometry": _geojson_geometry(geometry.parts(i), precision)})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def point_rows(geometry, precision=6):
+    """[lat, lon, name] per point feature, the compact form client-side clusterers take."""
+    f = geometry.features
+    is_point = (f["geom_type"] == "Point").to_numpy()
+    lat = np.round(f["lat"].to_numpy()[is_point], precision)
+    lon = np.round(f["lon"].to_numpy()[is_point], precision)
+    return [[y, x, n] for y, x, n in zip(lat.tolist(), lon.tolist(), f["name"][is_point])]
+
+
+@contextmanager
+def _open_kml(path):
+    """Binary stream of the KML document (the first .kml inside a KMZ); closes the archive too."""
+    path = Path(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            names = [n for n in zf.namelist() if n.lower().endswith(".kml")]
+            if not names:
+                raise ValueError(f"{path.name}: no .kml document in archive")
+            with zf.open("doc.kml" if "doc.kml" in names else names[0]) as stream:
+                yield stream
+    else:
+        with open(path, "rb") as stream:
+            yield stream
+
+
+def load_kml(path):
+    """Parse every placemark geometry of a KML/KMZ file in one streaming pass.
+
+    Uses ``iterparse`` and clears each placemark once read, so memory
+    stays bounded by the output arrays rather than the document tree.
+    """
+    names, folders, types, reps = [], [], [], []
+    chunks, pending, part_offsets, part_kind, feature_parts = [], [], [0], [], [0]
+    local = {}  # namespaced tag -> local name
+    n_coords = 0
+    stack = []  # open element tags
+    elems = []  # open elements (to drop finished placemarks from their parent)
+    folder_names = []  # innermost last
+    placemark = None  # {"name", "types"} while inside a Placemark
+    with _open_kml(path) as stream:
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            tag = local.get(elem.tag)
+            if tag is None:
+                tag = local[elem.tag] = _local(elem.tag)
+            if event == "start":
+                stack.append(tag)
+                elems.append(elem)
+                if tag == "Folder":
+                    folder_names.append("")
+                elif tag == "Placemark":
+                    placemark = {"name": "Unknown", "types": []}
+                continue
+            stack.pop()
+            elems.pop()
+            parent = stack[-1] if stack else None
+            if tag == "name":
+                if parent == "Placemark" and placemark is not None:
+                    placemark["name"] = (elem.text or "").strip() or "Unknown"
+                elif parent == "Folder" and folder_names:
+                    folder_names[-1] = (elem.text or "").strip()
+            elif tag == "coordinates" and placemark is not None:
+                xy = parse_coordinates(elem.text or "")
+                if len(xy):
+                    if parent == "Point":
+                        kind = POINT
+                    elif parent == "LinearRing":
+                        kind = INNER_RING if "innerBoundaryIs" in stack else OUTER_RING
+                    else:
+                        kind = LINE
+                    pending.append(xy)
+                    if len(pending) >= 4096:
+                        # Consolidate small per-part arrays to keep overhead bounded
+                        chunks.append(np.concatenate(pending))
+                        pending = []
+                    n_coords += len(xy)
+                    part_offsets.append(n_coords)
+                    part_kind.append(kind)
+            elif tag in GEOMETRY_TAGS and parent == "Placemark" and placemark is not None:
+                placemark["types"].append(tag)
+            elif tag == "Placemark" and placemark is not None:
+                if len(part_kind) > feature_parts[-1]:
+                    feature_parts.append(len(part_kind))
+                    names.append(placemark["name"])
+                    folders.append(next((f for f in reversed(folder_names) if f), ""))
+                    types.append(placemark["types"][0] if len(placemark["types"]) == 1 else "MultiGeometry")
+                placemark = None
+                # Names are already captured, so the parent's finished children can go
+                if elems:
+                    elems[-1].clear()
+            elif tag == "Folder":
+                folder_names.pop()
+                elem.clear()
+            elif tag in ("Style", "StyleMap"):
+                elem.clear()
+
+    chunks.extend(pending)
+    coords = np.concatenate(chunks) if chunks else np.empty((0, 2))
+    part_offsets = np.asarray(part_offsets, dtype=np.int64)
+    feature_parts = np.asarray(feature_parts, dtype=np.int64)
+    # Per-feature bounding boxes and representative points from the vertex ranges
+    starts = part_offsets[feature_parts[:-1]]
+    ends = part_offsets[feature_parts[1:]]
+    if len(starts):
+        min_xy = np.column_stack([np.minimum.reduceat(coords[:, k], starts) for k in (0, 1)])
+        max_xy = np.column_stack([np.maximum.reduceat(coords[:, k], starts) for k in (0, 1)])
+        mean_xy = np.column_stack([np.add.reduceat(coords[:, k], starts) for k in (0, 1)]) / (ends - starts)[:, None]
+    else:
+        min_xy = max_xy = mean_xy = np.empty((0, 2))
+    features = pd.DataFrame({
+        "name": names,
+        "folder": pd.Categorical(folders),
+        "geom_type": pd.Categorical(types),
+        "lon": mean_xy[:, 0], "lat": mean_xy[:, 1],
+        "min_lon": min_xy[:, 0], "min_lat": min_xy[:, 1],
+        "max_lon": max_xy[:, 0], "max_lat": max_xy[:, 1],
+    }, columns=FEATURE_COLUMNS)
+    return KmlGeometry(features, coords, part_offsets, np.asarray(part_kind, dtype=np.int8), feature_parts)
+
+
+def file_sha1(path, block=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_LAYERS = {}  # resolved path -> (mtime_ns, sha1, FeatureLayer)
+_LAYERS_LOCK = threading.Lock()
+
+
+def cached_layer(path):
+    """FeatureLayer for ``path``, parsed once per process.
+
+    An unchanged mtime returns the cached layer without reading the
+    file. A new mtime re-hashes it and only re-parses when the SHA-1
+    changed too (a touched or re-copied file keeps its layer).
+    """
+    key = str(Path(path).resolve())
+    mtime = Path(path).stat().st_mtime_ns
+    with _LAYERS_LOCK:
+        cached = _LAYERS.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[2]
+        sha1 = file_sha1(path)
+        if cached is not None and cached[1] == sha1:
+            _LAYERS[key] = (mtime, sha1, cached[2])
+            return cached[2]
+        layer = FeatureLayer(load_kml(path))
+        layer.fingerprint = sha1
+        _LAYERS[key] = (mtime, sha1, layer)
+        return layer
+
+
+def _str_order(cx, cy, node_size):
+    """Sort-Tile-Recursive order: vertical slices by x, each sorted by y."""
+    n = len(cx)
+    n_nodes = -(-n // node_size)
+    n_slices = max(int(np.ceil(np.sqrt(n_nodes))), 1)
+    per_slice = n_slices * node_size
+    by_x = np.argsort(cx, kind="stable")
+    slice_of = np.empty(n, dtype=np.int64)
+    slice_of[by_x] = np.arange(n) // per_slice
+    return np.lexsort((cy, slice_of))
+
+
+class STRIndex:
+    """Static R-tree over bounding boxes, bulk-loaded with Sort-Tile-Recursive packing.
+
+    ``boxes`` is an (n, 4) array of (min_lon, min_lat, max_lon, max_lat);
+    points are zero-size boxes. The tree is a list of levels, each a
+    box array plus the [start, end) range of its children in the level
+    below, so a query walks it with a handful of vectorized steps.
+    """
+
+    def __init__(self, boxes, node_size=STR_NODE_SIZE):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.node_size = node_size
+        self.size = len(boxes)
+        self.order = np.arange(0)
+        self.levels = []
+        if self.size == 0:
+            return
+        self.order = _str_order((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2, node_size)
+        self.boxes = boxes[self.order]
+        child_boxes = self.boxes
+        while True:
+            n = len(child_boxes)
+            starts = np.arange(0, n, node_size)
+            ends = np.minimum(starts + node_size, n)
+            node_boxes = np.column_stack([
+                np.minimum.reduceat(child_boxes[:, 0], starts), np.minimum.reduceat(child_boxes[:, 1], starts),
+                np.maximum.reduceat(child_boxes[:, 2], starts), np.maximum.reduceat(child_boxes[:, 3], starts),
+            ])
+            self.levels.append((node_boxes, starts, ends))
+            if len(node_boxes) <= node_size:
+                break
+            # Re-pack this level; reordering nodes keeps their child ranges
+            order = _str_order((node_boxes[:, 0] + node_boxes[:, 2]) / 2, (node_boxes[:, 1] + node_boxes[:, 3]) / 2,
+                               node_size)
+            self.levels[-1] = (node_boxes[order], starts[order], ends[order])
+            child_boxes = node_boxes[order]
+
+    @staticmethod
+    def _hits(boxes, bbox):
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return ((boxes[:, 0] <= max_lon) & (boxes[:, 2] >= min_lon)
+                & (boxes[:, 1] <= max_lat) & (boxes[:, 3] >= min_lat))
+
+    @staticmethod
+    def _expand(starts, ends):
+        counts = ends - starts
+        if counts.sum() == 0:
+            return np.arange(0)
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        return np.arange(counts.sum()) + offsets
+
+    def query(self, bbox):
+        """Indices (into the original boxes) intersecting ``bbox``."""
+        if self.size == 0:
+            return np.arange(0)
+        boxes, starts, ends = self.levels[-1]
+        candidates = np.flatnonzero(self._hits(boxes, bbox))
+        for level in range(len(self.levels) - 1, -1, -1):
+            _, starts, ends = self.levels[level]
+            children = self._expand(starts[candidates], ends[candidates])
+            below = self.levels[level - 1][0] if level > 0 else self.boxes
+            candidates = children[self._hits(below[children], bbox)]
+        return np.sort(self.order[candidates])
+
+
+def bounds_to_bbox(bounds):
+    """st_folium ``bounds`` ({'_southWest': {lat, lng}, '_northEast': ...}) as a bbox, or None."""
+    try:
+        sw, ne = bounds["_southWest"], bounds["_northEast"]
+        bbox = (float(sw["lng"]), float(sw["lat"]), float(ne["lng"]), float(ne["lat"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return bbox if bbox[2] > bbox[0] and bbox[3] > bbox[1] else None
+
+
+def grid_clusters(lon, lat, bbox, cells=CLUSTER_GRID_CELLS):
+    """Bin points into a ``cells``-wide grid over ``bbox``.
+
+    Returns (cell_of_point, clusters) where clusters has one row per
+    occupied cell with its member count and mean position.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    size = max((max_lon - min_lon) / cells, 1e-9)
+    gx = np.floor((np.asarray(lon) - min_lon) / size).astype(np.int64)
+    gy = np.floor((np.asarray(lat) - min_lat) / size).astype(np.int64)
+    cell_ids, cell_of = np.unique(gx * 1_000_003 + gy, return_inverse=True)
+    count = np.bincount(cell_of, minlength=len(cell_ids))
+    clusters = pd.DataFrame({
+        "count": count,
+        "lon": np.bincount(cell_of, weights=lon, minlength=len(cell_ids)) / count,
+        "lat": np.bincount(cell_of, weights=lat, minlength=len(cell_ids)) / count,
+    })
+    return cell_of, clusters
+
+
+class FeatureLayer:
+    """KML features behind an STRIndex on their bounding boxes, served per viewport."""
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        self.features = geometry.features
+        self.index = STRIndex(self.features[["min_lon", "min_lat", "max_lon", "max_lat"]].to_numpy(dtype=np.float64))
+        self.fingerprint = None  # content hash, set by cached_layer
+
+    @property
+    def extent(self):
+        """(min_lon, min_lat, max_lon, max_lat) of the whole layer, or None if empty."""
+        if len(self.features) == 0:
+            return None
+        f = self.features
+        return (float(f["min_lon"].min()), float(f["min_lat"].min()),
+                float(f["max_lon"].max()), float(f["max_lat"].max()))
+
+    def view(self, bbox=None, max_markers=MAX_VIEW_MARKERS, cells=CLUSTER_GRID_CELLS):
+        """Features to draw for ``bbox`` (None: whole layer) as (features, clusters).
+
+        Below ``max_markers`` visible features every one is returned.
+        Above it features are grid-clustered on their representative
+        points: cells holding a single feature keep it, the rest become
+        cluster rows (count, lon, lat). Either way the payload is bounded
+        by the grid.
+        """
+        if bbox is None:
+            bbox = self.extent
+            if bbox is None:
+                return self.features, pd.DataFrame(columns=["count", "lon", "lat"])
+        visible = self.features.iloc[self.index.query(bbox)]
+        if len(visible) <= max_markers:
+            return visible, pd.DataFrame(columns=["count", "lon", "lat"])
+        cell_of, clusters = grid_clusters(visible["lon"].to_numpy(), visible["lat"].to_numpy(), bbox, cells)
+        single = clusters["count"].to_numpy()[cell_of] == 1
+        return visible[single], clusters[clusters["count"] > 1].reset_index(drop=True)
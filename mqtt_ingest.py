@@ -0,0 +1,346 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+import paho.mqtt.client as mqtt
+
+from iot_buffer import HISTORY_COLUMNS
+from iot_storage import normalize_history
+
+# What to do when the ingest queue is full (see IngestQueue)
+QUEUE_POLICIES = ("drop_oldest", "coalesce", "block")
+INGEST_QUEUE_SIZE = 10_000
+# Longest a "block" put waits before the message is dropped after all (s)
+BLOCK_TIMEOUT_S = 1.0
+# Messages handled per drain-loop iteration, and idle wait between checks (s)
+DRAIN_BATCH = 500
+DRAIN_IDLE_S = 0.5
+
+
+def empty_reading():
+    """Placeholder shown until the first reading arrives."""
+    return {
+        "timestamp": datetime.now(),
+        "Temperature": 0.0,
+        "CO2": 0.0,
+        "PM2_5": 0,
+        "status": "NOT FOUND",
+        "anomaly": 0
+    }
+
+
+def parse_payload(payload, received=None):
+    """Decode one sensor message (JSON with pm25/gas/temp/status) into a history row.
+
+    ``received`` (default: now) becomes the row timestamp.
+    """
+    data = json.loads(payload.decode() if isinstance(payload, bytes) else payload)
+
+    # AMBIL DATA SATU PER SATU (FETCHING)
+    dust = data.get('pm25', 0.0)      # Debu level (%)
+    gas = data.get('gas', 0.0)        # Udara quality (ppb)
+    temp = data.get('temp', 0.0)      # Suhu (°C)
+    status = data.get('status', 'UNKNOWN')
+
+    return {
+        "timestamp": received or datetime.now(),
+        "Temperature": temp,
+        "CO2": gas,
+        "PM2_5": dust,
+        "status": status
+    }
+
+
+class Feed:
+    """History (and rollups) for one subscribed topic filter; sites may share it.
+
+    With a ``detector`` (iot_anomaly.AnomalyDetector) every reading is
+    scored as it arrives and its anomaly mask is stored with the row; a
+    ``forecaster`` (iot_forecast.HoltForecaster) is updated with it too.
+    """
+
+    def __init__(self, topic_filter, history, writer=None, rollups=None, detector=None, forecaster=None):
+        self.topic_filter = topic_filter
+        self.history = history
+        self.writer = writer
+        self.rollups = rollups
+        self.detector = detector
+        self.forecaster = forecaster
+        self.latest = empty_reading()
+        self._lock = threading.RLock()
+
+    def ingest(self, row):
+        """Append one decoded reading to this feed's history."""
+        # Every feed matching the topic gets the same decoded row; annotate a private copy
+        row = dict(row)
+        with self._lock:
+            last_row = self.history.last()
+            if last_row is not None and row["timestamp"] == last_row["timestamp"]:
+                return
+            if self.detector is not None:
+                row["anomaly"] = self.detector.update(row)
+            self.history.append(row)
+            self.latest = row
+            if self.forecaster is not None:
+                self.forecaster.update(row)
+            # Under the lock too, so merge_history's load -> rewrite cannot miss this row
+            if self.rollups is not None:
+                self.rollups.update(row)
+            if self.writer is not None:
+                self.writer.append({c: row.get(c) for c in HISTORY_COLUMNS})
+
+    @property
+    def version(self):
+        """Change counter of the history (readings and imports, never reset); sessions use it as their cursor."""
+        return self.history.generation
+
+    def replace_history(self, df):
+        """Swap this feed's history for ``df`` (CSV import) and rewrite its store.
+
+        The store gets every row of ``df``; the in-memory ring only keeps
+        its newest rows, as at startup.
+        """
+        df = normalize_history(df).sort_values("timestamp", kind="stable").reset_index(drop=True)
+        with self._lock:
+            if self.detector is not None:
+                # Imported rows are scored from scratch, in time order
+                self.detector.reset()
+                df["anomaly"] = self.detector.score_frame(df)
+            if self.writer is not None:
+                self.writer.rewrite(df)
+            self.history.replace(df)
+            if self.forecaster is not None:
+                self.forecaster.reset()
+                self.forecaster.update_frame(self.history.frame())
+            if self.rollups is not None:
+                self.rollups.reset(df)
+            self.latest = self.history.last() or empty_reading()
+
+    def merge_history(self, df):
+        """Add imported rows to the full stored history (existing rows win on equal timestamps)."""
+        with self._lock:
+            stored = self.writer.load() if self.writer is not None else self.history.frame()
+            combined = pd.concat([normalize_history(stored), normalize_history(df)], ignore_index=True)
+            combined = combined.drop_duplicates(subset=["timestamp"], keep="first")
+            self.replace_history(combined)
+
+
+class IngestQueue:
+    """Bounded hand-off between the MQTT network thread and the drain thread.
+
+    Items are (topic, payload, received) tuples, handed out in arrival
+    order. Below ``maxsize`` every message is kept, whatever the policy.
+    Once ``maxsize`` items are pending, ``policy`` decides:
+
+    - ``drop_oldest``: the oldest pending message is discarded;
+    - ``coalesce``: the new message overwrites the newest pending message
+      of the same topic in place (only that topic loses a reading); a
+      topic with nothing pending drops the oldest message instead;
+    - ``block``: the producer waits up to ``block_timeout`` seconds for
+      room (backpressure towards the broker), then drops the message.
+
+    Memory is bounded by ``maxsize`` in every mode; the counters say
+    what was given up.
+    """
+
+    def __init__(self, maxsize=INGEST_QUEUE_SIZE, policy="drop_oldest", block_timeout=BLOCK_TIMEOUT_S):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"unknown queue policy {policy!r} (expected one of {QUEUE_POLICIES})")
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = int(maxsize)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        # Entries are [topic, payload, received] lists so coalescing can overwrite them in place
+        self._items = deque()
+        self._newest = {}  # topic -> its newest pending entry (coalesce only)
+        self._cond = threading.Condition()
+        self.received = self.dropped = self.coalesced = self.dequeued = 0
+        self.high_watermark = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _popleft(self):
+        entry = self._items.popleft()
+        if self._newest.get(entry[0]) is entry:
+            del self._newest[entry[0]]
+        return entry
+
+    def put(self, topic, payload, received):
+        with self._cond:
+            self.received += 1
+            if len(self._items) >= self.maxsize:
+                if self.policy == "coalesce" and topic in self._newest:
+                    entry = self._newest[topic]
+                    entry[1], entry[2] = payload, received
+                    self.coalesced += 1
+                    return
+                if self.policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._items) >= self.maxsize:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return
+                        self._cond.wait(remaining)
+                else:
+                    self._popleft()
+                    self.dropped += 1
+            entry = [topic, payload, received]
+            self._items.append(entry)
+            if self.policy == "coalesce":
+                self._newest[topic] = entry
+            self.high_watermark = max(self.high_watermark, len(self._items))
+            self._cond.notify_all()
+
+    def get_batch(self, max_items=DRAIN_BATCH, timeout=DRAIN_IDLE_S):
+        """Up to ``max_items`` oldest items, waiting up to ``timeout`` s for the first one."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            n = min(max_items, len(self._items))
+            batch = [tuple(self._popleft()) for _ in range(n)]
+            self.dequeued += n
+            if batch:
+                self._cond.notify_all()
+            return batch
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "high_watermark": self.high_watermark,
+                "received": self.received,
+                "dequeued": self.dequeued,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+            }
+
+
+class IngestService:
+    """One MQTT connection per broker, shared by every Streamlit session.
+
+    Every site's topic filter (wildcards included) is subscribed at once.
+    The paho network thread only stamps and enqueues each message into a
+    bounded IngestQueue; a drain thread decodes it once and routes it by
+    topic into per-filter Feeds, and flushes the writers on time, so
+    nothing depends on a page being open. Sites configured with the same
+    filter share one Feed. Sessions never touch the client: switching
+    site is a dict lookup, and each session keeps only integer cursors.
+    """
+
+    def __init__(self, broker, port, site_topics, feeds, client_factory=mqtt.Client,
+                 queue_size=INGEST_QUEUE_SIZE, queue_policy="drop_oldest"):
+        self.broker = broker
+        self.port = port
+        self.site_topics = dict(site_topics)
+        self.feeds = dict(feeds)  # topic filter -> Feed
+        self.connected = False
+        self.last_error = None
+        self._routes = {}  # concrete topic -> [Feed], filled lazily
+        self.queue = IngestQueue(queue_size, queue_policy)
+        self._stop = threading.Event()
+        self._drain_thread = None
+        self._client = client_factory()
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+
+    def feed(self, site):
+        return self.feeds[self.site_topics[site]]
+
+    def start(self):
+        """Connect in the background; paho keeps reconnecting if the broker drops."""
+        self._stop.clear()
+        self._drain_thread = threading.Thread(target=self._drain_loop, name="mqtt-drain", daemon=True)
+        self._drain_thread.start()
+        try:
+            self._client.connect_async(self.broker, self.port, 60)
+            self._client.loop_start()  # Start background thread for MQTT
+            print("MQTT ingest service started.")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"MQTT: Failed to start ingest service: {e}")
+        return self
+
+    def stop(self):
+        self._client.loop_stop()
+        self._client.disconnect()
+        self._stop.set()
+        self.queue.wake()
+        if self._drain_thread is not None:
+            self._drain_thread.join()
+        self.flush()
+
+    def _drain_loop(self):
+        """Move queued messages into the feeds until stopped, then empty the queue."""
+        while True:
+            batch = self.queue.get_batch()
+            for topic, payload, received in batch:
+                self._handle(topic, payload, received)
+            self.maybe_flush()
+            if self._stop.is_set() and not batch:
+                return
+
+    def _handle(self, topic, payload, received):
+        try:
+            row = parse_payload(payload, received)
+        except Exception as e:
+            print(f"MQTT: Error parsing message: {e}")
+            return
+        self.ingest(topic, row)
+
+    def flush(self):
+        for feed in self.feeds.values():
+            if feed.writer is not None:
+                feed.writer.flush()
+
+    def maybe_flush(self):
+        for feed in self.feeds.values():
+            if feed.writer is not None:
+                feed.writer.maybe_flush()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print("MQTT: Connected to Broker!")
+            self.connected = True
+            self.last_error = None
+            client.subscribe([(topic_filter, 0) for topic_filter in self.feeds])
+        else:
+            self.last_error = f"return code {rc}"
+            print(f"MQTT: Failed to connect, return code {rc}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        if rc != 0:
+            self.last_error = f"unexpected disconnect (rc={rc})"
+
+    def route(self, topic):
+        """Feeds whose topic filter matches ``topic`` (memoized per concrete topic)."""
+        feeds = self._routes.get(topic)
+        if feeds is None:
+            feeds = [f for flt, f in self.feeds.items() if mqtt.topic_matches_sub(flt, topic)]
+            self._routes[topic] = feeds
+        return feeds
+
+    def _on_message(self, client, userdata, msg):
+        # Network thread: stamp and hand off, decoding happens on the drain thread
+        self.queue.put(msg.topic, msg.payload, datetime.now())
+
+    def ingest(self, topic, row):
+        """Route one decoded reading to every feed subscribed to ``topic``."""
+        # Contoh Logic Olah Data:
+        if row["status"] == "DANGER":
+            print(">>> WARNING: DATA BAHAYA TERCATAT KE DATABASE! <<<")
+        for feed in self.route(topic):
+            feed.ingest(row)
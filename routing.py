@@ -0,0 +1,243 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+# Vertices of different lines closer than this are joined into one junction
+SNAP_TOLERANCE_KM = 0.1
+# Road distance per straight-line km, for access legs and unreachable pairs
+ROAD_DETOUR_FACTOR = 1.3
+# Shortest-path trees computed per dijkstra call (bounds the float64 temporary)
+TREE_BATCH = 16
+# Predecessor trees kept for drawing paths
+PATH_TREE_CACHE = 8
+# OSM highway classes kept when loading an extract
+OSM_ROAD_CLASSES = {
+    "motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential", "service", "track",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link", "living_street", "road",
+}
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance in km (broadcasts over arrays)."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def unit_vectors(lon, lat):
+    """(n, 3) points on the unit sphere, for Euclidean nearest-neighbour search."""
+    lon, lat = np.radians(np.asarray(lon, dtype=np.float64)), np.radians(np.asarray(lat, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class RoadGraph:
+    """Road network as a CSR adjacency matrix of edge lengths (km).
+
+    ``lon``/``lat`` give the position of every node; ``csr`` is
+    (n_nodes, n_nodes) and directed (two-way roads carry both edges).
+    """
+
+    def __init__(self, lon, lat, src, dst, length_km):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        n = len(self.lon)
+        # Parallel edges keep the shortest one
+        order = np.lexsort((length_km, dst, src))
+        src, dst, length_km = src[order], dst[order], length_km[order]
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        self.csr = csr_matrix((length_km[first], (src[first], dst[first])), shape=(n, n))
+        self._tree = cKDTree(unit_vectors(self.lon, self.lat)) if n else None
+
+    @property
+    def n_nodes(self):
+        return len(self.lon)
+
+    @property
+    def n_edges(self):
+        return self.csr.nnz
+
+    def nearest(self, lon, lat):
+        """(node index, straight-line km) of the closest node to each point."""
+        _, idx = self._tree.query(unit_vectors(lon, lat))
+        return idx, haversine_km(lon, lat, self.lon[idx], self.lat[idx])
+
+    def components(self):
+        """Weakly connected component label per node."""
+        return connected_components(self.csr, directed=True, connection="weak")[1]
+
+
+def _edges_from_lines(lines, tolerance_km):
+    """Nodes and two-way edges from polylines, merging vertices within ``tolerance_km``."""
+    lines = [np.asarray(xy, dtype=np.float64) for xy in lines if len(xy) >= 2]
+    if not lines:
+        return np.empty(0), np.empty(0), np.empty(0, np.int64), np.empty(0, np.int64)
+    xy = np.concatenate(lines)
+    n = len(xy)
+    # Cluster nearby vertices: connected components of the "closer than tolerance" pairs
+    pairs = cKDTree(unit_vectors(xy[:, 0], xy[:, 1])).query_pairs(tolerance_km / EARTH_RADIUS_KM, output_type="ndarray")
+    link = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    n_nodes, node_of = connected_components(link, directed=False)
+    count = np.bincount(node_of, minlength=n_nodes)
+    lon = np.bincount(node_of, weights=xy[:, 0], minlength=n_nodes) / count
+    lat = np.bincount(node_of, weights=xy[:, 1], minlength=n_nodes) / count
+    # Consecutive vertices within each line become edges
+    ends = np.cumsum([len(line) for line in lines])
+    same_line = np.ones(n - 1, dtype=bool)
+    same_line[ends[:-1] - 1] = False
+    a, b = node_of[:-1][same_line], node_of[1:][same_line]
+    keep = a != b
+    return lon, lat, a[keep], b[keep]
+
+
+def graph_from_lines(lines, tolerance_km=SNAP_TOLERANCE_KM):
+    """Two-way RoadGraph from (n, 2) lon/lat polylines (e.g. KML LineStrings)."""
+    lon, lat, a, b = _edges_from_lines(lines, tolerance_km)
+    length = haversine_km(lon[a], lat[a], lon[b], lat[b])
+    return RoadGraph(lon, lat, np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([length, length]))
+
+
+def graph_from_osm(path, road_classes=OSM_ROAD_CLASSES):
+    """RoadGraph from an OSM XML extract, streamed with iterparse.
+
+    Keeps ways tagged with one of ``road_classes``; ``oneway=yes``/``-1``
+    ways get a single direction. Only nodes used by those ways are kept.
+    """
+    node_ids, node_lon, node_lat = [], [], []
+    way_nodes, way_dir = [], []
+    refs, tags = [], {}
+    for event, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            node_ids.append(int(elem.get("id")))
+            node_lon.append(float(elem.get("lon")))
+            node_lat.append(float(elem.get("lat")))
+            elem.clear()
+        elif elem.tag == "nd":
+            refs.append(int(elem.get("ref")))
+        elif elem.tag == "tag":
+            tags[elem.get("k")] = elem.get("v")
+        elif elem.tag == "way":
+            if tags.get("highway") in road_classes and len(refs) >= 2:
+                oneway = tags.get("oneway", "no")
+                way_nodes.append(np.asarray(refs[::-1] if oneway == "-1" else refs, dtype=np.int64))
+                way_dir.append(oneway in ("yes", "true", "1", "-1"))
+            refs, tags = [], {}
+            elem.clear()
+        elif elem.tag == "relation":
+            refs, tags = [], {}
+            elem.clear()
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids)
+    node_ids, node_lon, node_lat = node_ids[order], np.asarray(node_lon)[order], np.asarray(node_lat)[order]
+    src, dst, one_way = [], [], []
+    for refs, directed in zip(way_nodes, way_dir):
+        src.append(refs[:-1])
+        dst.append(refs[1:])
+        one_way.append(np.full(len(refs) - 1, directed))
+    if not src:
+        return RoadGraph([], [], np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0))
+    src, dst, one_way = np.concatenate(src), np.concatenate(dst), np.concatenate(one_way)
+    # Drop edges to nodes missing from the extract, then renumber used nodes 0..n-1
+    pos_s, pos_d = np.searchsorted(node_ids, src), np.searchsorted(node_ids, dst)
+    pos_s, pos_d = np.minimum(pos_s, len(node_ids) - 1), np.minimum(pos_d, len(node_ids) - 1)
+    ok = (node_ids[pos_s] == src) & (node_ids[pos_d] == dst)
+    pos_s, pos_d, one_way = pos_s[ok], pos_d[ok], one_way[ok]
+    used, inverse = np.unique(np.concatenate([pos_s, pos_d]), return_inverse=True)
+    a, b = inverse[:len(pos_s)], inverse[len(pos_s):]
+    lon, lat = node_lon[used], node_lat[used]
+    length = haversine_km(lon[a], lat[a], lon[b], lat[b])
+    two_way = ~one_way
+    return RoadGraph(lon, lat, np.concatenate([a, b[two_way]]), np.concatenate([b, a[two_way]]),
+                     np.concatenate([length, length[two_way]]))
+
+
+class RoutingEngine:
+    """Road distances from any point to a fixed set of targets (plants).
+
+    One shortest-path tree per target is computed up front on the
+    reversed graph (distance *to* the target from every node), so a
+    many-to-many matrix is just nearest-node snapping plus an array
+    gather. Off-network legs (point to its nearest node) and pairs with
+    no road connection use straight-line km times ``detour``.
+
+    No contraction hierarchies or landmarks: with hundreds of plants the
+    per-target trees answer the many-to-many query directly. The price is
+    memory: the trees are a dense float32 (targets x nodes) array, 4
+    bytes per pair, e.g. 200 plants x 1M nodes = 800 MB. That suits the
+    KML network and regional OSM extracts; for country-sized extracts
+    clip the extract to the plants' region first. Predecessors are not
+    stored; ``path`` recomputes the one tree it needs.
+    """
+
+    def __init__(self, graph, target_lon, target_lat, detour=ROAD_DETOUR_FACTOR):
+        self.graph = graph
+        self.detour = detour
+        self.target_lon = np.asarray(target_lon, dtype=np.float64)
+        self.target_lat = np.asarray(target_lat, dtype=np.float64)
+        if graph.n_nodes == 0:
+            # No roads loaded: everything falls back to straight-line distances
+            self.target_node = np.zeros(len(self.target_lon), dtype=np.int64)
+            self.target_access = np.zeros(len(self.target_lon))
+            self.dist = np.full((len(self.target_lon), 1), np.inf, dtype=np.float32)
+            return
+        self.target_node, target_snap = graph.nearest(self.target_lon, self.target_lat)
+        self.target_access = target_snap * detour
+        self._reverse = graph.csr.T.tocsr()
+        self._trees = {}
+        # dist[t, v]: road km from node v to target t, filled a batch of targets at a time
+        self.dist = np.empty((len(self.target_node), graph.n_nodes), dtype=np.float32)
+        for lo in range(0, len(self.target_node), TREE_BATCH):
+            hi = min(lo + TREE_BATCH, len(self.target_node))
+            self.dist[lo:hi] = dijkstra(self._reverse, directed=True, indices=self.target_node[lo:hi])
+
+    def _snap(self, lon, lat):
+        if self.graph.n_nodes == 0:
+            return np.zeros(len(lon), dtype=np.int64), np.zeros(len(lon))
+        return self.graph.nearest(lon, lat)
+
+    def matrix(self, lon, lat):
+        """(n_points, n_targets) road km from each point to each target."""
+        lon, lat = np.atleast_1d(lon).astype(np.float64), np.atleast_1d(lat).astype(np.float64)
+        node, snap = self._snap(lon, lat)
+        road = self.dist[:, node].T.astype(np.float64) + snap[:, None] * self.detour + self.target_access[None, :]
+        direct = haversine_km(lon[:, None], lat[:, None], self.target_lon[None, :], self.target_lat[None, :])
+        # Pairs in different road components fall back to the detoured straight line
+        return np.where(np.isfinite(road), road, direct * self.detour)
+
+    def pair_km(self, lon, lat, target):
+        """Road km from each point to its own target (``target``: index per point)."""
+        lon, lat = np.atleast_1d(lon).astype(np.float64), np.atleast_1d(lat).astype(np.float64)
+        target = np.atleast_1d(target)
+        node, snap = self._snap(lon, lat)
+        road = self.dist[target, node].astype(np.float64) + snap * self.detour + self.target_access[target]
+        direct = haversine_km(lon, lat, self.target_lon[target], self.target_lat[target])
+        return np.where(np.isfinite(road), road, direct * self.detour)
+
+    def _path_tree(self, target):
+        """Predecessors towards ``target`` (next node on the way), recomputed on demand."""
+        pred = self._trees.pop(target, None)
+        if pred is None:
+            _, pred = dijkstra(self._reverse, directed=True, indices=int(self.target_node[target]),
+                               return_predecessors=True)
+            pred = pred.astype(np.int32)
+        self._trees[target] = pred
+        while len(self._trees) > PATH_TREE_CACHE:
+            self._trees.pop(next(iter(self._trees)))
+        return pred
+
+    def path(self, lon, lat, target):
+        """(m, 2) lon/lat polyline from a point to target ``target`` along the roads."""
+        node, _ = self._snap(np.atleast_1d(lon), np.atleast_1d(lat))
+        node = int(node[0])
+        coords = [(float(lon), float(lat))]
+        if np.isfinite(self.dist[target, node]):
+            pred = self._path_tree(target)
+            while node >= 0:
+                coords.append((self.graph.lon[node], self.graph.lat[node]))
+                node = pred[node]
+        coords.append((self.target_lon[target], self.target_lat[target]))
+        return np.array(coords)
@@ -0,0 +1,69 @@
+# --- Language/Translation Setup ---
+# Kept in its own module so the table is built once per process, not on every rerun.
+LANGUAGES = {
+    "English": {
+        "app_title": "HybridFuel: Biogas-Coal Optimization System",
+        "page_iot": "IoT Sensor Dashboard",
+        "page_ai": "Blend Optimizer",
+        "page_gis": "GIS Feedstock Map",
+        "iot_header": "Real-time Combustion Monitoring",
+        "iot_subheader": "Live data from IoT sensors (via MQTT)",
+        "current_temp": "Current Temperature",
+        "current_co2": "Current CO2 (Gas)",
+        
+        "current_pm25": "Current PM2.5 (Dust)",
+        "historical_temp": "Historical Temperature (°C)",
+        "historical_emissions": "Historical Emissions (ppm / µg/m³)",
+        "historical_data_header": "Historical Data Log",
+        "ai_header": "Fuel Blend Optimization",
+        "coal_input": "Coal Input (Tons/hour)",
+        "biogas_mix": "Biogas Mix (%)",
+        "optimize_button": "Run Optimization",
+        "ai_recommendation": "AI Recommendation",
+        "pred_power": "Predicted Power Output (MW)",
+        "pred_reduction": "Predicted PM2.5 Reduction",
+        "safety_check": "Safety & Feasibility Check",
+        "safety_ok": "✅ Biogas percentage is within safe operational parameters.",
+        "safety_warn": "⚠️ High biogas percentage (>40%) may require equipment retrofitting. Proceed with caution.",
+        "optimal_blend_is": "Optimal blend for max efficiency & min pollution:",
+        "gis_header": "GIS Feedstock & Logistics Dashboard",
+        "gis_subheader": "This dashboard will map regional waste feedstock sources, biogas generation potential, and industrial fuel demand.",
+        "gis_placeholder": "Simple map of India. Full GIS data will be integrated later.",
+    },
+    "Hindi (हिन्दी)": {
+        "app_title": "HybridFuel: बायोगैस-कोयला अनुकूलन प्रणाली",
+        "page_iot": "IoT सेंसर डैशबोर्ड",
+        "page_ai": "ब्लेंड ऑप्टिमाइज़र",
+        "page_gis": "GIS फीडस्टॉक मानचित्र",
+
+        "iot_header": "वास्तविक समय दहन निगरानी",
+        "iot_subheader": "IoT सेंसर से लाइव डेटा (MQTT के माध्यम से)",
+
+        "current_temp": "वर्तमान तापमान",
+        "current_co2": "वर्तमान CO2 (गैस)",
+        "current_pm25": "वर्तमान PM2.5 (धूल)",
+
+        "historical_temp": "ऐतिहासिक तापमान (°C)",
+        "historical_emissions": "ऐतिहासिक उत्सर्जन (ppm / µg/m³)",
+        "historical_data_header": "ऐतिहासिक डेटा लॉग",
+
+        "ai_header": "ईंधन मिश्रण अनुकूलन",
+        "coal_input": "कोयला इनपुट (टन/घंटा)",
+        "biogas_mix": "बायोगैस मिश्रण (%)",
+        "optimize_button": "अनुकूलन चलाएँ",
+
+        "ai_recommendation": "AI सिफ़ारिश",
+        "pred_power": "अनुमानित विद्युत उत्पादन (MW)",
+        "pred_reduction": "अनुमानित PM2.5 में कमी",
+
+        "safety_check": "सुरक्षा और व्यवहार्यता जांच",
+        "safety_ok": "✅ बायोगैस प्रतिशत सुरक्षित परिचालन सीमा के भीतर है।",
+        "safety_warn": "⚠️ उच्च बायोगैस प्रतिशत (>40%) के लिए उपकरणों में संशोधन आवश्यक हो सकता है। सावधानी से आगे बढ़ें।",
+
+        "optimal_blend_is": "अधिकतम दक्षता और न्यूनतम प्रदूषण के लिए इष्टतम मिश्रण:",
+
+        "gis_header": "GIS फीडस्टॉक और लॉजिस्टिक्स डैशबोर्ड",
+        "gis_subheader": "यह डैशबोर्ड क्षेत्रीय अपशिष्ट फीडस्टॉक स्रोतों, बायोगैस उत्पादन क्षमता और औद्योगिक ईंधन मांग को मैप करेगा।",
+        "gis_placeholder": "भारत का सरल मानचित्र। पूर्ण GIS डेटा बाद में एकीकृत किया जाएगा।",
+    }
+}